@@ -4,10 +4,19 @@ from src.ui.login import render_login_view
 from src.ui.home import render_home_view
 from src.ui.results import render_results_view
 from src.ui.saved_modules import render_saved_modules_view
+from src.ui.admin import is_admin, render_admin_panel
+from src.llm import prewarm, start_metrics_server
+from src.config.settings import METRICS_PORT
 
 # Set page config with katana icon (replace 🗡️ with PNG path if you make one)
 st.set_page_config(page_title="AI Teaching Faculty Hub", page_icon="🗡️", layout="wide")
 
+# Open the shared Gemini connection pool once per process
+prewarm()
+# Prometheus scrape endpoint, also started once per process
+if METRICS_PORT:
+    start_metrics_server(METRICS_PORT)
+
 # Add custom CSS here
 st.markdown("""
     <style>
@@ -56,5 +65,8 @@ if st.session_state.user and st.session_state.view in ["Home", "Results"]:
         st.markdown("<hr>", unsafe_allow_html=True)  # Teal divider
         with st.expander("Saved Modules", expanded=False):  # Collapsible
             render_saved_modules_view()
+        if is_admin(st.session_state.user):
+            with st.expander("LLM Metrics", expanded=False):
+                render_admin_panel()
 
 st.write(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
\ No newline at end of file
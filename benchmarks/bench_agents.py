@@ -0,0 +1,134 @@
+"""End-to-end latency of every agent and of the Results page, against benchmarks/mock_gemini.py.
+
+Run from the repository root (needs pytest-benchmark):
+
+    python -m pytest benchmarks/bench_agents.py
+    BENCH_LATENCY=lognormal:0.8,0.5 python -m pytest benchmarks/bench_agents.py --benchmark-autosave
+    python -m pytest benchmarks/bench_agents.py --benchmark-compare   # against the last saved run
+
+Every call goes over HTTP to the mock with the response cache and the
+explanation store off, so the numbers cover the full client path: rate
+limiter, retries, breaker, JSON repair and continuation. BENCH_LATENCY sets the mock's per-request latency
+(see mock_gemini.parse_latency); the *_with_faults cases add errors,
+malformed JSON and truncated replies.
+"""
+import functools
+import os
+import pytest
+from streamlit.testing.v1 import AppTest
+from benchmarks.mock_gemini import MockGemini
+from src.agents import explanations
+from src.agents.advisor import advisor_agent
+from src.agents.analyzer import quiz_analyzer_agent
+from src.agents.assistant import assistant_agent
+from src.agents.librarian import librarian_agent
+from src.agents.module import generate_modules
+from src.agents.professor import professor_agent
+from src.agents.quiz import generate_questions_async
+from src.agents.resume import split_skills
+from src.llm import breaker as breaker_module
+from src.llm import client, run_sync
+from src.llm.ratelimit import RateLimiter, backoff_delay
+
+SKILLS = ["Python", "SQL"]
+LATENCY = os.getenv("BENCH_LATENCY", "fixed:0.02")
+FAULTS = {"error_rate": 0.1, "malformed_rate": 0.2, "truncate_rate": 0.2}
+RESULTS_APP = os.path.join(os.path.dirname(__file__), "results_app.py")
+
+
+@pytest.fixture(scope="module")
+def mock():
+    with MockGemini(latency=LATENCY) as server:
+        yield server
+
+
+@pytest.fixture(scope="module")
+def faulty_mock():
+    with MockGemini(latency=LATENCY, seed=7, **FAULTS) as server:
+        yield server
+
+
+def use_server(monkeypatch, server):
+    monkeypatch.setattr(client, "GEMINI_API_BASE", server.base_url)
+    monkeypatch.setattr(client, "get_cache", lambda: None)
+    monkeypatch.setattr(explanations, "get_explanation_store", lambda: None)
+    # Quotas would throttle hundreds of benchmark rounds; backoff is scaled to the mock's latency
+    monkeypatch.setattr(client, "get_limiter", lambda limiter=RateLimiter({"default": {"rpm": 10**6, "tpm": 10**9}}): limiter)
+    monkeypatch.setattr(client, "backoff_delay", functools.partial(backoff_delay, base=0.05, cap=0.5))
+    monkeypatch.setattr(breaker_module, "_breakers", {})
+
+
+@pytest.fixture
+def gemini(monkeypatch, mock):
+    use_server(monkeypatch, mock)
+    return mock
+
+
+@pytest.fixture
+def faulty_gemini(monkeypatch, faulty_mock):
+    use_server(monkeypatch, faulty_mock)
+    return faulty_mock
+
+
+def quiz_tuples(questions):
+    return [(q["question"], q["difficulty"], q["bloom_level"], q["type"], None, q["options"], q["answer"]) for q in questions]
+
+
+def run_results_page():
+    app = AppTest.from_file(RESULTS_APP, default_timeout=120).run()
+    assert not app.exception, app.exception
+    return app
+
+
+def test_professor(benchmark, gemini):
+    assert benchmark(professor_agent, SKILLS)
+
+
+def test_advisor(benchmark, gemini):
+    assert benchmark(advisor_agent, SKILLS)["learning_path"]
+
+
+def test_librarian(benchmark, gemini):
+    assert set(benchmark(librarian_agent, SKILLS)) == set(SKILLS)
+
+
+def test_assistant(benchmark, gemini):
+    learning_path = advisor_agent(SKILLS)
+    assert benchmark(assistant_agent, SKILLS, learning_path)
+
+
+def test_module(benchmark, gemini):
+    assert len(benchmark(generate_modules, SKILLS)) == len(SKILLS)
+
+
+def test_quiz(benchmark, gemini):
+    knowledge_base = professor_agent(SKILLS)
+    assert benchmark(lambda: run_sync(generate_questions_async(SKILLS, knowledge_base)))
+
+
+def test_analyzer(benchmark, gemini):
+    questions = quiz_tuples(run_sync(generate_questions_async(SKILLS, professor_agent(SKILLS))))
+    responses = {q[0]: q[5][0] for q in questions}
+    assert benchmark(quiz_analyzer_agent, SKILLS, responses, questions)["graded_questions"]
+
+
+def test_split_skills(benchmark, gemini):
+    assert benchmark(split_skills, "Python, SQL, Docker, Kubernetes and some AWS")
+
+
+def test_results_page(benchmark, gemini):
+    benchmark.pedantic(run_results_page, rounds=5, warmup_rounds=1)
+
+
+def test_advisor_with_faults(benchmark, faulty_gemini):
+    assert benchmark.pedantic(advisor_agent, (SKILLS,), rounds=20)["learning_path"]
+
+
+def test_quiz_with_faults(benchmark, faulty_gemini):
+    knowledge_base = professor_agent(SKILLS)
+    assert benchmark.pedantic(lambda: run_sync(generate_questions_async(SKILLS, knowledge_base)), rounds=20)
+
+
+def test_results_page_with_faults(benchmark, faulty_gemini):
+    benchmark.pedantic(run_results_page, rounds=5, warmup_rounds=1)
+    benchmark.extra_info["mock"] = dict(faulty_gemini.stats)
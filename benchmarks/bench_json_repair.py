@@ -0,0 +1,51 @@
+"""Throughput of src.utils.json_repair.loads.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_json_repair
+
+Reports the fast path (well-formed JSON), the repair path on the malformed
+corpus in tests/data, and how the repair path scales with document size.
+Time per KB should stay flat as documents grow; the parser is one linear scan.
+"""
+import json
+import os
+import timeit
+from src.utils.json_repair import loads
+
+CORPUS = os.path.join(os.path.dirname(__file__), "..", "tests", "data", "malformed_json.jsonl")
+
+
+def learning_path(levels):
+    return {
+        "introduction": "Learn Python",
+        "learning_path": [
+            {"level": f"Level {i}", "description": "Practice \"often\" " * 5, "resources": ["Docs", "Book", "Course"]}
+            for i in range(levels)
+        ],
+    }
+
+
+def per_call(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+def main():
+    with open(CORPUS, encoding="utf-8") as f:
+        corpus = [json.loads(line)["text"] for line in f if line.strip()]
+
+    valid = json.dumps(learning_path(50))
+    print(f"fast path, {len(valid) / 1024:.1f} KB valid JSON: {per_call(lambda: loads(valid), 200) * 1e6:.0f} us")
+    print(f"json.loads, same document:      {per_call(lambda: json.loads(valid), 200) * 1e6:.0f} us")
+    corpus_time = per_call(lambda: [loads(text) for text in corpus], 200)
+    print(f"repair path, {len(corpus)} malformed outputs: {corpus_time / len(corpus) * 1e6:.0f} us each")
+
+    print("repair path scaling (truncated, trailing commas):")
+    for levels in (10, 100, 1000, 5000):
+        text = json.dumps(learning_path(levels), indent=2).replace("]", ",]")[:-40]
+        seconds = per_call(lambda: loads(text), 5)
+        print(f"  {len(text) / 1024:8.1f} KB  {seconds * 1e3:8.2f} ms  {seconds * 1e6 / (len(text) / 1024):6.1f} us/KB")
+
+
+if __name__ == "__main__":
+    main()
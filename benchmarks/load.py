@@ -0,0 +1,256 @@
+"""Drive many simulated users through the app at once, against benchmarks/mock_gemini.py.
+
+Run from the repository root:
+
+    python -m benchmarks.load --sessions 50 --concurrency 10 --latency lognormal:0.8,0.5
+    python -m benchmarks.load --sessions 20 --error-rate 0.05 --truncate-rate 0.1 --json load.json
+    python -m benchmarks.load --base-url http://127.0.0.1:8089/v1beta   # mock in another process
+
+Every session is a Streamlit AppTest of app.py that walks Login (test-user
+bypass) -> Home -> Results (topic form submitted) -> Grade Me. Sessions run on
+threads of this process, the way a Streamlit server runs each session's
+script on its own thread, so they share the LLM event loop, connection pool,
+rate limiter and breaker as real users do. The response cache and the
+explanation store are off unless --cache is given, and then they are
+in-memory ones; the app's SQLite files are never touched.
+
+The report has p50/p95/p99 per step, sessions per minute, failed sessions,
+peak RSS and peak thread count. A step is timed from the user's action until
+the next view has rendered, so "results" includes the skill split made on
+submit and every Results page generation.
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1.util import patch_config_options
+from benchmarks.mock_gemini import MockGemini
+from src.agents import explanations
+from src.agents.explanations import ExplanationStore
+from src.llm import client
+from src.llm.cache import ResponseCache
+
+APP = os.path.join(os.path.dirname(__file__), "..", "app.py")
+STEPS = ("login", "home", "results", "grade")
+DEFAULT_TOPICS = ["Python, SQL", "Docker", "Machine Learning", "JavaScript, React", "Kubernetes"]
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of ``values`` (q in 0..100); None when empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+def current_rss():
+    """Resident set size of this process in bytes (Linux), else None."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == "darwin" else usage * 1024
+
+
+class ResourceSampler:
+    """Samples RSS and live thread count on a background thread until stopped."""
+
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.peak_threads = threading.active_count()
+        self.peak_rss = current_rss() or 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="load-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+            self.peak_rss = max(self.peak_rss, current_rss() or 0)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+@contextlib.contextmanager
+def shared_app_test_runtime():
+    """
+    AppTest expects one run at a time: every run installs its own mock Runtime
+    and config patch and removes them when it ends, pulling them out from under
+    runs still going on other threads. Hold one of each for the whole load test.
+    """
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    with patch.object(Runtime, "instance", classmethod(lambda cls: runtime)), \
+            patch.object(Runtime, "exists", classmethod(lambda cls: True)), \
+            patch_config_options({"global.appTest": True}):
+        yield runtime
+
+
+def _button(app, label):
+    for button in app.button:
+        if button.label == label:
+            return button
+    raise AssertionError(f"No '{label}' button on the {app.session_state['view']} view")
+
+
+def _pin_stale_widgets(app):
+    # After an st.rerun inside one run, AppTest keeps the previous view's inputs in
+    # its tree with no session state behind them, and the next run cannot read them
+    for widget in app.text_input:
+        try:
+            widget.value
+        except KeyError:
+            widget.set_value(None)
+
+
+def _step(app, timings, name, action=None):
+    _pin_stale_widgets(app)
+    started = time.perf_counter()
+    if action is not None:
+        action()
+    app.run()
+    timings[name] = time.perf_counter() - started
+    if app.exception:
+        raise AssertionError(f"{name}: {app.exception[0].message}")
+
+
+def simulate_session(topic, timeout=300):
+    """One user's visit; returns {step: seconds}, raising if any step fails."""
+    timings = {}
+    app = AppTest.from_file(APP, default_timeout=timeout)
+    _step(app, timings, "login")
+    app.checkbox[0].check().run()
+    _step(app, timings, "home", lambda: _button(app, "Continue as test user").click())
+    _step(app, timings, "results", lambda: (app.text_input(key="topic_input").input(topic), _button(app, "Forge My Path").click()))
+    if app.session_state["view"] != "Results":
+        raise AssertionError(f"results: still on the {app.session_state['view']} view")
+    _step(app, timings, "grade", lambda: _button(app, "Grade Me").click())
+    if "analysis" not in app.session_state:
+        raise AssertionError("grade: no analysis in session state")
+    return timings
+
+
+def run_load(sessions, concurrency, topics, timeout=300):
+    """Run ``sessions`` visits, ``concurrency`` at a time; returns the report dict."""
+    timings = {step: [] for step in STEPS}
+    errors = []
+
+    def one(i):
+        try:
+            for step, seconds in simulate_session(topics[i % len(topics)], timeout).items():
+                timings[step].append(seconds)
+        except Exception as e:
+            errors.append(f"session {i}: {e}")
+            traceback.print_exc()
+
+    started = time.perf_counter()
+    with shared_app_test_runtime(), ResourceSampler() as sampler, ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="session") as pool:
+        list(pool.map(one, range(sessions)))
+    seconds = time.perf_counter() - started
+    completed = sessions - len(errors)
+    return {
+        "sessions": sessions,
+        "concurrency": concurrency,
+        "completed": completed,
+        "failed": len(errors),
+        "errors": errors,
+        "seconds": seconds,
+        "sessions_per_minute": completed / seconds * 60 if seconds else 0.0,
+        "steps": {
+            step: {"count": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95), "p99": percentile(values, 99)}
+            for step, values in timings.items()
+        },
+        "peak_rss_bytes": max(sampler.peak_rss, peak_rss()),
+        "peak_threads": sampler.peak_threads,
+    }
+
+
+def format_report(report):
+    def seconds(value):
+        return f"{value:8.2f}" if value is not None else "       -"
+
+    lines = [f"{'step':<10}{'count':>7}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}"]
+    for step, row in report["steps"].items():
+        lines.append(f"{step:<10}{row['count']:>7} {seconds(row['p50'])} {seconds(row['p95'])} {seconds(row['p99'])}")
+    lines.append(
+        f"{report['completed']}/{report['sessions']} sessions in {report['seconds']:.1f}s at concurrency "
+        f"{report['concurrency']} ({report['sessions_per_minute']:.1f} sessions/min), {report['failed']} failed"
+    )
+    lines.append(f"peak RSS {report['peak_rss_bytes'] / 2**20:.0f} MiB, peak threads {report['peak_threads']}")
+    if report.get("mock"):
+        lines.append("mock replies: " + ", ".join(f"{outcome} {count}" for outcome, count in sorted(report["mock"].items())))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the Streamlit app with simulated sessions.")
+    parser.add_argument("--sessions", type=int, default=20, help="simulated visits in total")
+    parser.add_argument("--concurrency", type=int, default=5, help="visits in progress at once")
+    parser.add_argument("--topics", help="';'-separated topics typed on Home, used in turn")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds one step may take")
+    parser.add_argument("--cache", action="store_true", help="use an in-memory response cache and explanation store shared by all sessions")
+    parser.add_argument("--base-url", help="Gemini-compatible API to use instead of an in-process mock")
+    parser.add_argument("--latency", default="lognormal:0.5,0.4", help="mock latency, see mock_gemini.parse_latency")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--truncate-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+    # httpx logs every request at INFO once Streamlit configures logging
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    topics = [t.strip() for t in args.topics.split(";") if t.strip()] if args.topics else DEFAULT_TOPICS
+    mock = None
+    if args.base_url:
+        client.GEMINI_API_BASE = args.base_url.rstrip("/")
+    else:
+        mock = MockGemini(args.latency, args.error_rate, malformed_rate=args.malformed_rate,
+                          truncate_rate=args.truncate_rate, seed=args.seed)
+        client.GEMINI_API_BASE = mock.start()
+    cache = ResponseCache(path=None) if args.cache else None
+    client.get_cache = lambda: cache
+    store = ExplanationStore(path=None) if args.cache else None
+    explanations.get_explanation_store = lambda: store
+
+    try:
+        report = run_load(args.sessions, args.concurrency, topics, args.timeout)
+    finally:
+        if mock is not None:
+            mock.stop()
+    if mock is not None:
+        report["mock"] = dict(mock.stats)
+    print(format_report(report))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
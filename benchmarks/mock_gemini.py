@@ -0,0 +1,295 @@
+"""A local stand-in for the Gemini generateContent API.
+
+Run it and point the app at it:
+
+    python -m benchmarks.mock_gemini --port 8089 --latency lognormal:0.8,0.5 --error-rate 0.05
+    GEMINI_API_BASE=http://127.0.0.1:8089/v1beta streamlit run app.py
+
+or start it in-process with :class:`MockGemini`, as benchmarks/bench_agents.py
+does. ``generateContent`` and ``streamGenerateContent`` (SSE) are served for
+any model. Requests with a ``response_schema`` get JSON that fills the schema,
+other JSON requests get an object with the key the prompt asks for, and
+everything else gets markdown with a few ``##`` sections.
+
+Faults are drawn per request from a seeded RNG: a latency distribution
+(``fixed:S``, ``uniform:LO,HI``, ``lognormal:MEDIAN,SIGMA`` or
+``exponential:MEAN``, in seconds), HTTP errors, malformed JSON (fenced,
+trailing commas, a missing closing bracket) and replies cut off with
+``finishReason: MAX_TOKENS``. A continuation request for a cut-off reply gets
+the rest of it, as the real API would.
+"""
+import argparse
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_PATH = re.compile(r"^/v1beta/models/([^/:]+):(generateContent|streamGenerateContent)$")
+_WANTED_KEY = re.compile(r"with an? '(\w+)' key")
+
+
+def parse_latency(spec):
+    """Turn a latency spec such as ``lognormal:0.8,0.5`` into ``sample(rng) -> seconds``."""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v.strip()]
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal" and len(values) == 2:
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    if kind == "exponential" and len(values) == 1:
+        return lambda rng: rng.expovariate(1 / values[0]) if values[0] else 0.0
+    raise ValueError(f"Bad latency spec {spec!r}; use fixed:S, uniform:LO,HI, lognormal:MEDIAN,SIGMA or exponential:MEAN")
+
+
+def fake_value(schema, name, counter, list_items, index=0):
+    """A value matching a Gemini ``response_schema``; strings are unique per server."""
+    kind = schema.get("type", "STRING").upper()
+    if kind == "OBJECT":
+        return {key: fake_value(sub, key, counter, list_items) for key, sub in schema.get("properties", {}).items()}
+    if kind == "ARRAY":
+        size = schema.get("maxItems", max(schema.get("minItems", 0), list_items))
+        return [fake_value(schema.get("items", {}), name, counter, list_items, i) for i in range(size)]
+    if kind == "INTEGER":
+        return index
+    if kind == "NUMBER":
+        return float(index)
+    if kind == "BOOLEAN":
+        return True
+    if schema.get("enum"):
+        return schema["enum"][0]
+    n = next(counter)
+    if name == "url":
+        return f"https://example.com/{n}"
+    return f"{name.replace('_', ' ')} {n}"
+
+
+def fake_markdown(prompt, counter, sections=4):
+    topic = " ".join(prompt.split()[:8])
+    lines = [f"# Notes {next(counter)}", "", f"Generated for: {topic}", ""]
+    for i in range(1, sections + 1):
+        lines += [f"## Section {i}", ""]
+        lines += [f"- Point {next(counter)}: practise the idea, then explain it back in your own words." for _ in range(3)]
+        lines.append("")
+    return "\n".join(lines)
+
+
+def malform(text, rng):
+    """Break a JSON document the way real replies break."""
+    choice = rng.randrange(3)
+    if choice == 0:
+        return f"```json\n{text}\n```"
+    if choice == 1:
+        return re.sub(r"([\]}])", r",\1", text, count=3)
+    return text[:-1]
+
+
+class MockGemini:
+    """
+    The mock server; ``start()`` returns the base URL to use as GEMINI_API_BASE.
+    ``stats`` counts requests by outcome (ok, error, malformed, truncated, continued).
+    """
+
+    def __init__(self, latency="fixed:0", error_rate=0.0, error_status=503, malformed_rate=0.0,
+                 truncate_rate=0.0, seed=0, list_items=6, stream_chunks=4):
+        self.sample_latency = parse_latency(latency) if isinstance(latency, str) else latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.malformed_rate = malformed_rate
+        self.truncate_rate = truncate_rate
+        self.list_items = list_items
+        self.stream_chunks = stream_chunks
+        self.stats = Counter()
+        self._rng = random.Random(seed)
+        self._counter = itertools.count(1)
+        self._remainders = {}  # partial text -> rest of a truncated reply
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1beta"
+
+    def start(self, host="127.0.0.1", port=0):
+        server = self
+
+        class Handler(_Handler):
+            mock = server
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="mock-gemini", daemon=True).start()
+        return self.base_url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def count(self, outcome):
+        # Handler threads count concurrently; Counter increments are not atomic
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def _roll(self, rate):
+        with self._lock:
+            return self._rng.random() < rate
+
+    def plan(self):
+        """(latency, fail?) for the next request."""
+        with self._lock:
+            return max(0.0, self.sample_latency(self._rng)), self._rng.random() < self.error_rate
+
+    def reply(self, payload):
+        """(text, finish reason, outcome) for a generateContent payload."""
+        contents = payload.get("contents") or [{}]
+        config = payload.get("generationConfig") or {}
+        prompt = "".join(part.get("text", "") for part in contents[0].get("parts", []))
+        if len(contents) >= 3 and contents[1].get("role") == "model":
+            partial = "".join(part.get("text", "") for part in contents[1].get("parts", []))
+            with self._lock:
+                return self._remainders.pop(partial, ""), "STOP", "continued"
+
+        is_json = config.get("response_mime_type") == "application/json" or "response_schema" in config
+        if "response_schema" in config:
+            text = json.dumps(fake_value(config["response_schema"], "item", self._counter, self.list_items), indent=2)
+        elif is_json:
+            wanted = _WANTED_KEY.search(prompt)
+            text = json.dumps({wanted.group(1) if wanted else "result": {}})
+        else:
+            text = fake_markdown(prompt, self._counter)
+
+        if is_json and self._roll(self.malformed_rate):
+            with self._lock:
+                text = malform(text, self._rng)
+            return text, "STOP", "malformed"
+        if len(text) > 40 and self._roll(self.truncate_rate):
+            cut = int(len(text) * 0.6)
+            with self._lock:
+                self._remainders[text[:cut]] = text[cut:]
+            return text[:cut], "MAX_TOKENS", "truncated"
+        return text, "STOP", "ok"
+
+
+def _body(text, finish_reason, prompt_chars):
+    prompt_tokens, output_tokens = max(1, prompt_chars // 4), max(1, len(text) // 4)
+    return {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": finish_reason}],
+        "usageMetadata": {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": output_tokens,
+            "totalTokenCount": prompt_tokens + output_tokens,
+        },
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    mock = None
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, delayed ACKs add ~40ms to each reply
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        # The client's connection pre-warm lists models
+        self._send_json(200, {"models": [{"name": "models/mock"}]})
+
+    def do_POST(self):
+        match = _PATH.match(self.path.split("?")[0])
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length)
+        if not match:
+            self._send_json(404, {"error": {"code": 404, "message": f"No route for {self.path}", "status": "NOT_FOUND"}})
+            return
+        latency, fail = self.mock.plan()
+        if fail:
+            time.sleep(latency)
+            self.mock.count("error")
+            status = self.mock.error_status
+            self._send_json(status, {"error": {"code": status, "message": "Injected failure", "status": "UNAVAILABLE"}})
+            return
+        try:
+            payload = json.loads(raw or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"code": 400, "message": "Invalid JSON payload", "status": "INVALID_ARGUMENT"}})
+            return
+        text, finish_reason, outcome = self.mock.reply(payload)
+        self.mock.count(outcome)
+        if match.group(2) == "streamGenerateContent":
+            self._stream(text, finish_reason, len(raw), latency)
+        else:
+            time.sleep(latency)
+            self._send_json(200, _body(text, finish_reason, len(raw)))
+
+    def _stream(self, text, finish_reason, prompt_chars, latency):
+        # First chunk after a third of the latency, the rest spread over the remainder
+        chunks = max(1, self.mock.stream_chunks)
+        size = max(1, math.ceil(len(text) / chunks))
+        pieces = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        time.sleep(latency / 3)
+        for i, piece in enumerate(pieces):
+            last = i == len(pieces) - 1
+            event = _body(piece, finish_reason if last else None, prompt_chars)
+            if not last:
+                del event["candidates"][0]["finishReason"]
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            if not last:
+                time.sleep(latency * 2 / 3 / len(pieces))
+        self.close_connection = True
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a mock Gemini generateContent API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", default="fixed:0", help="fixed:S, uniform:LO,HI, lognormal:MEDIAN,SIGMA or exponential:MEAN")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with --error-status")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="share of JSON replies that are malformed")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="share of replies cut off at MAX_TOKENS")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    mock = MockGemini(args.latency, args.error_rate, args.error_status, args.malformed_rate, args.truncate_rate, args.seed)
+    print(f"Mock Gemini at {mock.start(args.host, args.port)}; Ctrl-C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(dict(mock.stats))
+    finally:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    main()
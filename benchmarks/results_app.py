@@ -0,0 +1,8 @@
+"""Results page with a fixed user and skills, for AppTest runs in benchmarks/bench_agents.py."""
+import os
+import streamlit as st
+from src.ui.results import render_results_view
+
+st.session_state.setdefault("user", {"id": "benchmark", "email": "benchmark@example.com"})
+st.session_state.setdefault("skills", [s.strip() for s in os.getenv("BENCH_SKILLS", "Python, SQL").split(",") if s.strip()])
+render_results_view()
@@ -0,0 +1,184 @@
+"""Build learning modules for a whole list of skills without the UI.
+
+Run from the repository root:
+
+    python curriculum.py skills.csv --user-id <uuid>       # CSV with a "skill" column
+    python curriculum.py skills.json --user-id <uuid>      # ["Python", ...] or [{"skill": ...}, ...]
+
+For every skill the professor, advisor, librarian and module agents run side
+by side; --concurrency skills are in progress at once, on the shared LLM event
+loop. Finished modules are inserted into the modules table --batch-size rows
+at a time, and every inserted skill is appended to the checkpoint file, so a
+rerun with the same checkpoint skips them. Skills generated but not yet
+inserted when a run stops are built again on resume, mostly from the response
+cache. A summary with throughput and error counts is printed at the end.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from src.agents.advisor import advisor_agent_async
+from src.agents.librarian import librarian_agent_async
+from src.agents.module import module_generator_agent_async
+from src.agents.professor import professor_agent_async
+from src.config.settings import CURRICULUM_BATCH_SIZE, CURRICULUM_CONCURRENCY
+from src.db.supabase_client import save_modules
+from src.llm import run_sync
+from src.llm.metrics import fallbacks
+
+logger = logging.getLogger("curriculum")
+
+AGENTS = ("professor", "advisor", "librarian", "module")
+
+
+def read_skills(path):
+    """Skills from a CSV (a "skill" column, else the first column) or JSON list, without duplicates."""
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".json"):
+            entries = [e.get("skill") if isinstance(e, dict) else e for e in json.load(f)]
+        else:
+            rows = list(csv.reader(f))
+            header = [name.strip().lower() for name in rows[0]] if rows else []
+            column = header.index("skill") if "skill" in header else 0
+            entries = [row[column] for row in rows[1 if "skill" in header else 0:] if len(row) > column]
+    skills = []
+    for entry in entries:
+        if isinstance(entry, str) and entry.strip() and entry.strip() not in skills:
+            skills.append(entry.strip())
+    return skills
+
+
+def read_checkpoint(path):
+    done = set()
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    done.add(json.loads(line)["skill"])
+    return done
+
+
+def append_checkpoint(path, skills):
+    with open(path, "a", encoding="utf-8") as f:
+        for skill in skills:
+            f.write(json.dumps({"skill": skill, "saved_at": time.time()}) + "\n")
+
+
+def module_document(skill, knowledge_base, learning_path, resources, module):
+    """One markdown document with everything the agents produced for ``skill``."""
+    lines = [f"# {skill}", "", module.strip(), "", "## Knowledge Base", "", knowledge_base.strip(), "", "## Learning Path", ""]
+    if learning_path.get("introduction"):
+        lines += [learning_path["introduction"], ""]
+    for level in learning_path.get("learning_path", []):
+        lines += [f"### {level.get('level', '')}", level.get("description", "")]
+        lines += [f"- {resource}" for resource in level.get("resources", [])] + [""]
+    if learning_path.get("time_commitment"):
+        lines += [f"Time commitment: {learning_path['time_commitment']}", ""]
+    lines += ["## Resources", ""]
+    for resource in resources:
+        lines.append(f"- [{resource['title']}]({resource['url']}): {resource.get('description', '')} "
+                     f"({resource.get('format', 'Unknown')}, {resource.get('cost', 'Unknown')}, {resource.get('level', 'All levels')})")
+    return "\n".join(lines).rstrip() + "\n"
+
+
+def fallback_counts():
+    """Fallbacks recorded so far by each of the four agents (src/llm/metrics.py)."""
+    return Counter({agent: fallbacks.get((agent,)) for agent in AGENTS})
+
+
+async def build_module(skill):
+    """Run the four agents for ``skill`` and return the module document."""
+    knowledge_base, learning_path, resources, module = await asyncio.gather(
+        professor_agent_async([skill]),
+        advisor_agent_async([skill]),
+        librarian_agent_async([skill]),
+        module_generator_agent_async(skill),
+    )
+    resources = resources.get(skill) or next(iter(resources.values()), [])
+    return module_document(skill, knowledge_base, learning_path, resources, module)
+
+
+async def build_curriculum(skills, user_id, checkpoint=None, concurrency=CURRICULUM_CONCURRENCY, batch_size=CURRICULUM_BATCH_SIZE):
+    """Generate and save modules for ``skills``; returns a report dict of counts and timings."""
+    started = time.monotonic()
+    # The agents record their fallbacks in the process-wide metrics; this run's share is the difference
+    fallbacks_before = fallback_counts()
+    done = read_checkpoint(checkpoint)
+    todo = [skill for skill in skills if skill not in done]
+    report = {"skills": len(skills), "skipped": len(skills) - len(todo), "generated": 0, "saved": 0,
+              "failed": 0, "save_failures": 0, "fallbacks": Counter()}
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    save_lock = asyncio.Lock()
+    rows = []
+
+    async def flush():
+        batch = rows[:]
+        del rows[:]
+        if not batch:
+            return
+        # The Supabase client is blocking; keep it off the event loop
+        if await asyncio.to_thread(save_modules, batch, False):
+            report["saved"] += len(batch)
+            if checkpoint:
+                append_checkpoint(checkpoint, [row["skill"] for row in batch])
+        else:
+            report["save_failures"] += len(batch)
+            logger.error(f"Insert of {len(batch)} modules failed; they will be rebuilt on the next run")
+
+    async def one(skill):
+        async with semaphore:
+            try:
+                content = await build_module(skill)
+            except Exception as e:
+                report["failed"] += 1
+                logger.error(f"Building {skill} failed: {e}")
+                return
+        report["generated"] += 1
+        async with save_lock:
+            rows.append({"user_id": user_id, "skill": skill, "content": content})
+            if len(rows) >= batch_size:
+                await flush()
+
+    await asyncio.gather(*(one(skill) for skill in todo))
+    async with save_lock:
+        await flush()
+    report["fallbacks"] = fallback_counts() - fallbacks_before
+    report["seconds"] = time.monotonic() - started
+    return report
+
+
+def format_report(report):
+    minutes = report["seconds"] / 60
+    rate = report["generated"] / minutes if minutes else 0.0
+    fallbacks = ", ".join(f"{agent} {count}" for agent, count in sorted(report["fallbacks"].items())) or "none"
+    return (
+        f"{report['skills']} skills: {report['skipped']} already done, {report['generated']} generated, "
+        f"{report['saved']} saved in {report['seconds']:.1f}s ({rate:.1f} skills/min)\n"
+        f"errors: {report['failed']} failed, {report['save_failures']} not saved; agent fallbacks: {fallbacks}"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate learning modules for a list of skills.")
+    parser.add_argument("skills_file", help="CSV with a 'skill' column, or a JSON list")
+    parser.add_argument("--user-id", required=True, help="owner of the saved modules")
+    parser.add_argument("--checkpoint", help="progress file; defaults to <skills_file>.checkpoint.jsonl")
+    parser.add_argument("--concurrency", type=int, default=CURRICULUM_CONCURRENCY, help="skills built at once")
+    parser.add_argument("--batch-size", type=int, default=CURRICULUM_BATCH_SIZE, help="rows per insert")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    skills = read_skills(args.skills_file)
+    checkpoint = args.checkpoint or f"{args.skills_file}.checkpoint.jsonl"
+    report = run_sync(build_curriculum(skills, args.user_id, checkpoint, args.concurrency, args.batch_size))
+    print(format_report(report))
+    return 1 if report["failed"] or report["save_failures"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
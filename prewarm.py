@@ -0,0 +1,154 @@
+"""Warm the LLM response cache for the skills most sessions ask about.
+
+Run from the repository root, e.g. every hour from cron:
+
+    python prewarm.py                           # most saved skills in the modules table
+    python prewarm.py --skills-file skills.txt  # one skill set per line, "Python, SQL" for several
+    python prewarm.py --top 50 --force          # regenerate even recently warmed sets
+
+Every skill set gets the five Results page artifacts (knowledge base,
+learning path, resources, exercises, quiz) built by the same agent calls the
+page makes, so the app's requests find them in the shared SQLite cache tier.
+The knowledge base and learning path are reused until they expire and the
+rest are regenerated on top of them (see warm_artifacts).
+A set is regenerated only when its last warm is older than --refresh-hours.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from src.agents.advisor import advisor_agent_async
+from src.agents.assistant import assistant_agent_async
+from src.agents.librarian import librarian_agent_async
+from src.agents.professor import professor_sections_async, join_sections
+from src.agents.quiz import quiz_generator_agent_async
+from src.config.settings import (
+    PREWARM_CONCURRENCY,
+    PREWARM_REFRESH_HOURS,
+    PREWARM_SKILLS_FILE,
+    PREWARM_STATE_PATH,
+    PREWARM_TOP_N,
+)
+from src.db.supabase_client import get_popular_skills
+from src.llm import breaker_states, bypass_cache, gather_bounded, get_cache, run_sync
+
+logger = logging.getLogger("prewarm")
+
+
+def read_skills_file(path):
+    """Skill sets from ``path``: one per line, comma-separated skills, '#' starts a comment."""
+    skill_sets = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            skills = [s.strip() for s in line.split("#", 1)[0].split(",") if s.strip()]
+            if skills:
+                skill_sets.append(skills)
+    return skill_sets
+
+
+def load_skill_sets(skills_file, top):
+    if skills_file:
+        return read_skills_file(skills_file)[:top]
+    return [[skill] for skill in get_popular_skills(top)]
+
+
+def load_state(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(path, state):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+
+
+def state_key(skills):
+    return ", ".join(skills)
+
+
+async def warm_artifacts(skills):
+    """
+    Generate the five Results page artifacts for ``skills`` in the page's dependency order.
+
+    The knowledge base and learning path go into the quiz and exercise prompts,
+    so they are read through the cache and only generated when missing or
+    expired: a fresh copy here would key the quiz on text that app processes,
+    still holding the old copy in memory, never send. The artifacts nothing
+    else depends on are regenerated, which restarts their TTL.
+    """
+    async def fresh(coro):
+        with bypass_cache():
+            return await coro
+
+    async def knowledge_base_then_quiz():
+        knowledge_base = join_sections(await professor_sections_async(skills))
+        await fresh(quiz_generator_agent_async(skills, knowledge_base or "No knowledge base available."))
+
+    async def learning_path_then_exercises():
+        await fresh(assistant_agent_async(skills, learning_path=await advisor_agent_async(skills)))
+
+    await asyncio.gather(knowledge_base_then_quiz(), learning_path_then_exercises(), fresh(librarian_agent_async(skills)))
+
+
+async def warm_skill_sets(skill_sets, state, refresh_hours=PREWARM_REFRESH_HOURS, force=False, concurrency=PREWARM_CONCURRENCY):
+    """
+    Regenerate every skill set not warmed within ``refresh_hours`` and record
+    when it was warmed in ``state``. Returns the sets that were warmed.
+    """
+    now = time.time()
+    due = [s for s in skill_sets if force or now - state.get(state_key(s), 0) >= refresh_hours * 3600]
+
+    async def warm(skills):
+        started = time.monotonic()
+        try:
+            await warm_artifacts(skills)
+        except Exception as e:
+            logger.error(f"Warming {state_key(skills)} failed: {e}")
+            return False
+        # Agents fall back quietly while Gemini is down; leave those sets due for the next run
+        if any(breaker["state"] != "closed" for breaker in breaker_states().values()):
+            logger.warning(f"Gemini unavailable while warming {state_key(skills)}; will retry next run")
+            return False
+        state[state_key(skills)] = time.time()
+        logger.info(f"Warmed {state_key(skills)} in {time.monotonic() - started:.1f}s")
+        return True
+
+    results = await gather_bounded([warm(skills) for skills in due], concurrency)
+    return [skills for skills, ok in zip(due, results) if ok]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-generate cached agent output for popular skills.")
+    parser.add_argument("--skills-file", default=PREWARM_SKILLS_FILE, help="skill sets to warm instead of the most saved skills")
+    parser.add_argument("--top", type=int, default=PREWARM_TOP_N, help="number of skill sets to warm")
+    parser.add_argument("--refresh-hours", type=float, default=PREWARM_REFRESH_HOURS, help="regenerate sets warmed longer ago than this")
+    parser.add_argument("--concurrency", type=int, default=PREWARM_CONCURRENCY, help="skill sets warmed at once")
+    parser.add_argument("--state", default=PREWARM_STATE_PATH, help="file recording when each set was last warmed")
+    parser.add_argument("--force", action="store_true", help="regenerate every set regardless of age")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    cache = get_cache()
+    if cache is None or not cache.path:
+        logger.error("The LLM cache has no disk tier (LLM_CACHE_ENABLED / LLM_CACHE_PATH), so the app could not see warmed entries")
+        return 1
+
+    skill_sets = load_skill_sets(args.skills_file, args.top)
+    state = load_state(args.state)
+    warmed = run_sync(warm_skill_sets(skill_sets, state, args.refresh_hours, args.force, args.concurrency))
+    save_state(args.state, state)
+    logger.info(f"Warmed {len(warmed)} of {len(skill_sets)} skill sets; the rest were fresh or failed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
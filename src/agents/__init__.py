@@ -1,11 +1,11 @@
-from .professor import professor_agent
-from .advisor import advisor_agent
-from .librarian import librarian_agent
-from .assistant import assistant_agent
-from .resume import resume_scanner_agent, split_skills
-from .quiz import quiz_generator_agent, generate_questions
-from .analyzer import quiz_analyzer_agent
-from .module import module_generator_agent
+from .professor import professor_agent, professor_agent_async, professor_sections, professor_sections_async, stream_knowledge_base, stream_knowledge_base_async
+from .advisor import advisor_agent, advisor_agent_async
+from .librarian import librarian_agent, librarian_agent_async
+from .assistant import assistant_agent, assistant_agent_async, stream_exercises, stream_exercises_async
+from .resume import resume_scanner_agent, resume_scanner_agent_async, split_skills, split_skills_async
+from .quiz import quiz_generator_agent, quiz_generator_agent_async, generate_questions, generate_questions_async
+from .analyzer import quiz_analyzer_agent, quiz_analyzer_agent_async
+from .module import module_generator_agent, module_generator_agent_async, generate_modules, generate_modules_async, stream_module, stream_module_async
 
 __all__ = [
     "professor_agent",
@@ -17,5 +17,25 @@ __all__ = [
     "quiz_analyzer_agent",
     "module_generator_agent",
     "split_skills",
-    "generate_questions"
-]
\ No newline at end of file
+    "generate_questions",
+    "generate_modules",
+    "professor_sections",
+    "stream_knowledge_base",
+    "stream_exercises",
+    "stream_module",
+    "professor_agent_async",
+    "professor_sections_async",
+    "advisor_agent_async",
+    "librarian_agent_async",
+    "assistant_agent_async",
+    "resume_scanner_agent_async",
+    "quiz_generator_agent_async",
+    "quiz_analyzer_agent_async",
+    "module_generator_agent_async",
+    "split_skills_async",
+    "generate_questions_async",
+    "generate_modules_async",
+    "stream_knowledge_base_async",
+    "stream_exercises_async",
+    "stream_module_async"
+]
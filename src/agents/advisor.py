@@ -1,10 +1,11 @@
-import requests
-import json
-from src.config.settings import GEMINI_API_KEY
-import time
-import re
+import asyncio
+from src.llm import agenerate, run_sync, coalesced, record_fallback, LLMError
+from src.utils.json_repair import loads
+from src.agents.schemas import LEARNING_PATH, LEARNING_PATH_VALIDATOR
+from src.agents.taxonomy import stored_subskills_async
 
-def advisor_agent(skills):
+@coalesced("advisor", fallback=lambda skills: fallback_learning_path(skills or ["general learning"]))
+async def advisor_agent_async(skills):
     # Ensure skills is a list and not empty
     if not skills:
         print("Warning: No skills provided to advisor_agent")
@@ -15,8 +16,9 @@ def advisor_agent(skills):
         skills = [skills]
 
     print(f"Generating learning path for skills: {', '.join(skills)}")
+    # Skills already in the subskill taxonomy get the same components as the quiz breakdown
+    components = asyncio.ensure_future(stored_subskills_async(skills))
 
-    url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-pro:generateContent"
     prompt = (
         f"You are an expert educator who creates comprehensive learning guides. Create a detailed guide for learning this skill or list of skills: {', '.join(skills)}. "
         "Your guide should include: "
@@ -34,178 +36,52 @@ def advisor_agent(skills):
         "\"challenges\": [{\"challenge\": string, \"solution\": string}], \"practice_exercises\": [string], "
         "\"progress_metrics\": [string], \"time_commitment\": string, \"milestones\": [{\"title\": string, \"description\": string}]}"
     )
-    headers = {"Content-Type": "application/json"}
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {
-            "response_mime_type": "application/json",
-            "temperature": 0.1,
-            "maxOutputTokens": 4000
-        }
+    config = {
+        "response_mime_type": "application/json",
+        "response_schema": LEARNING_PATH,
+        "temperature": 0.1,
+        "maxOutputTokens": 4000
     }
     for attempt in range(3):
+        raw_text = None
         try:
-            response = requests.post(f"{url}?key={GEMINI_API_KEY}", headers=headers, json=payload, timeout=45)
-            response.raise_for_status()
-            data = response.json()
-            if "candidates" not in data:
-                raise ValueError("No 'candidates' in response")
-
-            json_text = data["candidates"][0]["content"]["parts"][0]["text"]
+            raw_text = (await agenerate("gemini-1.5-pro", prompt, config, agent="advisor", refresh=attempt > 0)).text
+            learning_path = loads(raw_text)
+            if not isinstance(learning_path, dict):
+                raise ValueError(f"Expected a JSON object, got {type(learning_path).__name__}")
 
-            # Remove any markdown formatting that might interfere with JSON parsing
-            if json_text.startswith("```json"):
-                json_text = json_text.split("```json")[1]
-            if json_text.endswith("```"):
-                json_text = json_text.split("```")[0]
+            # Keep the sections that match the schema; only broken or missing ones come from the fallback
+            fallback = fallback_learning_path(skills)
+            replaced = []
+            for field, validator in LEARNING_PATH_VALIDATOR.properties.items():
+                if validator.errors(learning_path.get(field)):
+                    learning_path[field] = fallback[field]
+                    replaced.append(field)
+            if len(replaced) == len(fallback):
+                raise ValueError("No usable sections in the learning path")
+            if replaced:
+                print(f"Advisor filled {', '.join(replaced)} from the fallback learning path")
 
-            # Fix JSON syntax errors and missing brackets
-            print("Checking and fixing JSON structure...")
-            
-            # Look for specific pattern issues - like missing closing bracket for dictionary in array
-            json_text = re.sub(r'\{([^{}]*)\},\s*\{([^{}]*)\{', r'{\1}, {\2},\n{', json_text)
-            
-            # Try to find and fix unclosed objects in arrays
-            json_text = re.sub(r'(\{[^{}]*)\},\s*(\{[^{}]*)\},\s*\{([^{},]*)("|\')\s*:\s*("|\')()', r'\1}, \2}, {\3\4: \5}', json_text)
-            
-            # Fix trailing commas before closing brackets/braces
-            json_text = re.sub(r',(\s*[\]}])', r'\1', json_text)
-            
-            # Check for balanced braces and brackets
-            open_braces = json_text.count('{')
-            close_braces = json_text.count('}')
-            open_brackets = json_text.count('[')
-            close_brackets = json_text.count(']')
-            
-            # Fix unmatched braces or brackets
-            if (open_braces != close_braces) or (open_brackets != close_brackets):
-                print(f"Imbalanced JSON: {open_braces}/{close_braces} braces, {open_brackets}/{close_brackets} brackets")
-                
-                # Track structure to determine missing brackets more accurately
-                stack = []
-                expected_closers = {'{': '}', '[': ']'}
-                
-                # Scan through string to find where things went wrong
-                for i, char in enumerate(json_text):
-                    if char in '{[':
-                        stack.append(char)
-                    elif char in ']}':
-                        if not stack or expected_closers[stack.pop()] != char:
-                            # Found a mismatch or unexpected closer
-                            print(f"JSON syntax error at position {i}: unexpected '{char}'")
-                
-                # Add missing closing characters in the right order
-                while stack:
-                    char = stack.pop()
-                    if char == '{':
-                        json_text += '}'
-                    elif char == '[':
-                        json_text += ']'
+            return with_components(learning_path, await components)
+        except LLMError as e:
+            # Transient failures were already retried by the client
+            print(f"Gemini error in Advisor: {e}")
+            break
+        except Exception as e:
+            print(f"Gemini error in Advisor (attempt {attempt + 1}): {e}, Response: {raw_text if raw_text is not None else 'No response'}")
 
-            try:
-                # Try to parse the fixed JSON
-                learning_path = json.loads(json_text.strip())
-            except json.JSONDecodeError as e:
-                print(f"Still having JSON issues: {e}")
-                # Try more aggressive fixes if specific errors are found
-                error_msg = str(e)
-                
-                if "Expecting property name enclosed in double quotes" in error_msg:
-                    # Fix missing quotes around property names
-                    match = re.search(r'line\s+\d+\s+column\s+(\d+)', error_msg)
-                    if match:
-                        pos = int(match.group(1)) - 1
-                        # Find the problematic spot and try to fix it
-                        if pos < len(json_text):
-                            before = json_text[:pos]
-                            after = json_text[pos:]
-                            if re.search(r'[{,]\s*([a-zA-Z_][a-zA-Z0-9_]*)\s*:', after):
-                                # Add quotes around property name
-                                fixed = re.sub(r'([{,])\s*([a-zA-Z_][a-zA-Z0-9_]*)\s*:', r'\1 "\2":', after)
-                                json_text = before + fixed
-                
-                # Try a simple fallback fix for missing closing brackets in arrays
-                if "learning_path" in json_text and "level" in json_text:
-                    # Look for learning_path array specifically
-                    path_start = json_text.find('"learning_path"')
-                    if path_start > 0:
-                        path_bracket = json_text.find('[', path_start)
-                        if path_bracket > 0:
-                            # Count braces in learning_path array
-                            path_text = json_text[path_bracket:]
-                            open_braces = 0
-                            for i, char in enumerate(path_text):
-                                if char == '{':
-                                    open_braces += 1
-                                elif char == '}':
-                                    open_braces -= 1
-                                # Fix missing brace after a level entry
-                                if open_braces > 0 and char == ',' and '"level"' in path_text[max(0, i-50):i]:
-                                    # Find the location of the comma after "resources"
-                                    resources_end = path_text.rfind('"]', 0, i)
-                                    if resources_end > 0 and path_text[resources_end:i].count('}') == 0:
-                                        # Add missing closing brace
-                                        path_text = path_text[:resources_end+2] + '}' + path_text[resources_end+2:]
-                            
-                            json_text = json_text[:path_bracket] + path_text
-                
-                # Final attempt to parse after fixes
-                learning_path = json.loads(json_text.strip())
+    print("Using fallback learning path due to API errors")
+    record_fallback("advisor")
+    return with_components(fallback_learning_path(skills), await components)
 
-            # Ensure required keys exist
-            if "milestones" not in learning_path:
-                learning_path["milestones"] = [
-                    {"title": f"Understand {skill} fundamentals", "description": f"Learn the basic concepts of {skill}"}
-                    for skill in skills
-                ]
-
-            return learning_path
-        except Exception as e:
-            print(f"Gemini error in Advisor (attempt {attempt + 1}): {e}, Response: {response.text if 'response' in locals() else 'No response'}")
-            
-            # Extract raw JSON for manual fixing if possible
-            if 'response' in locals() and hasattr(response, 'text'):
-                try:
-                    # Get the raw text and try custom parsing fixes
-                    data = response.json()
-                    raw_json = data["candidates"][0]["content"]["parts"][0]["text"]
-                    print(f"Attempting manual JSON recovery with {len(raw_json)} characters of text")
-                    
-                    # Common pattern fixes for dog walking example
-                    if "dog walking" in raw_json.lower() or "leash" in raw_json.lower():
-                        # Fix specific issue in learning_path array with missing closing braces
-                        learning_path_pattern = r'"learning_path":\s*\[\s*\{.*?"Intermediate".*?resources.*?\]'
-                        if re.search(learning_path_pattern, raw_json, re.DOTALL):
-                            raw_json = re.sub(r'(\{.*?"Intermediate".*?"resources":\s*\[[^\]]*\])(,\s*\{)', r'\1}\2', raw_json, flags=re.DOTALL)
-                    
-                    # Try fixing brackets with a simpler approach
-                    if "Expecting property name" in str(e) or "Expecting ',' delimiter" in str(e):
-                        # Look for missing closing braces after resources arrays
-                        raw_json = re.sub(r'"resources":\s*\[[^\]]*\](?!\s*})(?=\s*,\s*\{)', r'"resources": []\1}', raw_json)
-                    
-                    # Add missing closing braces/brackets and try again
-                    open_braces = raw_json.count('{')
-                    close_braces = raw_json.count('}')
-                    open_brackets = raw_json.count('[')
-                    close_brackets = raw_json.count(']')
-                    
-                    # Make sure we have balanced JSON before returning
-                    if open_braces > close_braces:
-                        raw_json += '}' * (open_braces - close_braces)
-                    if open_brackets > close_brackets:
-                        raw_json += ']' * (open_brackets - close_brackets)
-                    
-                    # Try to parse the fixed JSON
-                    learning_path = json.loads(raw_json)
-                    print("Successfully recovered JSON from error state")
-                    return learning_path
-                except Exception as recovery_error:
-                    print(f"JSON recovery failed: {recovery_error}")
-            
-            time.sleep(5 * (attempt + 1))
+def with_components(learning_path, components):
+    if components:
+        learning_path["skill_components"] = components
+    return learning_path
 
+def fallback_learning_path(skills):
     # Fallback with more detailed structure
-    fallback = {
+    return {
         "introduction": f"Learn {', '.join(skills)} to boost your career and problem-solving abilities!",
         "skill_components": [f"Core {skill} concepts" for skill in skills],
         "learning_path": [
@@ -225,5 +101,6 @@ def advisor_agent(skills):
             {"title": f"Master advanced {skills[0]} techniques", "description": f"Learn complex patterns and best practices"}
         ]
     }
-    print("Using fallback learning path due to API errors")
-    return fallback
+
+def advisor_agent(skills):
+    return run_sync(advisor_agent_async(skills))
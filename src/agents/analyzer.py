@@ -1,85 +1,74 @@
 import json
-import re
-from src.config.settings import GEMINI_API_KEY
-import requests
-import time
+from src.llm import agenerate, run_sync, gather_bounded, record_fallback, LLMError
+from src.config.settings import (
+    LLM_FANOUT_LIMIT,
+    SUBSKILL_MATCH_THRESHOLD,
+    SUBSKILL_MATCH_MARGIN,
+    SUBSKILL_MAPPER_OFFLINE,
+)
+from src.utils.similarity import best_matches
+from src.utils.json_repair import loads, JSONRepairError
+from src.agents.explanations import lookup_explanation_async, remember_explanation_async
+from src.agents.taxonomy import taxonomy_async
+from src.agents.schemas import SUBSKILLS, SUBSKILL_MAPPING, SUBSKILL_MAPPINGS, MISTAKE_FEEDBACK, MISTAKE_FEEDBACK_VALIDATOR
 
-def generate_subskills(main_skill):
-    url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-pro:generateContent"
+async def generate_subskills_async(main_skill, fallback=True):
+    """Fresh subskills from Gemini; on failure the canned ones, or None when ``fallback`` is False."""
     prompt = (
         f"Generate a list of 5-10 key subskills for learning '{main_skill}'. "
         "Return as a JSON array of strings, e.g., ['Variables', 'Loops', 'Classes']."
     )
-    headers = {"Content-Type": "application/json"}
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {
-            "temperature": 0.2,
-            "maxOutputTokens": 4000
-        }
+    config = {
+        "temperature": 0.2,
+        "maxOutputTokens": 4000,
+        "response_mime_type": "application/json",
+        "response_schema": SUBSKILLS
     }
     for attempt in range(3):
         try:
-            response = requests.post(f"{url}?key={GEMINI_API_KEY}", headers=headers, json=payload, timeout=45)
-            response.raise_for_status()
-            data = response.json()
-            if "candidates" not in data:
-                raise ValueError("No 'candidates' in response")
-            raw_text = data["candidates"][0]["content"]["parts"][0]["text"]
-            cleaned_text = raw_text.strip().strip("```json").strip("```").strip()
-            subskills = json.loads(cleaned_text)
+            raw_text = (await agenerate("gemini-1.5-pro", prompt, config, agent="subskills", refresh=attempt > 0)).text
+            subskills = loads(raw_text)
             if not isinstance(subskills, list) or not all(isinstance(s, str) for s in subskills):
                 raise ValueError("Subskills must be a list of strings")
             print(f"Generated subskills for {main_skill}: {subskills}")
             return subskills
+        except LLMError as e:
+            print(f"Gemini error in Subskills: {e}")
+            break
         except Exception as e:
-            print(f"Gemini error in Subskills (attempt {attempt + 1}): {e}, Response: {response.text if 'response' in locals() else 'No response'}")
-            time.sleep(5 * (attempt + 1))
+            print(f"Gemini error in Subskills (attempt {attempt + 1}): {e}")
+    if not fallback:
+        return None
+    record_fallback("subskills")
+    return fallback_subskills(main_skill)
+
+def fallback_subskills(main_skill):
     return [f"{main_skill} Basics", f"{main_skill} Intermediate", f"{main_skill} Advanced"]
 
-def map_question_to_subskill(question_text, subskills):
-    url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-pro:generateContent"
+async def subskill_taxonomy_async(main_skill, refresh=False):
+    """
+    The main skill's taxonomy row from the store, generated and stored on
+    first use (or as a new version with ``refresh``). None when Gemini fails.
+    """
+    return await taxonomy_async(main_skill, lambda skill: generate_subskills_async(skill, fallback=False), refresh)
+
+async def map_question_to_subskill_async(question_text, subskills):
     prompt = (
         f"Given these subskills: {json.dumps(subskills)}, "
         f"which subskill best matches this question: '{question_text}'? "
         "Return as a JSON object with a 'subskill' key, e.g., {'subskill': 'Variables'}."
     )
-    headers = {"Content-Type": "application/json"}
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {
-            "temperature": 0.1,
-            "maxOutputTokens": 1000,
-            "response_mime_type": "application/json"
-        }
+    config = {
+        "temperature": 0.1,
+        "maxOutputTokens": 1000,
+        "response_mime_type": "application/json",
+        "response_schema": SUBSKILL_MAPPING
     }
     for attempt in range(3):
         try:
-            response = requests.post(f"{url}?key={GEMINI_API_KEY}", headers=headers, json=payload, timeout=30)
-            response.raise_for_status()
-            data = response.json()
-            if "candidates" not in data:
-                raise ValueError("No 'candidates' in response")
-            raw_text = data["candidates"][0]["content"]["parts"][0]["text"]
-            print(f"Map subskill raw response: {raw_text}")  # Debug
-            
-            # Extract only the JSON portion
-            json_pattern = r'```json\s*(.*?)\s*```'
-            json_match = re.search(json_pattern, raw_text, re.DOTALL)
-            if json_match:
-                cleaned_text = json_match.group(1).strip()
-            else:
-                # Try to find anything that looks like a JSON object
-                json_pattern2 = r'\{\s*"subskill"\s*:\s*"[^"]*"\s*\}'
-                json_match2 = re.search(json_pattern2, raw_text)
-                if json_match2:
-                    cleaned_text = json_match2.group(0)
-                else:
-                    cleaned_text = raw_text.strip().strip("```json").strip("```").strip()
-            
-            # Try to parse the JSON
+            raw_text = (await agenerate("gemini-1.5-pro", prompt, config, agent="mapper", refresh=attempt > 0)).text
             try:
-                result = json.loads(cleaned_text)
+                result = loads(raw_text)
                 subskill = result.get("subskill")
                 if subskill and subskill in subskills:
                     return subskill
@@ -94,42 +83,147 @@ def map_question_to_subskill(question_text, subskills):
                     return subskills[0]
                 else:
                     return subskills[0]
-            except json.JSONDecodeError as e:
-                print(f"JSON parsing error in map_question_to_subskill: {e}, text: {cleaned_text}")
-                # Try to extract subskill directly from text
-                subskill_pattern = r'"subskill"\s*:\s*"([^"]*)"'
-                subskill_match = re.search(subskill_pattern, raw_text)
-                if subskill_match:
-                    extracted = subskill_match.group(1)
-                    for s in subskills:
-                        if s.lower() == extracted.lower() or s.lower() in extracted.lower():
-                            return s
+            except JSONRepairError as e:
+                print(f"JSON parsing error in map_question_to_subskill: {e}, text: {raw_text}")
                 return subskills[0]
+        except LLMError as e:
+            print(f"Gemini error in Mapping: {e}")
+            break
         except Exception as e:
-            print(f"Gemini error in Mapping (attempt {attempt + 1}): {e}, Response: {response.text if 'response' in locals() else 'No response'}")
-            time.sleep(5 * (attempt + 1))
+            print(f"Gemini error in Mapping (attempt {attempt + 1}): {e}")
+    record_fallback("mapper")
     question_lower = question_text.lower()
     for subskill in subskills:
         if subskill.lower() in question_lower or any(w in question_lower for w in subskill.lower().split()):
             return subskill
     return subskills[0]
 
-def quiz_analyzer_agent(skills, responses, questions):
-    main_skill = skills[0]
-    subskills = generate_subskills(main_skill)
-    
-    # Grade questions
+def match_subskill(candidate, subskills):
+    """Resolve a model-supplied subskill name to one of ``subskills``, or None."""
+    if not isinstance(candidate, str) or not candidate.strip():
+        return None
+    if candidate in subskills:
+        return candidate
+    lowered = candidate.strip().lower()
+    for s in subskills:
+        if s.lower() == lowered:
+            return s
+    for s in subskills:
+        if s.lower() in lowered or lowered in s.lower():
+            return s
+    return None
+
+async def map_questions_to_subskills_async(question_texts, subskills):
+    """
+    Map every question to a subskill with a single request.
+    Returns {question index: subskill} for the entries the model resolved;
+    callers fall back per question for anything missing.
+    """
+    if not question_texts:
+        return {}
+    numbered = [{"index": i, "question": text} for i, text in enumerate(question_texts)]
+    prompt = (
+        f"Given these subskills: {json.dumps(subskills)}, "
+        "pick the subskill that best matches each of these questions:\n"
+        f"{json.dumps(numbered)}\n"
+        "Use only subskill names from the list. "
+        "Return as a JSON object with a 'mappings' key holding one entry per question, "
+        "e.g., {'mappings': [{'index': 0, 'subskill': 'Variables'}]}."
+    )
+    config = {
+        "temperature": 0.1,
+        "maxOutputTokens": min(4000, 200 + 40 * len(question_texts)),
+        "response_mime_type": "application/json",
+        "response_schema": SUBSKILL_MAPPINGS
+    }
+    for attempt in range(2):
+        try:
+            raw_text = (await agenerate("gemini-1.5-pro", prompt, config, agent="mapper", refresh=attempt > 0)).text
+            result = loads(raw_text)
+            entries = result.get("mappings", []) if isinstance(result, dict) else result
+            if not isinstance(entries, list):
+                raise ValueError("'mappings' must be a list")
+            mapped = {}
+            for entry in entries:
+                if not isinstance(entry, dict):
+                    continue
+                index = entry.get("index")
+                subskill = match_subskill(entry.get("subskill"), subskills)
+                if isinstance(index, int) and 0 <= index < len(question_texts) and subskill:
+                    mapped[index] = subskill
+            print(f"Batch mapped {len(mapped)}/{len(question_texts)} questions to subskills")
+            return mapped
+        except LLMError as e:
+            print(f"Gemini error in Batch Mapping: {e}")
+            break
+        except Exception as e:
+            print(f"Gemini error in Batch Mapping (attempt {attempt + 1}): {e}")
+    return {}
+
+def map_questions_locally(question_texts, subskills, threshold=SUBSKILL_MATCH_THRESHOLD, margin=SUBSKILL_MATCH_MARGIN):
+    """
+    Score every question against every subskill with char n-gram TF-IDF.
+    Returns ({index: subskill} for confident matches, {index: best guess} for the rest).
+    """
+    confident, unsure = {}, {}
+    for i, (best, score, is_confident) in enumerate(best_matches(question_texts, subskills, threshold, margin)):
+        (confident if is_confident else unsure)[i] = subskills[best]
+    return confident, unsure
+
+async def map_quiz_async(skills, questions):
+    """
+    Subskills of the main skill (from its taxonomy) and the subskill of every
+    question, in quiz order. Answers play no part, so this can run as soon as
+    the quiz exists.
+    """
+    try:
+        taxonomy = await subskill_taxonomy_async(skills[0])
+    except LLMError as e:
+        # This caller's deadline passed while another one's generation was still running
+        print(f"Gemini error in Subskills: {e}")
+        taxonomy = None
+    if taxonomy is None:
+        record_fallback("subskills")
+    subskills = taxonomy["subskills"] if taxonomy else fallback_subskills(skills[0])
+    # Map questions locally first; only low-confidence ones go to Gemini in one batch,
+    # and only what the batch cannot resolve falls back to per-question calls
+    question_texts = [q[0] for q in questions]
+    mapped, unsure = map_questions_locally(question_texts, subskills)
+    confident, batched = len(mapped), 0
+    if SUBSKILL_MAPPER_OFFLINE:
+        mapped.update(unsure)
+    elif unsure:
+        unsure_indexes = sorted(unsure)
+        batch = await map_questions_to_subskills_async([question_texts[i] for i in unsure_indexes], subskills)
+        mapped.update({unsure_indexes[j]: subskill for j, subskill in batch.items()})
+        batched = len(batch)
+    missing = [i for i in range(len(questions)) if i not in mapped]
+    if missing:
+        fallbacks = await gather_bounded(
+            [map_question_to_subskill_async(question_texts[i], subskills) for i in missing], LLM_FANOUT_LIMIT
+        )
+        mapped.update(zip(missing, fallbacks))
+    if SUBSKILL_MAPPER_OFFLINE:
+        print(f"Subskill mapping (offline): {confident} confident, {len(unsure)} best local guesses")
+    else:
+        print(f"Subskill mapping: {confident} local, {batched} by batch request, {len(missing)} by per-question request")
+    return {
+        "subskills": subskills,
+        "question_subskills": [mapped[i] for i in range(len(questions))],
+        "taxonomy_version": taxonomy["version"] if taxonomy else None,
+    }
+
+def grade_quiz(responses, questions, quiz_map):
+    """Score and subskill breakdown, computed locally. Feedback starts empty; see explain_mistake_async."""
+    subskills = quiz_map["subskills"]
     graded_questions = []
     correct_count = 0
-    total_questions = len(questions)
-    
-    for q in questions:
+    for q, subskill in zip(questions, quiz_map["question_subskills"]):
         question_text, difficulty, bloom_level, q_type, _, options, correct_answer = q
         user_answer = responses.get(question_text)
         is_correct = user_answer == correct_answer if user_answer else False
         if is_correct:
             correct_count += 1
-        subskill = map_question_to_subskill(question_text, subskills)
         graded_questions.append({
             "question": question_text,
             "user_answer": user_answer or "No answer",
@@ -141,110 +235,105 @@ def quiz_analyzer_agent(skills, responses, questions):
             "subskill": subskill
         })
 
-    # Gemini for feedback
-    url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-pro:generateContent"
-    prompt = (
-        f"Analyze these quiz responses for '{main_skill}':\n"
-        f"{json.dumps(graded_questions, indent=2)}\n\n"
-        "For each question where 'is_correct' is False, provide: "
-        "1. 'why_wrong': Why the user's answer is wrong (reference 'options' and 'user_answer'). "
-        "2. 'why_correct': Why the 'correct_answer' is correct (tie to 'question' and 'subskill'). "
-        "Return as a JSON object with a 'feedback' key mapping question text to objects with 'why_wrong' and 'why_correct', "
-        "e.g., {'feedback': {'Q1': {'why_wrong': '...', 'why_correct': '...'}}}."
-    )
-    headers = {"Content-Type": "application/json"}
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {
-            "temperature": 0.2,
-            "maxOutputTokens": 4000,
-            "response_mime_type": "application/json"
-        }
-    }
-    feedback = {"feedback": {}}
-    for attempt in range(3):
-        try:
-            response = requests.post(f"{url}?key={GEMINI_API_KEY}", headers=headers, json=payload, timeout=45)
-            response.raise_for_status()
-            data = response.json()
-            if "candidates" not in data:
-                raise ValueError("No 'candidates' in response")
-            raw_text = data["candidates"][0]["content"]["parts"][0]["text"]
-            print(f"Raw feedback response: {raw_text}")  # Debug
-            
-            # Extract only the JSON portion
-            json_pattern = r'```json\s*(.*?)\s*```'
-            json_match = re.search(json_pattern, raw_text, re.DOTALL)
-            if json_match:
-                cleaned_text = json_match.group(1).strip()
-            else:
-                # Try to find the JSON object directly
-                if raw_text.startswith("{") and "}" in raw_text:
-                    cleaned_text = raw_text.split("}", 1)[0] + "}"
-                else:
-                    cleaned_text = raw_text.strip().strip("```json").strip("```").strip()
-            
-            # Fix common JSON issues
-            cleaned_text = re.sub(r',\s*}', '}', cleaned_text)
-            cleaned_text = re.sub(r',\s*]', ']', cleaned_text)
-            
-            try:
-                feedback = json.loads(cleaned_text)
-                # Validate feedback structure
-                if not isinstance(feedback.get("feedback", {}), dict):
-                    raise ValueError("Feedback must be a dict")
-                for q, fb in feedback["feedback"].items():
-                    if not all(k in fb for k in ["why_wrong", "why_correct"]):
-                        raise ValueError(f"Feedback for '{q}' missing 'why_wrong' or 'why_correct'")
-                break
-            except json.JSONDecodeError as e:
-                print(f"JSON parsing error: {e}")
-                if attempt == 2:  # Last attempt, create simple feedback
-                    feedback = {"feedback": {}}
-                    for q in graded_questions:
-                        if not q["is_correct"]:
-                            feedback["feedback"][q["question"]] = {
-                                "why_wrong": f"Your answer '{q['user_answer']}' doesn't match the expected answer.",
-                                "why_correct": f"The correct answer is '{q['correct_answer']}' which aligns with {q['subskill']}."
-                            }
-                    break
-                time.sleep(5)
-        except Exception as e:
-            print(f"Gemini error in Analyzer (attempt {attempt + 1}): {e}, Response: {response.text if 'response' in locals() else 'No response'}")
-            time.sleep(5 * (attempt + 1))
-    
-    # Fallback: ensure every wrong answer has feedback
-    for q in graded_questions:
-        if not q["is_correct"] and q["question"] not in feedback["feedback"]:
-            feedback["feedback"][q["question"]] = {
-                "why_wrong": f"'{q['user_answer']}' doesn’t align with {q['subskill']} concepts.",
-                "why_correct": f"'{q['correct_answer']}' is the right fit for {q['subskill']} in this case."
-            }
-
     # Analyze subskills
     proficiency = {subskill: {"correct": 0, "total": 0} for subskill in subskills}
-    struggle_points = {subskill: 0 for subskill in subskills}
-    
     for q in graded_questions:
-        subskill = q["subskill"]
-        proficiency[subskill]["total"] += 1
+        counts = proficiency.setdefault(q["subskill"], {"correct": 0, "total": 0})
+        counts["total"] += 1
         if q["is_correct"]:
-            proficiency[subskill]["correct"] += 1
-
-    for subskill in proficiency:
-        correct = proficiency[subskill]["correct"]
-        total = proficiency[subskill]["total"]
-        score = (correct / total * 100) if total > 0 else 0
-        proficiency[subskill] = score
-        struggle_points[subskill] = score
-    
+            counts["correct"] += 1
+    proficiency = {
+        subskill: (counts["correct"] / counts["total"] * 100) if counts["total"] > 0 else 0
+        for subskill, counts in proficiency.items()
+    }
     gaps = [subskill for subskill, score in proficiency.items() if score < 60]
 
     return {
-        "total_score": correct_count / total_questions * 100,
+        "total_score": correct_count / len(questions) * 100 if questions else 0,
         "graded_questions": graded_questions,
-        "feedback": feedback["feedback"],
+        "feedback": {},
         "proficiency": proficiency,
-        "struggle_points": {s: score for s, score in struggle_points.items() if score < 60},
-        "gaps": gaps
-    }
\ No newline at end of file
+        "struggle_points": {s: score for s, score in proficiency.items() if score < 60},
+        "gaps": gaps,
+        # Breakdowns are comparable only between gradings on the same version
+        "taxonomy_version": quiz_map.get("taxonomy_version")
+    }
+
+async def explain_mistake_async(main_skill, graded_question, check_store=True):
+    """
+    'why_wrong' and 'why_correct' for one wrongly answered question, from the
+    explanation store when it has them. Callers that already missed the store
+    pass check_store=False.
+    """
+    stored = await lookup_explanation_async(graded_question) if check_store else None
+    if stored is not None:
+        return stored
+    # Only what the explanation needs, without indentation
+    payload = {key: graded_question[key] for key in ("question", "options", "user_answer", "correct_answer", "subskill")}
+    prompt = (
+        f"A learner got this '{main_skill}' quiz question wrong:\n"
+        f"{json.dumps(payload, separators=(',', ':'))}\n"
+        "In one or two sentences each, give 'why_wrong': why the user's answer is wrong (reference 'options' and 'user_answer'), "
+        "and 'why_correct': why the 'correct_answer' is correct (tie to 'question' and 'subskill'). "
+        "Return as a JSON object with 'why_wrong' and 'why_correct' keys."
+    )
+    config = {
+        "temperature": 0.2,
+        "maxOutputTokens": 400,
+        "response_mime_type": "application/json",
+        "response_schema": MISTAKE_FEEDBACK
+    }
+    for attempt in range(2):
+        try:
+            raw_text = (await agenerate("gemini-1.5-pro", prompt, config, agent="analyzer", refresh=attempt > 0)).text
+            feedback = loads(raw_text)
+            if not MISTAKE_FEEDBACK_VALIDATOR.is_valid(feedback) or not all(feedback[k].strip() for k in ("why_wrong", "why_correct")):
+                raise ValueError(f"Unusable feedback: {raw_text[:200]}")
+            feedback = {"why_wrong": feedback["why_wrong"], "why_correct": feedback["why_correct"]}
+            await remember_explanation_async(graded_question, feedback)
+            return feedback
+        except LLMError as e:
+            print(f"Gemini error in Analyzer: {e}")
+            break
+        except Exception as e:
+            print(f"Gemini error in Analyzer (attempt {attempt + 1}): {e}")
+    record_fallback("analyzer")
+    return fallback_feedback(graded_question)
+
+def fallback_feedback(graded_question):
+    return {
+        "why_wrong": f"'{graded_question['user_answer']}' doesn’t align with {graded_question['subskill']} concepts.",
+        "why_correct": f"'{graded_question['correct_answer']}' is the right fit for {graded_question['subskill']} in this case."
+    }
+
+async def explain_mistakes_async(main_skill, graded_questions):
+    """{question: feedback} for every wrong answer."""
+    mistakes = [q for q in graded_questions if not q["is_correct"]]
+    feedback = await gather_bounded([explain_mistake_async(main_skill, q) for q in mistakes], LLM_FANOUT_LIMIT)
+    return {q["question"]: fb for q, fb in zip(mistakes, feedback)}
+
+async def quiz_analyzer_agent_async(skills, responses, questions):
+    analysis = grade_quiz(responses, questions, await map_quiz_async(skills, questions))
+    analysis["feedback"] = await explain_mistakes_async(skills[0], analysis["graded_questions"])
+    return analysis
+
+def generate_subskills(main_skill):
+    return run_sync(generate_subskills_async(main_skill))
+
+def subskill_taxonomy(main_skill, refresh=False):
+    return run_sync(subskill_taxonomy_async(main_skill, refresh))
+
+def map_question_to_subskill(question_text, subskills):
+    return run_sync(map_question_to_subskill_async(question_text, subskills))
+
+def map_questions_to_subskills(question_texts, subskills):
+    return run_sync(map_questions_to_subskills_async(question_texts, subskills))
+
+def map_quiz(skills, questions):
+    return run_sync(map_quiz_async(skills, questions))
+
+def explain_mistake(main_skill, graded_question, check_store=True):
+    return run_sync(explain_mistake_async(main_skill, graded_question, check_store))
+
+def quiz_analyzer_agent(skills, responses, questions):
+    return run_sync(quiz_analyzer_agent_async(skills, responses, questions))
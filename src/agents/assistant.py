@@ -1,38 +1,32 @@
-import requests
 import json
-from src.config.settings import GEMINI_API_KEY
-from src.agents.advisor import advisor_agent
-import time
+from src.llm import agenerate, run_sync, iterate_sync, gather_bounded, collect_stream, record_fallback
+from src.agents.advisor import advisor_agent_async
+from src.agents.streaming import stream_or_fallback
+from src.config.settings import LLM_FANOUT_LIMIT
 
-def generate_exercises(skill, milestones):
-    url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-pro:generateContent"
+def exercises_request(skill, milestones):
     prompt = (
         f"Generate 3 practical exercises for the skill '{skill}' based on these learning path milestones:\n"
         f"{json.dumps(milestones, indent=2)}\n"
         "For each exercise, provide a description and task in markdown format. "
         "Return as a markdown string."
     )
-    headers = {"Content-Type": "application/json"}
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {
-            "temperature": 0.2,
-            "maxOutputTokens": 4000
-        }
+    config = {
+        "temperature": 0.2,
+        "maxOutputTokens": 4000
     }
-    for attempt in range(3):
-        try:
-            response = requests.post(f"{url}?key={GEMINI_API_KEY}", headers=headers, json=payload, timeout=45)
-            response.raise_for_status()
-            data = response.json()
-            if "candidates" not in data:
-                raise ValueError("No 'candidates' in response")
-            print(f"Exercises generated for {skill}")
-            return data["candidates"][0]["content"]["parts"][0]["text"]
-        except Exception as e:
-            print(f"Gemini error in Assistant (attempt {attempt + 1}): {e}, Response: {response.text if 'response' in locals() else 'No response'}")
-            time.sleep(5 * (attempt + 1))
+    return prompt, config
+
+async def generate_exercises_async(skill, milestones):
+    prompt, config = exercises_request(skill, milestones)
+    try:
+        result = await agenerate("gemini-1.5-pro", prompt, config, agent="assistant")
+        print(f"Exercises generated for {skill}")
+        return result.text
+    except Exception as e:
+        print(f"Gemini error in Assistant: {e}")
     # Fallback with milestone context
+    record_fallback("assistant")
     return (
         f"### {skill} Exercises\n"
         f"1. **Explore {skill} Basics**: Learn the core of {milestones[0]['title'] if milestones else skill}.\n"
@@ -40,7 +34,18 @@ def generate_exercises(skill, milestones):
         f"3. **Build with {skill}**: Create a small project using {milestones[2]['title'] if len(milestones) > 2 else skill}."
     )
 
-def assistant_agent(skills):
+async def stream_exercises_async(skill, milestones):
+    """Yield exercises for ``skill`` as markdown chunks while Gemini writes them."""
+    prompt, config = exercises_request(skill, milestones)
+    async for chunk in stream_or_fallback("gemini-1.5-pro", prompt, config, "assistant",
+                                          lambda: generate_exercises_async(skill, milestones)):
+        yield chunk
+
+async def assistant_agent_async(skills, learning_path=None, on_progress=None):
+    """
+    Return {skill: exercises markdown}. With ``on_progress`` the exercises are
+    streamed and ``on_progress(skill, text_so_far)`` is called per chunk.
+    """
     # Ensure skills is a list
     if not isinstance(skills, list):
         skills = [skills]
@@ -52,16 +57,17 @@ def assistant_agent(skills):
         
     print(f"Generating exercises for skills: {', '.join(skills)}")
     
-    # Get learning path from advisor
+    # Get learning path from advisor unless the caller already has one
     try:
-        learning_path = advisor_agent(skills)
+        if learning_path is None:
+            learning_path = await advisor_agent_async(skills)
         
         # Verify learning_path is a dictionary
         if not isinstance(learning_path, dict):
             print(f"Warning: advisor_agent returned {type(learning_path)} instead of dict")
             learning_path = {}
             
-        exercises = {}
+        jobs = []
         for skill in skills:
             # Check if milestones exist in the learning path
             milestones = learning_path.get("milestones", [])
@@ -75,9 +81,28 @@ def assistant_agent(skills):
                         skill.lower() in m.get("description", "").lower()
                     )
                 ]
-            exercises[skill] = generate_exercises(skill, skill_milestones or milestones or [])
-        return exercises
+            chosen = skill_milestones or milestones or []
+            if on_progress is None:
+                jobs.append(generate_exercises_async(skill, chosen))
+            else:
+                jobs.append(collect_stream(
+                    stream_exercises_async(skill, chosen),
+                    lambda text, skill=skill: on_progress(skill, text)
+                ))
+        # One exercise request per skill, run side by side
+        results = await gather_bounded(jobs, LLM_FANOUT_LIMIT)
+        return dict(zip(skills, results))
     except Exception as e:
         print(f"Error in assistant_agent: {e}")
         # Fallback exercise generation
-        return {skill: f"### {skill} Exercises\n1. Research {skill} basics\n2. Practice {skill} applications\n3. Create a project using {skill}" for skill in skills}
\ No newline at end of file
+        record_fallback("assistant")
+        return {skill: f"### {skill} Exercises\n1. Research {skill} basics\n2. Practice {skill} applications\n3. Create a project using {skill}" for skill in skills}
+
+def generate_exercises(skill, milestones):
+    return run_sync(generate_exercises_async(skill, milestones))
+
+def stream_exercises(skill, milestones):
+    return iterate_sync(stream_exercises_async(skill, milestones))
+
+def assistant_agent(skills, learning_path=None):
+    return run_sync(assistant_agent_async(skills, learning_path))
@@ -0,0 +1,146 @@
+"""Persistent store of mistake explanations.
+
+An explanation depends only on the question, its options, the answer picked
+and the correct answer, so it is keyed by a hash of those four and kept with
+no expiry: everyone who makes the same wrong pick on the same question gets
+the first explanation Gemini wrote for it. Entries live in memory and in a
+SQLite file shared by every process on the host, like src/llm/cache.py.
+Only Gemini's explanations are stored, never the canned fallback.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from src.config.settings import EXPLANATION_STORE_ENABLED, EXPLANATION_STORE_PATH
+from src.llm.cache import is_bypassed
+from src.llm.metrics import record_explanation_lookup
+
+logger = logging.getLogger(__name__)
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def explanation_key(graded_question):
+    material = json.dumps(
+        [graded_question[key] for key in ("question", "options", "user_answer", "correct_answer")],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ExplanationStore:
+    def __init__(self, path=EXPLANATION_STORE_PATH):
+        self.path = path
+        self._memory = {}
+        self._lock = threading.Lock()  # memory tier
+        self._db_lock = threading.Lock()  # the SQLite connection; never held with _lock
+        self._db = None
+        if path:
+            self._open_db()
+
+    def _open_db(self):
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS explanations ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Explanation store disk tier unavailable at {self.path}: {e}")
+            self._db = None
+
+    def get(self, key):
+        """Return the stored explanation for ``key`` or None."""
+        value = self._memory_get(key)
+        if value is None and self._db is not None:
+            with self._db_lock:
+                try:
+                    row = self._db.execute("SELECT value FROM explanations WHERE key = ?", (key,)).fetchone()
+                except sqlite3.Error as e:
+                    logger.error(f"Explanation store read failed: {e}")
+                    row = None
+            if row is not None:
+                value = row[0]
+                with self._lock:
+                    self._memory[key] = value
+        return json.loads(value) if value is not None else None
+
+    def _memory_get(self, key):
+        with self._lock:
+            return self._memory.get(key)
+
+    def set(self, key, feedback):
+        value = json.dumps(feedback)
+        with self._lock:
+            self._memory[key] = value
+        if self._db is not None:
+            with self._db_lock:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO explanations (key, value, created_at) VALUES (?, ?, ?)",
+                        (key, value, time.time()),
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.error(f"Explanation store write failed: {e}")
+
+    async def aget(self, key):
+        """get() for coroutines on the shared loop; the SQLite read runs on a worker thread."""
+        value = self._memory_get(key)
+        if value is not None or self._db is None:
+            return json.loads(value) if value is not None else None
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key, feedback):
+        if self._db is None:
+            self.set(key, feedback)
+        else:
+            await asyncio.to_thread(self.set, key, feedback)
+
+
+def get_explanation_store():
+    """Return the process-wide store, or None when it is disabled."""
+    global _store
+    if not EXPLANATION_STORE_ENABLED:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ExplanationStore()
+    return _store
+
+
+def lookup_explanation(graded_question):
+    """The stored explanation for a wrong answer, or None. Regen (bypass_cache) skips the store."""
+    store = get_explanation_store()
+    if store is None or is_bypassed():
+        return None
+    feedback = store.get(explanation_key(graded_question))
+    record_explanation_lookup(feedback is not None)
+    return feedback
+
+
+async def lookup_explanation_async(graded_question):
+    """lookup_explanation() for coroutines, without blocking the shared loop on SQLite."""
+    store = get_explanation_store()
+    if store is None or is_bypassed():
+        return None
+    feedback = await store.aget(explanation_key(graded_question))
+    record_explanation_lookup(feedback is not None)
+    return feedback
+
+
+async def remember_explanation_async(graded_question, feedback):
+    store = get_explanation_store()
+    if store is not None:
+        await store.aset(explanation_key(graded_question), feedback)
@@ -1,11 +1,17 @@
-import requests
-import json
-from src.config.settings import GEMINI_API_KEY
-import time
+from src.llm import agenerate, run_sync, coalesced, record_fallback, LLMError
+from src.utils.json_repair import loads
+from src.agents.schemas import RESOURCE_LIST_VALIDATOR, resources_schema
 
-def librarian_agent(skills):
-    url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-pro:generateContent"
-    prompt = (
+DEFAULT_FIELDS = {
+    "description": "A resource for learning this skill",
+    "format": "Unknown",
+    "cost": "Unknown",
+    "time_commitment": "Varies",
+    "level": "Beginner"
+}
+
+def resources_prompt(skills):
+    return (
         f"Compile a comprehensive list of learning resources for these skills: {', '.join(skills)}. "
         "For each skill, provide the following types of resources:\n"
         "1. Beginner resources (3-4 items)\n"
@@ -23,129 +29,114 @@ def librarian_agent(skills):
         "Return in clean JSON as a dictionary with skill names as keys and lists of dictionaries as values. "
         "Each dictionary should have these keys: 'title', 'url', 'description', 'format', 'cost', 'time_commitment', 'level'"
     )
-    headers = {"Content-Type": "application/json"}
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}], 
-        "generationConfig": {
+
+def usable_resources(skill, resource_list):
+    """Keep the entries that have a title and url, filling any empty optional field with a default."""
+    valid, invalid = RESOURCE_LIST_VALIDATOR.partition(resource_list)
+    if invalid:
+        print(f"Librarian dropped {len(invalid)} malformed resources for {skill}")
+    for i, resource in enumerate(valid):
+        if not resource["title"]:
+            resource["title"] = f"{skill} Resource {i+1}"
+        if not resource["url"]:
+            resource["url"] = "https://www.google.com/search?q=" + "+".join(skill.split())
+        for field, default in DEFAULT_FIELDS.items():
+            if not resource.get(field):
+                resource[field] = default
+    return valid
+
+@coalesced("librarian", fallback=lambda skills: {skill: fallback_resources(skill) for skill in skills})
+async def librarian_agent_async(skills):
+    # Skills whose resources came back usable are kept; a retry asks only for the rest
+    resources = {}
+    pending = list(skills)
+    for attempt in range(3):
+        config = {
             "response_mime_type": "application/json",
+            "response_schema": resources_schema(pending),
             "temperature": 0.1,
             "maxOutputTokens": 4000
         }
-    }
-    for attempt in range(3):
         try:
-            response = requests.post(f"{url}?key={GEMINI_API_KEY}", headers=headers, json=payload, timeout=45)
-            response.raise_for_status()
-            data = response.json()
-            if "candidates" not in data:
-                raise ValueError("No 'candidates' in response")
-                
-            # Extract the JSON text and clean it if needed
-            json_text = data["candidates"][0]["content"]["parts"][0]["text"]
-            if json_text.startswith("```json"):
-                json_text = json_text.split("```json")[1]
-            if json_text.endswith("```"):
-                json_text = json_text.split("```")[0]
-            
-            # Check if JSON is truncated
-            if "MAX_TOKENS" in str(response.text):
-                try:
-                    # Try to fix truncated JSON
-                    json_text = json_text + "}"
-                except:
-                    pass
-                
-            resources = json.loads(json_text.strip())
-            
-            # Validate and clean up resources
-            if isinstance(resources, dict):
-                for skill, resource_list in resources.items():
-                    if isinstance(resource_list, list):
-                        for i, resource in enumerate(resource_list):
-                            # Ensure all required fields exist
-                            if not isinstance(resource, dict):
-                                resource_list[i] = {
-                                    "title": f"{skill} Resource {i+1}",
-                                    "url": "https://www.google.com/search?q=" + "+".join(skill.split()),
-                                    "description": "A resource for learning this skill",
-                                    "format": "Unknown",
-                                    "cost": "Unknown",
-                                    "time_commitment": "Varies",
-                                    "level": "Beginner"
-                                }
-                                continue
-                                
-                            for field in ["title", "url", "description", "format", "cost", "time_commitment", "level"]:
-                                if field not in resource or not resource[field]:
-                                    if field == "title":
-                                        resource[field] = f"{skill} Resource {i+1}"
-                                    elif field == "url":
-                                        resource[field] = "https://www.google.com/search?q=" + "+".join(skill.split())
-                                    elif field == "description":
-                                        resource[field] = "A resource for learning this skill"
-                                    elif field == "format":
-                                        resource[field] = "Unknown"
-                                    elif field == "cost":
-                                        resource[field] = "Unknown"
-                                    elif field == "time_commitment":
-                                        resource[field] = "Varies"
-                                    elif field == "level":
-                                        resource[field] = "Beginner"
-            
-            return resources
-                
+            result = await agenerate("gemini-1.5-pro", resources_prompt(pending), config, agent="librarian", refresh=attempt > 0)
+
+            # Still cut off after the client's continuation calls; the resources that arrived are kept
+            if result.finish_reason == "MAX_TOKENS":
+                print("Librarian response was truncated")
+            parsed = loads(result.text)
+            if not isinstance(parsed, dict):
+                raise ValueError(f"Expected a JSON object, got {type(parsed).__name__}")
+
+            by_name = {str(name).strip().lower(): value for name, value in parsed.items()}
+            for skill in pending:
+                usable = usable_resources(skill, by_name.get(skill.strip().lower()))
+                if usable:
+                    resources[skill] = usable
+            pending = [skill for skill in pending if skill not in resources]
+            if not pending:
+                break
+            print(f"Librarian missing resources for: {', '.join(pending)}")
+
+        except LLMError as e:
+            print(f"Gemini error in Librarian: {e}")
+            break
         except Exception as e:
-            print(f"Gemini error in Librarian (attempt {attempt + 1}): {e}, Response: {response.text if 'response' in locals() else 'No response'}")
-            time.sleep(5 * (attempt + 1))
-    
-    # Fallback with more detailed structure
-    fallback_resources = {}
-    for skill in skills:
-        fallback_resources[skill] = [
-            {
-                "title": f"{skill} Fundamentals",
-                "url": f"https://www.google.com/search?q={skill}+fundamentals+course",
-                "description": f"A comprehensive introduction to {skill} covering all the basics.",
-                "format": "Online Course",
-                "cost": "Free",
-                "time_commitment": "4-6 hours",
-                "level": "Beginner"
-            },
-            {
-                "title": f"{skill} Documentation",
-                "url": f"https://www.google.com/search?q={skill}+official+documentation",
-                "description": f"Official documentation for {skill} with complete reference guides.",
-                "format": "Documentation",
-                "cost": "Free",
-                "time_commitment": "Self-paced",
-                "level": "All levels"
-            },
-            {
-                "title": f"Advanced {skill} Techniques",
-                "url": f"https://www.google.com/search?q=advanced+{skill}+techniques",
-                "description": f"For experienced users looking to master advanced concepts in {skill}.",
-                "format": "Tutorial",
-                "cost": "Free",
-                "time_commitment": "10-15 hours",
-                "level": "Advanced"
-            },
-            {
-                "title": f"Building Projects with {skill}",
-                "url": f"https://www.google.com/search?q=building+projects+with+{skill}",
-                "description": f"Learn {skill} by building practical projects from scratch.",
-                "format": "Project-based Tutorial",
-                "cost": "Free",
-                "time_commitment": "15-20 hours",
-                "level": "Intermediate"
-            },
-            {
-                "title": f"Interactive {skill} Practice",
-                "url": f"https://www.google.com/search?q=interactive+{skill}+practice+exercises",
-                "description": f"Hands-on exercises to practice your {skill} skills with immediate feedback.",
-                "format": "Interactive Exercises",
-                "cost": "Free/Freemium",
-                "time_commitment": "Self-paced",
-                "level": "Beginner to Intermediate"
-            }
-        ]
-    return fallback_resources
\ No newline at end of file
+            print(f"Gemini error in Librarian (attempt {attempt + 1}): {e}")
+
+    if pending:
+        record_fallback("librarian")
+    for skill in pending:
+        resources[skill] = fallback_resources(skill)
+    return resources
+
+def fallback_resources(skill):
+    return [
+        {
+            "title": f"{skill} Fundamentals",
+            "url": f"https://www.google.com/search?q={skill}+fundamentals+course",
+            "description": f"A comprehensive introduction to {skill} covering all the basics.",
+            "format": "Online Course",
+            "cost": "Free",
+            "time_commitment": "4-6 hours",
+            "level": "Beginner"
+        },
+        {
+            "title": f"{skill} Documentation",
+            "url": f"https://www.google.com/search?q={skill}+official+documentation",
+            "description": f"Official documentation for {skill} with complete reference guides.",
+            "format": "Documentation",
+            "cost": "Free",
+            "time_commitment": "Self-paced",
+            "level": "All levels"
+        },
+        {
+            "title": f"Advanced {skill} Techniques",
+            "url": f"https://www.google.com/search?q=advanced+{skill}+techniques",
+            "description": f"For experienced users looking to master advanced concepts in {skill}.",
+            "format": "Tutorial",
+            "cost": "Free",
+            "time_commitment": "10-15 hours",
+            "level": "Advanced"
+        },
+        {
+            "title": f"Building Projects with {skill}",
+            "url": f"https://www.google.com/search?q=building+projects+with+{skill}",
+            "description": f"Learn {skill} by building practical projects from scratch.",
+            "format": "Project-based Tutorial",
+            "cost": "Free",
+            "time_commitment": "15-20 hours",
+            "level": "Intermediate"
+        },
+        {
+            "title": f"Interactive {skill} Practice",
+            "url": f"https://www.google.com/search?q=interactive+{skill}+practice+exercises",
+            "description": f"Hands-on exercises to practice your {skill} skills with immediate feedback.",
+            "format": "Interactive Exercises",
+            "cost": "Free/Freemium",
+            "time_commitment": "Self-paced",
+            "level": "Beginner to Intermediate"
+        }
+    ]
+
+def librarian_agent(skills):
+    return run_sync(librarian_agent_async(skills))
@@ -1,29 +1,25 @@
-import requests
-import json
-from src.config.settings import GEMINI_API_KEY
-import time
+from src.llm import agenerate, run_sync, iterate_sync, gather_bounded, collect_stream, record_fallback
+from src.agents.streaming import stream_or_fallback
+from src.config.settings import LLM_FANOUT_LIMIT
 
-def module_generator_agent(topic):
-    url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
-    prompt = (
+def module_prompt(topic):
+    return (
         f"Generate a learning module for {topic} using Bloom's Taxonomy. Include markdown sections for: "
         "1. Remembering (key facts), 2. Understanding (explanations), 3. Applying (simple examples), "
         "4. Analyzing (breakdown of concepts), 5. Evaluating (judging approaches), 6. Creating (design task). "
         "Return in markdown format."
     )
-    headers = {"Content-Type": "application/json"}
-    payload = {"contents": [{"parts": [{"text": prompt}]}]}
-    for attempt in range(3):
-        try:
-            response = requests.post(f"{url}?key={GEMINI_API_KEY}", headers=headers, json=payload, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            if "candidates" not in data:
-                raise ValueError("No 'candidates' in response")
-            return data["candidates"][0]["content"]["parts"][0]["text"]
-        except Exception as e:
-            print(f"Gemini error in Module Generator (attempt {attempt + 1}): {e}, Response: {response.text if 'response' in locals() else 'No response'}")
-            time.sleep(2 ** attempt)
+
+async def module_generator_agent_async(topic):
+    prompt = module_prompt(topic)
+    try:
+        return (await agenerate("gemini-2.0-flash", prompt, agent="module")).text
+    except Exception as e:
+        print(f"Gemini error in Module Generator: {e}")
+    record_fallback("module")
+    return fallback_module(topic)
+
+def fallback_module(topic):
     return (
         f"# Learning Module for {topic}\n"
         f"## Remembering\nKey facts about {topic}...\n"
@@ -32,4 +28,32 @@ def module_generator_agent(topic):
         f"## Analyzing\nBreaking down {topic}...\n"
         f"## Evaluating\nJudging {topic} approaches...\n"
         f"## Creating\nDesign a {topic} solution..."
-    )
\ No newline at end of file
+    )
+
+async def stream_module_async(topic):
+    """Yield the learning module for ``topic`` as markdown chunks while Gemini writes it."""
+    async for chunk in stream_or_fallback("gemini-2.0-flash", module_prompt(topic), None, "module",
+                                          lambda: module_generator_agent_async(topic)):
+        yield chunk
+
+async def generate_modules_async(topics, on_progress=None):
+    """
+    Generate one module per topic concurrently, in input order. With
+    ``on_progress`` the modules are streamed and ``on_progress(topic, text_so_far)``
+    is called per chunk.
+    """
+    def build(topic):
+        if on_progress is None:
+            return module_generator_agent_async(topic)
+        return collect_stream(stream_module_async(topic), lambda text: on_progress(topic, text))
+
+    return await gather_bounded([build(topic) for topic in topics], LLM_FANOUT_LIMIT)
+
+def module_generator_agent(topic):
+    return run_sync(module_generator_agent_async(topic))
+
+def stream_module(topic):
+    return iterate_sync(stream_module_async(topic))
+
+def generate_modules(topics):
+    return run_sync(generate_modules_async(topics))
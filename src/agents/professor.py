@@ -1,40 +1,87 @@
-import requests
-import json
-from src.config.settings import GEMINI_API_KEY
-import time
+from src.llm import agenerate, run_sync, iterate_sync, gather_bounded, collect_stream, coalesce, record_fallback
+from src.llm.cache import is_bypassed
+from src.llm.singleflight import normalize_skills
+from src.agents.streaming import stream_or_fallback
+from src.config.settings import PROFESSOR_CONCURRENCY
 
-def generate_knowledge_base(skill):
-    url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-pro:generateContent"
+def fallback_knowledge_base(skill):
+    return f"# {skill}\n## Introduction\nOverview of {skill}.\n## Key Concepts\n- Basics\n## Examples\n- Example 1"
+
+def knowledge_base_request(skill):
     prompt = (
         f"Create a detailed knowledge base for the skill: {skill}. "
         "Include: 1. Introduction (overview), 2. Key Concepts (list), 3. Detailed explination of each Key Concept in list, 4. Examples (code/text). "
         "Return in markdown format as a single string."
     )
-    headers = {"Content-Type": "application/json"}
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {
-            "temperature": 0.2,
-            "maxOutputTokens": 4000
-        }
+    config = {
+        "temperature": 0.2,
+        "maxOutputTokens": 4000
     }
-    for attempt in range(3):
-        try:
-            response = requests.post(f"{url}?key={GEMINI_API_KEY}", headers=headers, json=payload, timeout=45)
-            response.raise_for_status()
-            data = response.json()
-            if "candidates" not in data:
-                raise ValueError("No 'candidates' in response")
-            print(f"Knowledge base generated for {skill}")
-            return data["candidates"][0]["content"]["parts"][0]["text"]
-        except Exception as e:
-            print(f"Gemini error in Professor (attempt {attempt + 1}): {e}, Response: {response.text if 'response' in locals() else 'No response'}")
-            time.sleep(5 * (attempt + 1))
+    return prompt, config
+
+async def generate_knowledge_base_async(skill):
+    prompt, config = knowledge_base_request(skill)
+    try:
+        result = await agenerate("gemini-1.5-pro", prompt, config, agent="professor")
+        print(f"Knowledge base generated for {skill}")
+        return result.text
+    except Exception as e:
+        print(f"Gemini error in Professor: {e}")
     # Fallback
-    return f"# {skill}\n## Introduction\nOverview of {skill}.\n## Key Concepts\n- Basics\n## Examples\n- Example 1"
+    record_fallback("professor")
+    return fallback_knowledge_base(skill)
+
+async def stream_knowledge_base_async(skill):
+    """Yield the knowledge base for ``skill`` as markdown chunks while Gemini writes it."""
+    prompt, config = knowledge_base_request(skill)
+    async for chunk in stream_or_fallback("gemini-1.5-pro", prompt, config, "professor",
+                                          lambda: generate_knowledge_base_async(skill)):
+        yield chunk
+
+async def professor_sections_async(skills, concurrency=PROFESSOR_CONCURRENCY, on_progress=None):
+    """
+    Build one knowledge base section per skill, at most ``concurrency`` at a time.
+    Returns {skill: markdown} in input order; a skill that fails gets its own
+    fallback section without holding up the others. With ``on_progress`` the
+    sections are streamed and ``on_progress(skill, text_so_far)`` is called per chunk.
+    """
+    if isinstance(skills, str):
+        skills = [skills]
+    skills = list(dict.fromkeys(skills))
+
+    def generate(skill):
+        if on_progress is None:
+            return generate_knowledge_base_async(skill)
+        return collect_stream(stream_knowledge_base_async(skill), lambda text: on_progress(skill, text))
+
+    def build(skill):
+        # Users asking for the same skill at once share one section; only the first one streams
+        return coalesce(("professor", normalize_skills(skill), is_bypassed()), lambda: generate(skill))
+
+    results = await gather_bounded([build(skill) for skill in skills], concurrency, return_exceptions=True)
+    sections = {}
+    for skill, result in zip(skills, results):
+        if isinstance(result, Exception):
+            print(f"Professor fell back for {skill}: {result}")
+            record_fallback("professor")
+            result = fallback_knowledge_base(skill)
+        sections[skill] = result
+    return sections
+
+def join_sections(sections):
+    return "\n\n".join(sections.values()).rstrip()
+
+async def professor_agent_async(skills, concurrency=PROFESSOR_CONCURRENCY):
+    return join_sections(await professor_sections_async(skills, concurrency))
+
+def generate_knowledge_base(skill):
+    return run_sync(generate_knowledge_base_async(skill))
+
+def stream_knowledge_base(skill):
+    return iterate_sync(stream_knowledge_base_async(skill))
+
+def professor_sections(skills, concurrency=PROFESSOR_CONCURRENCY):
+    return run_sync(professor_sections_async(skills, concurrency))
 
-def professor_agent(skills):
-    knowledge_base = ""
-    for skill in skills:
-        knowledge_base += generate_knowledge_base(skill) + "\n\n"
-    return knowledge_base.rstrip()
\ No newline at end of file
+def professor_agent(skills, concurrency=PROFESSOR_CONCURRENCY):
+    return run_sync(professor_agent_async(skills, concurrency))
@@ -1,10 +1,18 @@
-import requests
+import asyncio
 import json
-from src.config.settings import GEMINI_API_KEY
+from collections import Counter
+from src.llm import agenerate, run_sync, gather_bounded, record_fallback, CircuitOpenError, DeadlineExceeded
+from src.utils.json_repair import loads
+from src.utils.retrieval import CHARS_PER_TOKEN, ChunkIndex
+from src.utils.similarity import similarity_matrix
+from src.agents.schemas import QUIZ_VALIDATOR, quiz_schema
+from src.config.settings import QUIZ_CONTEXT_TOKENS, QUIZ_DUPLICATE_THRESHOLD, QUIZ_SHARDS, QUIZ_SHARD_QUESTIONS
 import streamlit as st
-import time
 import re
 
+QUIZ_MIN_QUESTIONS = 5
+QUIZ_TARGET_QUESTIONS = 10
+
 def extract_concepts(knowledge_base):
     """Split Knowledge Base into concepts based on headers or paragraphs."""
     # First try to extract headers
@@ -16,90 +24,161 @@ def extract_concepts(knowledge_base):
     concepts = re.split(r'###?\s+|\n\n', knowledge_base.strip())
     return [c.strip() for c in concepts if c.strip() and len(c) > 20]
 
-def generate_questions(skills):
-    knowledge_base = st.session_state.get("knowledge_base", "No knowledge base available.")
+QUIZ_RULES = (
+    "Mix Multiple Choice (MCQ, 4 options) and True/False (T/F, 2 options) types. "
+    "Each question must: "
+    "1. Be specific, unique, and based on a concept from the Knowledge Base. "
+    "2. Have a Difficulty (Easy/Medium/Hard). "
+    "3. Align with Bloom's Taxonomy (Remember, Understand, Apply, Analyze, Evaluate, Create). "
+    "Vary the difficulty and Bloom's level across the questions. "
+    "For MCQs, provide 4 detailed options (full sentences): "
+    "- a) Completely wrong, b) Mostly wrong, c) Somewhat wrong/somewhat right, d) Correct. "
+    "For T/F, provide 2 options: 'True' and 'False', with the question phrased so the answer is clear. "
+    "Return as a JSON array of objects with keys: 'question', 'difficulty', 'bloom_level', 'type', 'options', 'answer'. "
+    "Example MCQ: {'question': 'What is X?', 'difficulty': 'Easy', 'bloom_level': 'Remember', 'type': 'Multiple Choice', "
+    "'options': ['a) Totally wrong thing', 'b) Mostly wrong idea', 'c) Half-right guess', 'd) The right answer'], 'answer': 'd'}."
+)
+
+def shard_concepts(concepts, shards):
+    """Deal ``concepts`` round-robin into ``shards`` groups; with fewer concepts than shards, concepts are reused."""
+    return [concepts[i::shards] or [concepts[i % len(concepts)]] for i in range(shards)]
+
+def shard_contexts(knowledge_base, skills, groups):
+    """The knowledge base excerpt for each concept group, or the whole knowledge base if it is short."""
+    if len(knowledge_base) <= QUIZ_CONTEXT_TOKENS * CHARS_PER_TOKEN:
+        return [knowledge_base] * len(groups)
+    index = ChunkIndex(knowledge_base)
+    return [index.context(list(group) + list(skills), QUIZ_CONTEXT_TOKENS) for group in groups]
+
+def shard_prompt(skills, concepts, context, count):
+    return (
+        "Using this Knowledge Base:\n"
+        f"{context}\n\n"
+        f"Generate {count} unique quiz questions for these skills: {', '.join(skills)}, "
+        f"on these concepts: {'; '.join(concepts)}. "
+        f"{QUIZ_RULES}"
+    )
+
+def shard_config(count):
+    return {
+        "temperature": 0.2,
+        "maxOutputTokens": 400 * count,
+        "response_mime_type": "application/json",
+        "response_schema": quiz_schema(count)
+    }
+
+async def quiz_shard_async(prompt, count):
+    """
+    Usable questions from one shard; [] when it fails, so that it gets replaced.
+    A spent deadline or an open circuit is raised instead: a replacement would fail too.
+    """
+    try:
+        raw_text = (await agenerate("gemini-1.5-pro", prompt, shard_config(count), agent="quiz")).text
+        parsed = loads(raw_text)
+        if not isinstance(parsed, list):
+            raise ValueError(f"Expected a JSON array, got {type(parsed).__name__}")
+        return usable_questions(parsed)[0]
+    except (DeadlineExceeded, CircuitOpenError):
+        raise
+    except Exception as e:
+        print(f"Gemini error in Quiz shard: {e}")
+        return []
+
+async def quiz_shards_async(prompts, count):
+    """Every shard's questions, and whether any stopped on the deadline or an open circuit."""
+    results = await gather_bounded([quiz_shard_async(prompt, count) for prompt in prompts], QUIZ_SHARDS, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException) and not isinstance(result, (DeadlineExceeded, CircuitOpenError)):
+            raise result
+    stopped = [result for result in results if isinstance(result, BaseException)]
+    if stopped:
+        print(f"Gemini error in Quiz shard: {stopped[0]}")
+    return [[] if isinstance(result, BaseException) else result for result in results], bool(stopped)
+
+async def generate_questions_async(skills, knowledge_base):
     concepts = extract_concepts(knowledge_base)
     if not concepts:
         concepts = ["General " + ", ".join(skills)]
 
-    url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-pro:generateContent"
-    prompt = (
-        "Using this Knowledge Base:\n"
-        f"{knowledge_base}\n\n"
-        "Generate a quiz based on these skills: "
-        f"{', '.join(skills)}. Create 10-15 unique questions in total. "
-        "Mix Multiple Choice (MCQ, 4 options) and True/False (T/F, 2 options) types. "
-        "Each question must: "
-        "1. Be specific, unique, and based on a concept from the Knowledge Base. "
-        "2. Have a Difficulty (Easy/Medium/Hard). "
-        "3. Align with Bloom's Taxonomy (Remember, Understand, Apply, Analyze, Evaluate, Create). "
-        "For MCQs, provide 4 detailed options (full sentences): "
-        "- a) Completely wrong, b) Mostly wrong, c) Somewhat wrong/somewhat right, d) Correct. "
-        "For T/F, provide 2 options: 'True' and 'False', with the question phrased so the answer is clear. "
-        "Return as a JSON array of objects with keys: 'question', 'difficulty', 'bloom_level', 'type', 'options', 'answer'. "
-        "Example MCQ: {'question': 'What is X?', 'difficulty': 'Easy', 'bloom_level': 'Remember', 'type': 'Multiple Choice', "
-        "'options': ['a) Totally wrong thing', 'b) Mostly wrong idea', 'c) Half-right guess', 'd) The right answer'], 'answer': 'd'}."
+    # Small shards, one per group of concepts, all at once: the quiz takes as long as one
+    # short response, and a malformed reply costs one shard instead of the whole quiz
+    groups = shard_concepts(concepts, QUIZ_SHARDS)
+    # Indexing a long knowledge base is CPU work, so keep it off the shared event loop
+    contexts = await asyncio.to_thread(shard_contexts, knowledge_base, skills, groups)
+    prompts = [shard_prompt(skills, group, context, QUIZ_SHARD_QUESTIONS) for group, context in zip(groups, contexts)]
+    shards, stopped = await quiz_shards_async(prompts, QUIZ_SHARD_QUESTIONS)
+    questions = merge_questions(shards)
+    failed = [prompt for prompt, shard in zip(prompts, shards) if not shard]
+    if failed and not stopped and len(questions) < QUIZ_TARGET_QUESTIONS:
+        # Replace only the failed shards, showing them what the others wrote
+        replacements, _ = await quiz_shards_async([top_up_prompt(prompt, questions, QUIZ_SHARD_QUESTIONS) for prompt in failed], QUIZ_SHARD_QUESTIONS)
+        questions = merge_questions([questions] + replacements)
+    if len(questions) >= QUIZ_MIN_QUESTIONS:
+        return balance_questions(questions, QUIZ_TARGET_QUESTIONS)
+    # Fallback: pad whatever was salvaged with simple questions
+    record_fallback("quiz")
+    fallback = fallback_questions(concepts)
+    if questions:
+        return questions + fallback[:QUIZ_MIN_QUESTIONS - len(questions)]
+    return fallback
+
+def merge_questions(shards):
+    """All shards' questions in order, without near-duplicates."""
+    return dedupe_questions([q for shard in shards for q in shard])
+
+def dedupe_questions(questions, threshold=QUIZ_DUPLICATE_THRESHOLD):
+    """Drop questions whose wording is too close to an earlier one's (char n-gram cosine)."""
+    texts = [q["question"] for q in questions]
+    scores = similarity_matrix(texts, texts)
+    kept = []
+    for i in range(len(questions)):
+        if all(scores[i, j] < threshold for j in kept):
+            kept.append(i)
+    return [questions[i] for i in kept]
+
+def balance_questions(questions, count):
+    """
+    Up to ``count`` questions, spread as evenly as possible over difficulties
+    and, within that, Bloom levels. The questions keep their original order.
+    """
+    difficulties, blooms = Counter(), Counter()
+    remaining, picked = list(range(len(questions))), []
+    while remaining and len(picked) < count:
+        best = min(remaining, key=lambda i: (difficulties[questions[i]["difficulty"]], blooms[questions[i]["bloom_level"]], i))
+        remaining.remove(best)
+        picked.append(best)
+        difficulties[questions[best]["difficulty"]] += 1
+        blooms[questions[best]["bloom_level"]] += 1
+    return [questions[i] for i in sorted(picked)]
+
+def usable_questions(questions):
+    """
+    Keep the questions that match the schema and have the right number of options
+    (4 for Multiple Choice, 2 for True/False), dropping repeats.
+    Returns (kept questions, number dropped).
+    """
+    valid, _ = QUIZ_VALIDATOR.partition(questions)
+    kept, seen = [], set()
+    for q in valid:
+        key = " ".join(q["question"].lower().split())
+        if len(q["options"]) != (4 if q["type"] == "Multiple Choice" else 2) or key in seen:
+            continue
+        seen.add(key)
+        kept.append(q)
+    return kept, len(questions) - len(kept)
+
+def top_up_prompt(prompt, questions, count):
+    written = json.dumps([q["question"] for q in questions], indent=2)
+    return (
+        f"{prompt}\n\n"
+        f"These questions are already written:\n{written}\n"
+        f"Write only {count} more questions, each different from those above, in the same JSON format."
     )
-    headers = {"Content-Type": "application/json"}
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {
-            "temperature": 0.2,
-            "maxOutputTokens": 3000
-        }
-    }
-    for attempt in range(3):
-        try:
-            response = requests.post(f"{url}?key={GEMINI_API_KEY}", headers=headers, json=payload, timeout=45)
-            response.raise_for_status()
-            data = response.json()
-            if "candidates" not in data:
-                raise ValueError("No 'candidates' in response")
-            raw_text = data["candidates"][0]["content"]["parts"][0]["text"]
-            print(f"Raw Gemini response: {raw_text}")  # Debug
-            # Clean up the JSON text
-            cleaned_text = raw_text.strip()
-            if "```json" in cleaned_text:
-                cleaned_text = cleaned_text.split("```json", 1)[1]
-            if "```" in cleaned_text:
-                cleaned_text = cleaned_text.split("```", 1)[0]
-            cleaned_text = cleaned_text.strip()
-            
-            # Additional JSON cleaning
-            # Sometimes the model adds trailing commas which are invalid in JSON
-            cleaned_text = re.sub(r',\s*}', '}', cleaned_text)
-            cleaned_text = re.sub(r',\s*]', ']', cleaned_text)
-            
-            try:
-                questions = json.loads(cleaned_text)
-            except json.JSONDecodeError as e:
-                print(f"JSON parsing error: {e}")
-                # Try to fix common JSON errors
-                if str(e).startswith("Expecting ',' delimiter"):
-                    # Fix missing commas between objects
-                    cleaned_text = re.sub(r'}\s*{', '},{', cleaned_text)
-                    questions = json.loads(cleaned_text)
-                else:
-                    raise
-            print(f"Parsed questions: {json.dumps(questions, indent=2)}")  # Debug
-            # Validate
-            if len(questions) < 5:
-                raise ValueError(f"Too few questions: {len(questions)}")
-            for q in questions:
-                if not all(k in q for k in ["question", "difficulty", "bloom_level", "type", "options", "answer"]):
-                    raise ValueError(f"Malformed question: {q}")
-                if q["type"] == "Multiple Choice" and len(q["options"]) != 4:
-                    raise ValueError(f"MCQ needs 4 options, got {len(q['options'])}: {q}")
-                if q["type"] == "True/False" and len(q["options"]) != 2:
-                    raise ValueError(f"T/F needs 2 options, got {len(q['options'])}: {q}")
-            return questions
-        except Exception as e:
-            print(f"Gemini error (attempt {attempt + 1}): {e}, Response: {response.text if 'response' in locals() else 'No response'}")
-            time.sleep(5 * (attempt + 1))
-    # Fallback: Generate simple questions as fallback
-    fallback_questions = []
+
+def fallback_questions(concepts):
+    fallback = []
     for i, concept in enumerate(concepts[:5]):
-        fallback_questions.extend([
+        fallback.extend([
             {
                 "question": f"What is a core feature of {concept}?",
                 "difficulty": "Easy",
@@ -135,10 +214,9 @@ def generate_questions(skills):
                 "answer": "d"
             }
         ])
-    return fallback_questions[:15]
+    return fallback[:15]
 
-def quiz_generator_agent(skills):
-    questions = generate_questions(skills)
+def format_quiz(questions):
     quiz_content = ""
     for q in questions:
         question = q.get("question", "Unknown question")
@@ -164,3 +242,16 @@ def quiz_generator_agent(skills):
             ) for q in questions
         ]
     }
+
+async def quiz_generator_agent_async(skills, knowledge_base):
+    return format_quiz(await generate_questions_async(skills, knowledge_base))
+
+def current_knowledge_base():
+    # Session state is only reachable from the Streamlit script thread
+    return st.session_state.get("knowledge_base") or "No knowledge base available."
+
+def generate_questions(skills):
+    return run_sync(generate_questions_async(skills, current_knowledge_base()))
+
+def quiz_generator_agent(skills):
+    return run_sync(quiz_generator_agent_async(skills, current_knowledge_base()))
@@ -1,7 +1,7 @@
-import requests
-import json
-import time
-from src.config.settings import GEMINI_API_KEY
+import asyncio
+from src.llm import agenerate, run_sync, record_fallback, LLMError
+from src.utils.json_repair import loads, JSONRepairError
+from src.agents.schemas import SKILL_LIST, SKILL_LIST_VALIDATOR
 import PyPDF2
 from docx import Document
 
@@ -20,43 +20,38 @@ def extract_text_from_file(file, file_type):
         print(f"Error extracting text from file: {e}")
         return ""
 
-def split_skills(text):
-    url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-pro:generateContent"
+def valid_skill_list(json_text):
+    return SKILL_LIST_VALIDATOR.is_valid(loads(json_text))
+
+async def split_skills_async(text):
     prompt = (
         f"Given this input: '{text}', determine if it represents one skill/topic or multiple. "
         "If multiple, split it into distinct skills/topics. Return as a JSON array of strings."
     )
-    headers = {"Content-Type": "application/json"}
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {
-            "response_mime_type": "application/json",
-            "temperature": 0.1,
-            "maxOutputTokens": 1000
-        }
+    config = {
+        "response_mime_type": "application/json",
+        "response_schema": SKILL_LIST,
+        "temperature": 0.1,
+        "maxOutputTokens": 1000
     }
     try:
-        response = requests.post(f"{url}?key={GEMINI_API_KEY}", headers=headers, json=payload, timeout=20)
-        response.raise_for_status()
-        json_text = response.json()["candidates"][0]["content"]["parts"][0]["text"]
-        
-        # Clean up JSON text if needed
-        if json_text.startswith("```json"):
-            json_text = json_text.split("```json")[1]
-        if json_text.endswith("```"):
-            json_text = json_text.split("```")[0]
-            
-        return json.loads(json_text.strip())
+        # Replies kept for 30 days; only a valid skill list is cached
+        json_text = (await agenerate("gemini-1.5-pro", prompt, config, agent="split_skills", validate=valid_skill_list)).text
+        skills = loads(json_text)
+        problems = SKILL_LIST_VALIDATOR.errors(skills)
+        if problems:
+            raise ValueError(f"Invalid skill list: {'; '.join(problems[:3])}")
+        return skills
     except Exception as e:
         print(f"Gemini error in split_skills: {e}")
+        record_fallback("split_skills")
         return [text]
 
-def resume_scanner_agent(file, file_type):
-    resume_text = extract_text_from_file(file, file_type)
+async def resume_scanner_agent_async(file, file_type):
+    resume_text = await asyncio.to_thread(extract_text_from_file, file, file_type)
     if not resume_text:
         return ["General"]
         
-    url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-pro:generateContent"
     prompt = (
         f"Extract a comprehensive list of professional skills and technologies from this resume text:\n\n{resume_text}\n\n"
         "Group similar skills together and remove duplicates. Include both hard skills (technical) and soft skills."
@@ -64,41 +59,19 @@ def resume_scanner_agent(file, file_type):
         "Return as a JSON array of strings, with each string formatted as 'Skill Name (category)'."
         "Categories should be one of: 'Technical', 'Business', 'Creative', 'Soft Skill', or 'Other'."
     )
-    headers = {"Content-Type": "application/json"}
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {
-            "response_mime_type": "application/json",
-            "temperature": 0.1,
-            "maxOutputTokens": 2000
-        }
+    config = {
+        "response_mime_type": "application/json",
+        "response_schema": SKILL_LIST,
+        "temperature": 0.1,
+        "maxOutputTokens": 2000
     }
     
     for attempt in range(3):  # Try up to 3 times
         try:
-            response = requests.post(f"{url}?key={GEMINI_API_KEY}", headers=headers, json=payload, timeout=30)
-            response.raise_for_status()  # Raise exception for HTTP errors
-            
-            response_data = response.json()
-            if "candidates" not in response_data:
-                raise ValueError("No candidates in response")
-                
-            json_text = response_data["candidates"][0]["content"]["parts"][0]["text"]
-            
-            # Clean up the JSON text if needed
-            if json_text.startswith("```json"):
-                json_text = json_text.split("```json")[1]
-            if json_text.endswith("```"):
-                json_text = json_text.split("```")[0]
-            
-            # Fix common JSON issues    
-            import re
-            json_text = re.sub(r',\s*]', ']', json_text.strip())
-            json_text = re.sub(r',\s*}', '}', json_text.strip())
-                
+            json_text = (await agenerate("gemini-1.5-pro", prompt, config, agent="resume", refresh=attempt > 0)).text
             try:
-                skills = json.loads(json_text.strip())
-            except json.JSONDecodeError as e:
+                skills = loads(json_text)
+            except JSONRepairError as e:
                 print(f"JSON parsing error in resume_scanner: {e}")
                 # Try a simpler format if parsing fails
                 skills = ["Python (Technical)", "JavaScript (Technical)", "Data Analysis (Technical)", 
@@ -114,8 +87,16 @@ def resume_scanner_agent(file, file_type):
             
             return skills if skills else ["General"]
             
+        except LLMError as e:
+            print(f"Gemini error in Resume Scanner: {e}")
+            break
         except Exception as e:
             print(f"Gemini error in Resume Scanner (attempt {attempt+1}): {e}")
-            if attempt == 2:  # Last attempt failed
-                return ["Python", "Machine Learning", "Data Analysis", "Communication", "Problem Solving"]
-            time.sleep(2)  # Wait before retrying
\ No newline at end of file
+    record_fallback("resume")
+    return ["Python", "Machine Learning", "Data Analysis", "Communication", "Problem Solving"]
+
+def split_skills(text):
+    return run_sync(split_skills_async(text))
+
+def resume_scanner_agent(file, file_type):
+    return run_sync(resume_scanner_agent_async(file, file_type))
@@ -0,0 +1,90 @@
+"""Output shapes of the agents that return JSON.
+
+Each schema is sent to Gemini as ``response_schema`` and compiled into a
+local validator (src/utils/schema.py), so responses are constrained at
+generation time and checked again before use.
+"""
+from src.utils.schema import compile_schema
+
+
+def _strings():
+    return {"type": "ARRAY", "items": {"type": "STRING"}}
+
+
+def _object(properties, required=None):
+    return {"type": "OBJECT", "properties": properties, "required": required or list(properties)}
+
+
+LEARNING_PATH = _object({
+    "introduction": {"type": "STRING"},
+    "skill_components": _strings(),
+    "learning_path": {"type": "ARRAY", "items": _object({
+        "level": {"type": "STRING"},
+        "description": {"type": "STRING"},
+        "resources": _strings(),
+    })},
+    "challenges": {"type": "ARRAY", "items": _object({
+        "challenge": {"type": "STRING"},
+        "solution": {"type": "STRING"},
+    })},
+    "practice_exercises": _strings(),
+    "progress_metrics": _strings(),
+    "time_commitment": {"type": "STRING"},
+    "milestones": {"type": "ARRAY", "items": _object({
+        "title": {"type": "STRING"},
+        "description": {"type": "STRING"},
+    })},
+})
+
+QUIZ_QUESTION = _object({
+    "question": {"type": "STRING"},
+    "difficulty": {"type": "STRING", "enum": ["Easy", "Medium", "Hard"]},
+    "bloom_level": {"type": "STRING", "enum": ["Remember", "Understand", "Apply", "Analyze", "Evaluate", "Create"]},
+    "type": {"type": "STRING", "enum": ["Multiple Choice", "True/False"]},
+    "options": {"type": "ARRAY", "items": {"type": "STRING"}, "minItems": 2, "maxItems": 4},
+    "answer": {"type": "STRING"},
+})
+
+QUIZ = {"type": "ARRAY", "items": QUIZ_QUESTION}
+
+RESOURCE = _object({
+    "title": {"type": "STRING"},
+    "url": {"type": "STRING"},
+    "description": {"type": "STRING"},
+    "format": {"type": "STRING"},
+    "cost": {"type": "STRING"},
+    "time_commitment": {"type": "STRING"},
+    "level": {"type": "STRING"},
+}, required=["title", "url"])
+
+RESOURCE_LIST = {"type": "ARRAY", "items": RESOURCE}
+
+SUBSKILLS = _strings()
+
+SUBSKILL_MAPPING = _object({"subskill": {"type": "STRING"}})
+
+SUBSKILL_MAPPINGS = _object({"mappings": {"type": "ARRAY", "items": _object({
+    "index": {"type": "INTEGER"},
+    "subskill": {"type": "STRING"},
+})}})
+
+SKILL_LIST = dict(_strings(), minItems=1)
+
+MISTAKE_FEEDBACK = _object({"why_wrong": {"type": "STRING"}, "why_correct": {"type": "STRING"}})
+
+
+def resources_schema(skills):
+    """Librarian output: one resource list per requested skill, keyed by the skill name."""
+    return _object({skill: RESOURCE_LIST for skill in skills})
+
+
+def quiz_schema(count):
+    """A quiz of at most ``count`` questions, for requests that ask for a few at a time."""
+    return dict(QUIZ, maxItems=count)
+
+
+LEARNING_PATH_VALIDATOR = compile_schema(LEARNING_PATH)
+QUIZ_VALIDATOR = compile_schema(QUIZ)
+RESOURCE_LIST_VALIDATOR = compile_schema(RESOURCE_LIST)
+MISTAKE_FEEDBACK_VALIDATOR = compile_schema(MISTAKE_FEEDBACK)
+SKILL_LIST_VALIDATOR = compile_schema(SKILL_LIST)
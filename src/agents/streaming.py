@@ -0,0 +1,23 @@
+from src.llm import astream_generate
+
+CUT_OFF_NOTE = "\n\n*(The response was cut off. Regenerate to get the full text.)*"
+
+async def stream_or_fallback(model, prompt, config, agent, fallback):
+    """
+    Yield markdown chunks from Gemini as they arrive. If the stream fails
+    before anything was shown, yield the result of ``fallback()`` (the agent's
+    regular path with retries and canned fallback) instead; if it fails midway,
+    end with a short cut-off note rather than repeating text.
+    """
+    emitted = False
+    try:
+        async for chunk in astream_generate(model, prompt, config, agent=agent):
+            emitted = True
+            yield chunk
+        return
+    except Exception as e:
+        print(f"Gemini streaming error in {agent}: {e}")
+    if emitted:
+        yield CUT_OFF_NOTE
+    else:
+        yield await fallback()
@@ -0,0 +1,94 @@
+"""Versioned skill -> subskill taxonomy.
+
+A skill's subskills are generated once, on first use, and stored as version 1
+in the 'subskill_taxonomy' table (src/db/supabase_client.py). Reads come from
+an in-process index in front of the table, so gradings of the same skill share
+one subskill list and their breakdowns stay comparable over time. Index
+entries are re-read after TAXONOMY_INDEX_TTL_SECONDS, so versions stored by
+another process show up without a restart. Only an explicit refresh
+(``refresh=True``, or ``python taxonomy.py --refresh``) writes a new version;
+older versions stay readable by number.
+
+The table needs a unique (skill_key, version) constraint:
+
+    create table subskill_taxonomy (
+        skill_key text not null,
+        skill text not null,
+        version integer not null,
+        subskills jsonb not null,
+        created_at timestamptz not null default now(),
+        unique (skill_key, version)
+    );
+
+When two processes write the same version at once, the insert that loses
+the race reads back the winner's row and serves that instead.
+"""
+import asyncio
+import time
+from src.config.settings import TAXONOMY_INDEX_TTL_SECONDS
+from src.db.supabase_client import get_taxonomy, save_taxonomy
+from src.llm.singleflight import coalesce, normalize_skills
+
+_index = {}  # skill key -> (latest row, monotonic time it was read)
+
+
+def taxonomy_key(skill):
+    return normalize_skills(skill)[0]
+
+
+def _indexed(key):
+    entry = _index.get(key)
+    if entry is not None and time.monotonic() - entry[1] < TAXONOMY_INDEX_TTL_SECONDS:
+        return entry[0]
+    return None
+
+
+async def stored_taxonomy_async(skill, version=None):
+    """The latest stored row for ``skill`` (or the given ``version``), without generating one; None if absent."""
+    key = taxonomy_key(skill)
+    row = _indexed(key)
+    if row is not None and version in (None, row["version"]):
+        return row
+    row = await asyncio.to_thread(get_taxonomy, key, version)
+    if row is not None and version is None:
+        _index[key] = (row, time.monotonic())
+    return row
+
+
+async def taxonomy_async(skill, generate, refresh=False):
+    """
+    The latest row ({skill_key, skill, version, subskills}) for ``skill``. On
+    first use, or with ``refresh``, ``await generate(skill)`` supplies the
+    subskills of a new version; when it returns nothing, no row is written and
+    None is returned.
+    """
+    key = taxonomy_key(skill)
+    if not refresh and _indexed(key) is not None:
+        return _indexed(key)
+
+    async def load():
+        _index.pop(key, None)
+        row = await stored_taxonomy_async(skill)
+        if row is not None and not refresh:
+            return row
+        subskills = await generate(skill)
+        if not subskills:
+            return None
+        new = {"skill_key": key, "skill": " ".join(skill.split()), "version": row["version"] + 1 if row else 1, "subskills": subskills}
+        if not await asyncio.to_thread(save_taxonomy, new):
+            # Another process stored this version first; serve theirs
+            _index.pop(key, None)
+            return await stored_taxonomy_async(skill)
+        _index[key] = (new, time.monotonic())
+        print(f"Stored subskill taxonomy v{new['version']} for {new['skill']}")
+        return new
+
+    return await coalesce(("taxonomy", key, refresh), load)
+
+
+async def stored_subskills_async(skills):
+    """Stored subskills of every skill in order, without repeats; None unless each skill has a taxonomy."""
+    rows = await asyncio.gather(*(stored_taxonomy_async(skill) for skill in skills))
+    if not rows or not all(rows):
+        return None
+    return list(dict.fromkeys(subskill for row in rows for subskill in row["subskills"]))
@@ -11,4 +11,124 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 XAI_API_ENDPOINT = "https://api.xai.com/v1/completions"
 MODULES_PER_PAGE = 5
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
\ No newline at end of file
+# Shared Gemini client (src/llm); point GEMINI_API_BASE at benchmarks/mock_gemini.py
+# to run the app or the benchmarks offline
+GEMINI_API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta").rstrip("/")
+LLM_POOL_SIZE = 20
+LLM_CONNECT_TIMEOUT = 5
+# Upper bound on Gemini requests in flight per process
+LLM_MAX_CONCURRENCY = 8
+# Default cap for agents that fan out one call per skill/topic
+LLM_FANOUT_LIMIT = 4
+# Knowledge base sections generated at once by professor_agent
+PROFESSOR_CONCURRENCY = int(os.getenv("PROFESSOR_CONCURRENCY", "4"))
+# Read timeouts in seconds, keyed by the agent name passed to src.llm.generate
+LLM_TIMEOUTS = {
+    "default": 45,
+    "module": 10,
+    "split_skills": 20,
+    "mapper": 30,
+    "resume": 30,
+}
+
+# Local subskill mapper (src/utils/similarity.py): questions scoring below the
+# threshold, or too close to the runner-up, are sent to Gemini instead
+SUBSKILL_MATCH_THRESHOLD = 0.15
+SUBSKILL_MATCH_MARGIN = 0.05
+# Skip Gemini entirely and keep the best local guess for every question
+SUBSKILL_MAPPER_OFFLINE = os.getenv("SUBSKILL_MAPPER_OFFLINE", "0") == "1"
+# Seconds a process trusts its copy of a skill's subskill taxonomy before
+# re-reading the table for versions stored by a refresh elsewhere
+# (src/agents/taxonomy.py)
+TAXONOMY_INDEX_TTL_SECONDS = int(os.getenv("TAXONOMY_INDEX_TTL_SECONDS", "300"))
+
+# LLM response cache (src/llm/cache.py)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") != "0"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".cache/llm_responses.sqlite3")
+LLM_CACHE_MEMORY_BYTES = 64 * 1024 * 1024
+# Seconds each agent's responses stay fresh; 0 disables caching for that agent
+LLM_CACHE_TTLS = {
+    "default": 7 * 24 * 3600,
+    "quiz": 24 * 3600,
+    "analyzer": 24 * 3600,
+    "split_skills": 30 * 24 * 3600,
+    "resume": 0,  # resume text is personal data, never persist it
+}
+
+# Mistake explanations (src/agents/explanations.py), kept with no expiry and
+# keyed by question, options, picked and correct answer, so a wrong pick that
+# was explained once is never sent to Gemini again
+EXPLANATION_STORE_ENABLED = os.getenv("EXPLANATION_STORE_ENABLED", "1") != "0"
+EXPLANATION_STORE_PATH = os.getenv("EXPLANATION_STORE_PATH", ".cache/explanations.sqlite3")
+
+# Rate limiting and retries (src/llm/ratelimit.py)
+# Per-model quotas; "rpm" is requests and "tpm" is tokens per minute
+LLM_RATE_LIMITS = {
+    "default": {"rpm": 300, "tpm": 1_000_000},
+    "gemini-1.5-pro": {"rpm": 360, "tpm": 4_000_000},
+    "gemini-2.0-flash": {"rpm": 1000, "tpm": 4_000_000},
+}
+# Attempts per request, including the first one
+LLM_MAX_ATTEMPTS = 3
+LLM_BACKOFF_BASE = 1.0
+LLM_BACKOFF_MAX = 30.0
+# Process-wide retry budget: each request earns this fraction of a retry,
+# on top of a small reserve, so outages cannot turn into retry storms
+LLM_RETRY_BUDGET_RATIO = 0.2
+LLM_RETRY_BUDGET_RESERVE = 10
+
+# Circuit breaker (src/llm/breaker.py): consecutive transient failures that
+# open a model's circuit, and seconds before a probe request is let through
+LLM_BREAKER_FAILURES = 5
+LLM_BREAKER_RESET = 30
+
+# Follow-up calls allowed to finish a reply that hit maxOutputTokens
+# (src/llm/continuation.py)
+LLM_MAX_CONTINUATIONS = 2
+
+# Quiz generation (src/agents/quiz.py): QUIZ_SHARDS concurrent requests of
+# QUIZ_SHARD_QUESTIONS questions, each on its own share of the knowledge base
+# concepts. A shard gets the QUIZ_CONTEXT_TOKENS of knowledge base most
+# relevant to its concepts (src/utils/retrieval.py), so prompts stay the same
+# size however long the knowledge base is. Questions whose char n-gram
+# similarity to a kept one reaches QUIZ_DUPLICATE_THRESHOLD are dropped.
+QUIZ_SHARDS = 5
+QUIZ_SHARD_QUESTIONS = 3
+QUIZ_CONTEXT_TOKENS = int(os.getenv("QUIZ_CONTEXT_TOKENS", "800"))
+QUIZ_DUPLICATE_THRESHOLD = 0.85
+
+# Seconds a page gets, from form submit, for all of its generations before
+# agents return their fallbacks (src/llm/deadline.py)
+PAGE_DEADLINE_SECONDS = int(os.getenv("PAGE_DEADLINE_SECONDS", "90"))
+
+# Cache pre-warm job (prewarm.py). Skill sets come from PREWARM_SKILLS_FILE
+# (one per line, comma-separated for multi-skill sets) or, if unset, the most
+# saved skills in the modules table. A set is regenerated once its last warm
+# is older than PREWARM_REFRESH_HOURS, which stays under the shortest
+# artifact TTL (quiz, 24h) so warm entries never lapse between runs. Only the
+# quiz, exercises and resources are regenerated; the knowledge base and
+# learning path they are built from are reused until they expire.
+PREWARM_TOP_N = int(os.getenv("PREWARM_TOP_N", "20"))
+PREWARM_SKILLS_FILE = os.getenv("PREWARM_SKILLS_FILE", "")
+PREWARM_REFRESH_HOURS = float(os.getenv("PREWARM_REFRESH_HOURS", "12"))
+PREWARM_STATE_PATH = os.getenv("PREWARM_STATE_PATH", ".cache/prewarm_state.json")
+# Skill sets warmed at once; each one runs all five agents
+PREWARM_CONCURRENCY = 2
+
+# Bulk curriculum CLI (curriculum.py): skills built at once (each runs four
+# agents) and rows per insert into the modules table
+CURRICULUM_CONCURRENCY = int(os.getenv("CURRICULUM_CONCURRENCY", "4"))
+CURRICULUM_BATCH_SIZE = 50
+
+# Metrics (src/llm/metrics.py): USD per million tokens for cost estimates,
+# the port serving Prometheus /metrics (0 turns it off) and the users who
+# see the metrics panel in the sidebar
+LLM_PRICES = {
+    "default": {"input": 1.25, "output": 5.00},
+    "gemini-1.5-pro": {"input": 1.25, "output": 5.00},
+    "gemini-2.0-flash": {"input": 0.10, "output": 0.40},
+}
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+ADMIN_EMAILS = {e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()}
+
+supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
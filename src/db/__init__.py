@@ -1,3 +1,3 @@
-from .supabase_client import save_modules, get_module_count, get_paginated_modules, get_all_skills
+from .supabase_client import save_modules, get_module_count, get_paginated_modules, get_all_skills, get_popular_skills, get_taxonomy, save_taxonomy
 
-__all__ = ["save_modules", "get_module_count", "get_paginated_modules", "get_all_skills"]
\ No newline at end of file
+__all__ = ["save_modules", "get_module_count", "get_paginated_modules", "get_all_skills", "get_popular_skills", "get_taxonomy", "save_taxonomy"]
@@ -1,6 +1,8 @@
 import logging
 from src.config.settings import supabase
+import threading
 import time
+from collections import Counter
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -8,11 +10,17 @@ logger = logging.getLogger(__name__)
 
 # In-memory fallback storage when Supabase is unavailable
 memory_modules = []
+memory_taxonomy = []
+memory_taxonomy_lock = threading.Lock()
 
-def save_modules(modules):
+# Postgres error code for a unique constraint violation
+UNIQUE_VIOLATION = "23505"
+
+def save_modules(modules, fallback=True):
     """
     Save a list of module dicts ({user_id, skill, content}) to Supabase 'modules' table.
-    Falls back to in-memory storage if Supabase is unavailable.
+    Falls back to in-memory storage if Supabase is unavailable, unless ``fallback``
+    is False (batch jobs, whose process memory is gone when they exit).
     Returns True if successful, False if not.
     """
     try:
@@ -24,6 +32,8 @@ def save_modules(modules):
         return False
     except Exception as e:
         logger.error(f"Error saving modules to Supabase: {e}")
+        if not fallback:
+            return False
         # Fallback to in-memory storage
         global memory_modules
         for module in modules:
@@ -70,4 +80,62 @@ def get_all_skills(user_id):
         logger.error(f"Error getting all skills from Supabase: {e}")
         # Fallback to in-memory storage
         user_modules = [m for m in memory_modules if m.get("user_id") == user_id]
-        return sorted(set(module.get("skill") for module in user_modules))
\ No newline at end of file
+        return sorted(set(module.get("skill") for module in user_modules))
+
+def get_popular_skills(limit):
+    """
+    Return the ``limit`` skills saved most often across all users, most popular first.
+    Counting happens in the database, through this function:
+
+        create function popular_skills(max_skills integer)
+        returns table (skill text, saves bigint) language sql stable as $$
+            select skill, count(*) as saves from modules
+            where skill is not null group by skill
+            order by saves desc, skill limit max_skills
+        $$;
+    """
+    try:
+        response = supabase.rpc("popular_skills", {"max_skills": limit}).execute()
+        return [row["skill"] for row in response.data or []]
+    except Exception as e:
+        logger.error(f"Error getting popular skills from Supabase: {e}")
+        # Fallback to in-memory storage
+        skills = [module.get("skill") for module in memory_modules]
+        return [skill for skill, _ in Counter(s for s in skills if s).most_common(limit)]
+
+def get_taxonomy(skill_key, version=None):
+    """
+    Latest row ({skill_key, skill, version, subskills}) of the 'subskill_taxonomy'
+    table for ``skill_key``, or the given ``version`` of it; None if there is none.
+    """
+    try:
+        query = supabase.table("subskill_taxonomy").select("skill_key, skill, version, subskills").eq("skill_key", skill_key)
+        if version is not None:
+            query = query.eq("version", version)
+        response = query.order("version", desc=True).limit(1).execute()
+        return response.data[0] if response.data else None
+    except Exception as e:
+        logger.error(f"Error getting subskill taxonomy from Supabase: {e}")
+        # Fallback to in-memory storage
+        rows = [row for row in memory_taxonomy if row["skill_key"] == skill_key and version in (None, row["version"])]
+        return max(rows, key=lambda row: row["version"]) if rows else None
+
+def save_taxonomy(row):
+    """
+    Insert one taxonomy version ({skill_key, skill, version, subskills}); in-memory if
+    Supabase is unavailable. Returns False when that version of the skill already
+    exists, which the table's unique (skill_key, version) constraint enforces.
+    """
+    try:
+        response = supabase.table("subskill_taxonomy").insert(row).execute()
+        return bool(response.data)
+    except Exception as e:
+        if getattr(e, "code", None) == UNIQUE_VIOLATION:
+            logger.info(f"Subskill taxonomy v{row['version']} of {row['skill_key']} already exists")
+            return False
+        logger.error(f"Error saving subskill taxonomy to Supabase: {e}")
+        with memory_taxonomy_lock:
+            if any(r["skill_key"] == row["skill_key"] and r["version"] == row["version"] for r in memory_taxonomy):
+                return False
+            memory_taxonomy.append(dict(row, created_at=time.time()))
+        return True
@@ -0,0 +1,39 @@
+from .client import agenerate, generate, astream_generate, stream_generate, prewarm, LLMError, CircuitOpenError, DeadlineExceeded, LLMResponse
+from .cache import bypass_cache, get_cache
+from .singleflight import coalesce, coalesced, singleflight_stats
+from .breaker import breaker_states
+from .deadline import Deadline, deadline_scope, current_deadline
+from .runtime import run_sync, submit, gather_bounded, iterate_sync, collect_stream
+from .metrics import record_fallback, record_explanation_lookup, explanation_hit_rate, render_prometheus, agent_summary, start_metrics_server
+
+__all__ = [
+    "agenerate",
+    "generate",
+    "astream_generate",
+    "stream_generate",
+    "prewarm",
+    "LLMError",
+    "CircuitOpenError",
+    "DeadlineExceeded",
+    "LLMResponse",
+    "bypass_cache",
+    "get_cache",
+    "coalesce",
+    "coalesced",
+    "singleflight_stats",
+    "breaker_states",
+    "Deadline",
+    "deadline_scope",
+    "current_deadline",
+    "run_sync",
+    "submit",
+    "gather_bounded",
+    "iterate_sync",
+    "collect_stream",
+    "record_fallback",
+    "record_explanation_lookup",
+    "explanation_hit_rate",
+    "render_prometheus",
+    "agent_summary",
+    "start_metrics_server"
+]
@@ -0,0 +1,83 @@
+"""Circuit breakers for Gemini endpoints.
+
+During an outage every call would otherwise wait out its timeouts and
+retries before the agent falls back. A breaker per model and endpoint counts
+consecutive transient failures; once it opens, calls fail at once with
+:class:`CircuitOpenError` and agents go straight to their fallbacks. After
+``reset_timeout`` seconds one probe request is let through (half-open) and
+its outcome closes or re-opens the circuit.
+"""
+import time
+from src.config.settings import LLM_BREAKER_FAILURES, LLM_BREAKER_RESET
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=LLM_BREAKER_FAILURES, reset_timeout=LLM_BREAKER_RESET, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.rejected = 0
+
+    def allow(self):
+        """
+        Return True if a request may be sent now. In the half-open state only
+        one probe is allowed at a time.
+        """
+        if self.state == OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self.probing:
+            self.probing = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self.opened_at = self.clock()
+
+    def release(self):
+        # A probe that was cancelled says nothing about the endpoint
+        self.probing = False
+
+    def retry_in(self):
+        """Seconds until the next probe is allowed (0 unless open)."""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.reset_timeout - (self.clock() - self.opened_at))
+
+    def snapshot(self):
+        return {"state": self.state, "failures": self.failures, "rejected": self.rejected}
+
+
+_breakers = {}
+
+
+def get_breaker(model, endpoint):
+    key = f"{model}:{endpoint}"
+    if key not in _breakers:
+        _breakers[key] = CircuitBreaker(key)
+    return _breakers[key]
+
+
+def breaker_states():
+    """Return {"model:endpoint": {"state", "failures", "rejected"}} for every breaker used so far."""
+    return {key: breaker.snapshot() for key, breaker in _breakers.items()}
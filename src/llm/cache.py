@@ -0,0 +1,209 @@
+"""Content-addressed cache for Gemini responses.
+
+Entries are keyed by a hash of (model, prompt, generationConfig) and live in
+two tiers: a size-bounded in-process LRU and a SQLite file shared by every
+process on the host. Each agent has its own TTL (see LLM_CACHE_TTLS).
+"""
+import asyncio
+import contextlib
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from src.config.settings import (
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_PATH,
+    LLM_CACHE_MEMORY_BYTES,
+    LLM_CACHE_TTLS,
+)
+
+logger = logging.getLogger(__name__)
+
+_bypass = contextvars.ContextVar("llm_cache_bypass", default=False)
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def make_key(model, prompt, config=None):
+    material = json.dumps({"model": model, "prompt": prompt, "config": config or {}}, sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+@contextlib.contextmanager
+def bypass_cache(enabled=True):
+    """
+    Skip cache reads for LLM calls made inside the block. Fresh responses are
+    still written back, so a bypass doubles as a refresh (used by the Regen buttons).
+    """
+    token = _bypass.set(bool(enabled) or _bypass.get())
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def is_bypassed():
+    return _bypass.get()
+
+
+class ResponseCache:
+    def __init__(self, path=LLM_CACHE_PATH, max_bytes=LLM_CACHE_MEMORY_BYTES, ttls=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = ttls if ttls is not None else LLM_CACHE_TTLS
+        self._memory = OrderedDict()  # key -> (expires_at, value)
+        self._memory_bytes = 0
+        self._lock = threading.Lock()  # memory tier and counters
+        self._db_lock = threading.Lock()  # the SQLite connection; never held with _lock
+        self._db = None
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        if path:
+            self._open_db()
+
+    def _open_db(self):
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, agent TEXT, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"LLM cache disk tier unavailable at {self.path}: {e}")
+            self._db = None
+
+    def ttl_for(self, agent):
+        return self.ttls.get(agent, self.ttls["default"])
+
+    def get(self, key):
+        """Return the cached response body for ``key`` or None."""
+        now = time.time()
+        value = self._memory_get(key, now)
+        if value is not None:
+            return json.loads(value)
+        row = None
+        if self._db is not None:
+            with self._db_lock:
+                try:
+                    row = self._db.execute(
+                        "SELECT value, expires_at FROM responses WHERE key = ? AND expires_at >= ?",
+                        (key, now),
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    logger.error(f"LLM cache read failed: {e}")
+        with self._lock:
+            if row is None:
+                self.counters["misses"] += 1
+                return None
+            self._remember(key, row[0], row[1])
+            self.counters["disk_hits"] += 1
+        return json.loads(row[0])
+
+    def _memory_get(self, key, now):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < now:
+                self._drop(key)
+                return None
+            self._memory.move_to_end(key)
+            self.counters["memory_hits"] += 1
+            return value
+
+    def set(self, key, body, agent=None):
+        ttl = self.ttl_for(agent)
+        if ttl <= 0:
+            return
+        now = time.time()
+        value = json.dumps(body)
+        with self._lock:
+            self._remember(key, value, now + ttl)
+            self.counters["writes"] += 1
+        if self._db is not None:
+            with self._db_lock:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO responses (key, agent, value, created_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                        (key, agent, value, now, now + ttl),
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.error(f"LLM cache write failed: {e}")
+
+    async def aget(self, key):
+        """
+        get() for coroutines on the shared loop: memory hits are answered
+        inline, the SQLite read runs on a worker thread so a slow disk or a
+        lock wait does not stall every other call on the loop.
+        """
+        if self._db is None:
+            return self.get(key)
+        value = self._memory_get(key, time.time())
+        if value is not None:
+            return json.loads(value)
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key, body, agent=None):
+        """set() for coroutines; the SQLite write runs on a worker thread."""
+        if self._db is None:
+            self.set(key, body, agent)
+        else:
+            await asyncio.to_thread(self.set, key, body, agent)
+
+    def _remember(self, key, value, expires_at):
+        self._drop(key)
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        self._memory[key] = (expires_at, value)
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_bytes:
+            oldest = next(iter(self._memory))
+            self._drop(oldest)
+            self.counters["evictions"] += 1
+
+    def _drop(self, key):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= len(entry[1])
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+            lookups = hits + self.counters["misses"]
+            return dict(
+                self.counters,
+                memory_entries=len(self._memory),
+                memory_bytes=self._memory_bytes,
+                hit_rate=(hits / lookups) if lookups else 0.0,
+            )
+
+
+def get_cache():
+    """Return the process-wide cache, or None when caching is disabled."""
+    global _cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
@@ -0,0 +1,454 @@
+"""Shared Gemini client.
+
+Every agent calls :func:`agenerate` (or its blocking twin :func:`generate`)
+instead of building its own request, so all calls share one keep-alive
+connection pool, one set of timeouts and one concurrency limit.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+import httpx
+from src.llm import metrics
+from src.llm.cache import get_cache, make_key, is_bypassed
+from src.llm.runtime import run_sync, submit, iterate_sync
+from src.llm.singleflight import coalesce
+from src.llm.breaker import OPEN, get_breaker
+from src.llm.deadline import remaining_time
+from src.llm.continuation import continuation_config, continuation_contents, is_truncated, stitched_body
+from src.llm.ratelimit import (
+    RETRYABLE_STATUS,
+    backoff_delay,
+    estimate_tokens,
+    get_limiter,
+    get_retry_budget,
+    retry_after,
+)
+from src.config.settings import (
+    GEMINI_API_KEY,
+    GEMINI_API_BASE,
+    LLM_POOL_SIZE,
+    LLM_CONNECT_TIMEOUT,
+    LLM_TIMEOUTS,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_ATTEMPTS,
+    LLM_BACKOFF_MAX,
+    LLM_MAX_CONTINUATIONS,
+)
+
+logger = logging.getLogger(__name__)
+
+_http_client = None
+_semaphore = None
+_lock = threading.Lock()
+_prewarmed = False
+
+
+class LLMError(Exception):
+    """
+    Raised when Gemini fails or returns a response without usable text.
+    ``retryable`` marks transient failures (network errors, 429, 5xx) and
+    ``retry_after`` carries the server's retry hint in seconds, if any.
+    """
+
+    def __init__(self, message, status_code=None, retryable=False, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(LLMError):
+    """Raised without contacting Gemini while the endpoint's circuit breaker is open."""
+
+
+class DeadlineExceeded(LLMError):
+    """Raised when the active page deadline runs out before Gemini answers."""
+
+
+class LLMResponse:
+    """Text of the first candidate plus the metadata agents occasionally need."""
+
+    def __init__(self, text, finish_reason=None, usage=None, raw=None):
+        self.text = text
+        self.finish_reason = finish_reason
+        self.usage = usage or {}
+        self.raw = raw or {}
+
+    def __repr__(self):
+        return f"LLMResponse(finish_reason={self.finish_reason!r}, chars={len(self.text)})"
+
+
+def get_http_client():
+    """Return the process-wide async HTTP client, creating it on first use."""
+    global _http_client
+    if _http_client is None:
+        with _lock:
+            if _http_client is None:
+                _http_client = httpx.AsyncClient(
+                    headers={"Content-Type": "application/json"},
+                    limits=httpx.Limits(max_connections=LLM_POOL_SIZE, max_keepalive_connections=LLM_POOL_SIZE),
+                    timeout=get_timeout(),
+                )
+    return _http_client
+
+
+def get_semaphore():
+    # Created lazily so it binds to the shared event loop
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _semaphore
+
+
+def get_timeout(agent=None):
+    read_timeout = LLM_TIMEOUTS.get(agent, LLM_TIMEOUTS["default"])
+    connect_timeout = LLM_CONNECT_TIMEOUT
+    remaining = remaining_time()
+    if remaining is not None:
+        # Never wait on a single attempt past the page deadline
+        read_timeout = min(read_timeout, remaining)
+        connect_timeout = min(connect_timeout, remaining)
+    return httpx.Timeout(read_timeout, connect=connect_timeout)
+
+
+async def within_deadline(awaitable, what):
+    """Await ``awaitable``, raising DeadlineExceeded if the active deadline passes first."""
+    remaining = remaining_time()
+    if remaining is None:
+        return await awaitable
+    if remaining <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceeded(f"Deadline passed before {what}")
+    try:
+        return await asyncio.wait_for(awaitable, remaining)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(f"Deadline passed while waiting for {what}")
+
+
+def build_payload(prompt, config=None, partial=None):
+    if partial is None:
+        payload = {"contents": [{"parts": [{"text": prompt}]}]}
+    else:
+        payload = {"contents": continuation_contents(prompt, partial)}
+    if config:
+        payload["generationConfig"] = config
+    return payload
+
+
+def parse_response(data):
+    """Turn a generateContent JSON body into an :class:`LLMResponse`."""
+    if "candidates" not in data or not data["candidates"]:
+        raise LLMError("No 'candidates' in response")
+    candidate = data["candidates"][0]
+    try:
+        text = "".join(part.get("text", "") for part in candidate["content"]["parts"])
+    except (KeyError, TypeError):
+        raise LLMError(f"Candidate has no content (finishReason={candidate.get('finishReason')})")
+    return LLMResponse(
+        text,
+        finish_reason=candidate.get("finishReason"),
+        usage=data.get("usageMetadata"),
+        raw=data,
+    )
+
+
+async def agenerate(model, prompt, config=None, agent=None, refresh=False, validate=None):
+    """
+    Send one generateContent request for ``prompt`` to ``model``.
+    ``config`` is the Gemini generationConfig dict and ``agent`` selects the
+    read timeout and cache TTL. Responses are served from the response cache
+    unless ``refresh`` is set or a bypass_cache() block is active, and
+    identical requests already in flight share one upstream call. A reply
+    cut off at maxOutputTokens is continued up to LLM_MAX_CONTINUATIONS times.
+    With ``validate``, only replies whose text it accepts are cached or served
+    from the cache; others are still returned. Raises LLMError on any failure.
+    """
+    started = time.monotonic()
+    cache = get_cache()
+    key = make_key(model, prompt, config)
+    fresh = refresh or is_bypassed()
+    if cache is not None and not fresh:
+        cached = await cache.aget(key)
+        if cached is not None and _accepted(validate, parse_response(cached)):
+            metrics.observe_request(agent, model, time.monotonic() - started, "hit")
+            return parse_response(cached)
+    try:
+        # Each caller waits only as long as its own deadline, even on a shared call
+        result = await within_deadline(coalesce(("generate", key, fresh), lambda: _request(model, prompt, config, agent, key, validate)), model)
+    except LLMError as e:
+        metrics.observe_request(agent, model, time.monotonic() - started, "miss", _outcome(e))
+        raise
+    metrics.observe_request(agent, model, time.monotonic() - started, "miss")
+    return result
+
+
+def _accepted(validate, result):
+    if validate is None:
+        return True
+    try:
+        return bool(validate(result.text))
+    except Exception:
+        return False
+
+
+def _outcome(error):
+    if isinstance(error, DeadlineExceeded):
+        return "deadline"
+    if isinstance(error, CircuitOpenError):
+        return "circuit_open"
+    return "error"
+
+
+def _http_error(model, response, body):
+    return LLMError(
+        f"HTTP {response.status_code} from {model}: {body[:500]}",
+        response.status_code,
+        retryable=response.status_code in RETRYABLE_STATUS,
+        retry_after=retry_after(response),
+    )
+
+
+def _check_circuit(breaker):
+    if not breaker.allow():
+        raise CircuitOpenError(f"Circuit {breaker.name} is open; next probe in {breaker.retry_in():.0f}s")
+
+
+def _record(breaker, error):
+    # Only transient failures say the endpoint is unhealthy; a 400 means it answered
+    if isinstance(error, DeadlineExceeded):
+        breaker.release()
+    elif error.retryable:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+
+
+def _retry_delay(model, error, attempt):
+    """Seconds to wait before retrying after ``error``, or None to give up."""
+    if not error.retryable or attempt + 1 >= LLM_MAX_ATTEMPTS:
+        return None
+    delay = backoff_delay(attempt, error.retry_after)
+    if error.status_code == 429:
+        # Quota is shared, so hold back every caller of this model, not just this one
+        get_limiter().pause(model, delay)
+    remaining = remaining_time()
+    if delay > LLM_BACKOFF_MAX or (remaining is not None and delay >= remaining):
+        return None
+    if not get_retry_budget().try_spend():
+        return None
+    return delay
+
+
+async def _post(model, prompt, config, agent, partial=None):
+    url = f"{GEMINI_API_BASE}/models/{model}:generateContent"
+    async with get_semaphore():
+        try:
+            response = await get_http_client().post(
+                url,
+                params={"key": GEMINI_API_KEY},
+                json=build_payload(prompt, config, partial),
+                timeout=get_timeout(agent),
+            )
+        except httpx.HTTPError as e:
+            raise LLMError(f"Request to {model} failed: {e!r}", retryable=True) from e
+    if response.status_code >= 400:
+        raise _http_error(model, response, response.text)
+    try:
+        return response.json()
+    except ValueError as e:
+        raise LLMError(f"Invalid JSON body from {model}: {response.text[:500]}") from e
+
+
+async def _request(model, prompt, config, agent, key, validate=None):
+    data = await _call(model, prompt, config, agent)
+    result = parse_response(data)
+    # A reply cut off at maxOutputTokens is resumed rather than regenerated
+    for _ in range(LLM_MAX_CONTINUATIONS):
+        if not is_truncated(result):
+            break
+        try:
+            more = parse_response(await _call(model, prompt, continuation_config(config), agent, result.text))
+        except LLMError as e:
+            logger.warning(f"Could not continue truncated {model} response, keeping {len(result.text)} chars: {e}")
+            break
+        data = stitched_body(result, more)
+        result = parse_response(data)
+        logger.info(f"Continued truncated {model} response to {len(result.text)} chars")
+    cache = get_cache()
+    # A reply still cut off, or rejected by ``validate``, is returned but not cached, so the next caller gets a good one
+    if cache is not None and not is_truncated(result) and _accepted(validate, result):
+        await cache.aset(key, data, agent)
+    return result
+
+
+async def _call(model, prompt, config, agent, partial=None):
+    """One generateContent call with rate limiting, retries and the circuit breaker; returns the body."""
+    limiter = get_limiter()
+    estimated = estimate_tokens(prompt + (partial or ""), config)
+    breaker = get_breaker(model, "generateContent")
+    get_retry_budget().record_request()
+    attempt = 0
+    while True:
+        _check_circuit(breaker)
+        try:
+            await within_deadline(limiter.acquire(model, estimated), f"a {model} rate limit slot")
+            data = await within_deadline(_post(model, prompt, config, agent, partial), model)
+            breaker.record_success()
+            break
+        except LLMError as e:
+            _record(breaker, e)
+            delay = None if breaker.state == OPEN else _retry_delay(model, e, attempt)
+            if delay is None:
+                metrics.observe_upstream(agent, model, attempt + 1)
+                raise
+            logger.warning(f"Retrying {model} in {delay:.1f}s (attempt {attempt + 2}/{LLM_MAX_ATTEMPTS}): {e}")
+            await asyncio.sleep(delay)
+            attempt += 1
+        except BaseException:
+            breaker.release()
+            raise
+    usage = data.get("usageMetadata") or {}
+    limiter.settle(model, estimated, usage.get("totalTokenCount"))
+    metrics.observe_upstream(agent, model, attempt + 1, usage)
+    return data
+
+
+def generate(model, prompt, config=None, agent=None, refresh=False, validate=None):
+    """Blocking wrapper around :func:`agenerate` for sync callers."""
+    return run_sync(agenerate(model, prompt, config, agent=agent, refresh=refresh, validate=validate))
+
+
+async def astream_generate(model, prompt, config=None, agent=None, refresh=False):
+    """
+    Async generator over text chunks from streamGenerateContent (server-sent events).
+    Shares cache entries with :func:`agenerate`: a cached response is yielded in one
+    chunk, and a completed stream is stored as if it came from generateContent.
+    A stream that fails before its first chunk is retried like a normal request.
+    """
+    started = time.monotonic()
+    cache = get_cache()
+    key = make_key(model, prompt, config)
+    if cache is not None and not refresh and not is_bypassed():
+        cached = await cache.aget(key)
+        if cached is not None and _accepted(validate, parse_response(cached)):
+            metrics.observe_request(agent, model, time.monotonic() - started, "hit")
+            yield parse_response(cached).text
+            return
+
+    limiter = get_limiter()
+    estimated = estimate_tokens(prompt, config)
+    breaker = get_breaker(model, "streamGenerateContent")
+    get_retry_budget().record_request()
+    state = {"parts": [], "finish_reason": None, "usage": None}
+    try:
+        attempt = 0
+        while True:
+            _check_circuit(breaker)
+            try:
+                await within_deadline(limiter.acquire(model, estimated), f"a {model} rate limit slot")
+                chunks = _stream(model, prompt, config, agent, state)
+                try:
+                    while True:
+                        try:
+                            text = await within_deadline(chunks.__anext__(), model)
+                        except StopAsyncIteration:
+                            break
+                        yield text
+                finally:
+                    await chunks.aclose()
+                breaker.record_success()
+                break
+            except LLMError as e:
+                _record(breaker, e)
+                delay = None if state["parts"] or breaker.state == OPEN else _retry_delay(model, e, attempt)
+                if delay is None:
+                    metrics.observe_upstream(agent, model, attempt + 1)
+                    raise
+                logger.warning(f"Retrying stream from {model} in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+                attempt += 1
+            except BaseException:
+                breaker.release()
+                raise
+        usage = state["usage"] or {}
+        limiter.settle(model, estimated, usage.get("totalTokenCount"))
+        metrics.observe_upstream(agent, model, attempt + 1, usage)
+        if not state["parts"]:
+            raise LLMError(f"Empty stream from {model} (finishReason={state['finish_reason']})")
+    except LLMError as e:
+        metrics.observe_request(agent, model, time.monotonic() - started, "miss", _outcome(e))
+        raise
+    metrics.observe_request(agent, model, time.monotonic() - started, "miss")
+    if cache is not None:
+        body = {
+            "candidates": [{
+                "content": {"parts": [{"text": "".join(state["parts"])}], "role": "model"},
+                "finishReason": state["finish_reason"],
+            }],
+            "usageMetadata": usage,
+        }
+        await cache.aset(key, body, agent)
+
+
+async def _stream(model, prompt, config, agent, state):
+    url = f"{GEMINI_API_BASE}/models/{model}:streamGenerateContent"
+    async with get_semaphore():
+        try:
+            async with get_http_client().stream(
+                "POST",
+                url,
+                params={"key": GEMINI_API_KEY, "alt": "sse"},
+                json=build_payload(prompt, config),
+                timeout=get_timeout(agent),
+            ) as response:
+                if response.status_code >= 400:
+                    body = (await response.aread()).decode("utf-8", "replace")
+                    raise _http_error(model, response, body)
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    try:
+                        event = json.loads(line[5:])
+                    except ValueError:
+                        raise LLMError(f"Invalid stream event from {model}: {line[:200]}")
+                    candidate = (event.get("candidates") or [{}])[0]
+                    state["finish_reason"] = candidate.get("finishReason", state["finish_reason"])
+                    state["usage"] = event.get("usageMetadata", state["usage"])
+                    text = "".join(part.get("text", "") for part in candidate.get("content", {}).get("parts", []))
+                    if text:
+                        state["parts"].append(text)
+                        yield text
+        except httpx.HTTPError as e:
+            raise LLMError(f"Stream from {model} failed: {e!r}", retryable=True) from e
+
+
+def stream_generate(model, prompt, config=None, agent=None, refresh=False):
+    """Blocking generator twin of :func:`astream_generate`."""
+    return iterate_sync(astream_generate(model, prompt, config, agent=agent, refresh=refresh))
+
+
+async def _warm():
+    try:
+        await get_http_client().get(
+            f"{GEMINI_API_BASE}/models",
+            params={"key": GEMINI_API_KEY, "pageSize": 1},
+        )
+        logger.info("Gemini connection pool warmed")
+    except httpx.HTTPError as e:
+        logger.warning(f"Gemini pre-warm failed: {e!r}")
+
+
+def prewarm():
+    """
+    Open a pooled connection to the Gemini endpoint in the background so the
+    first real request skips the TCP/TLS handshake. Safe to call on every rerun.
+    """
+    global _prewarmed
+    with _lock:
+        if _prewarmed:
+            return
+        _prewarmed = True
+    submit(_warm())
@@ -0,0 +1,69 @@
+"""Resuming responses that stopped at maxOutputTokens.
+
+When Gemini reports ``finishReason: MAX_TOKENS`` the client sends the
+partial output back as the model's turn and asks it to carry on, then
+stitches the pieces into one generateContent-shaped body. That costs one
+short call for the missing tail instead of regenerating the whole answer.
+"""
+import re
+
+TRUNCATED = "MAX_TOKENS"
+
+CONTINUE_PROMPT = (
+    "Your previous reply was cut off. Continue it exactly where it stops, "
+    "starting with the next character. Do not repeat any earlier text and "
+    "do not add code fences, headings or commentary."
+)
+
+# A repeated tail shorter than this is as likely to be a coincidence as an overlap
+MIN_OVERLAP = 20
+MAX_OVERLAP = 400
+
+_LEADING_FENCE = re.compile(r"\s*```[\w-]*[ \t]*\n")
+
+
+def is_truncated(response):
+    return response.finish_reason == TRUNCATED and bool(response.text)
+
+
+def continuation_contents(prompt, partial):
+    """Conversation for the follow-up call: original prompt, partial answer, request to resume."""
+    return [
+        {"role": "user", "parts": [{"text": prompt}]},
+        {"role": "model", "parts": [{"text": partial}]},
+        {"role": "user", "parts": [{"text": CONTINUE_PROMPT}]},
+    ]
+
+
+def continuation_config(config):
+    # The tail is a fragment, so a schema or JSON mime type would make the model start a fresh document
+    config = dict(config or {})
+    config.pop("response_schema", None)
+    config.pop("response_mime_type", None)
+    return config
+
+
+def stitch(head, tail):
+    """Append ``tail`` to ``head``, dropping a code fence the model opened anyway and any text it repeated."""
+    fence = _LEADING_FENCE.match(tail)
+    if fence:
+        tail = tail[fence.end():]
+    for size in range(min(len(head), len(tail), MAX_OVERLAP), MIN_OVERLAP - 1, -1):
+        if head.endswith(tail[:size]):
+            return head + tail[size:]
+    return head + tail
+
+
+def stitched_body(first, second):
+    """generateContent body for ``first`` continued by ``second`` (both LLMResponse)."""
+    usage = dict(first.usage)
+    for name, count in second.usage.items():
+        if isinstance(count, int):
+            usage[name] = usage.get(name, 0) + count
+    return {
+        "candidates": [{
+            "content": {"parts": [{"text": stitch(first.text, second.text)}], "role": "model"},
+            "finishReason": second.finish_reason,
+        }],
+        "usageMetadata": usage,
+    }
@@ -0,0 +1,68 @@
+"""Deadlines for everything an LLM-backed page does.
+
+A :class:`Deadline` is created when the user submits a form, stored in
+session state and activated with :func:`deadline_scope`. Like
+bypass_cache() it lives in a contextvar, so it follows work handed to the
+shared loop with submit()/run_sync(). The client shrinks per-attempt
+timeouts and retries to the time left and raises DeadlineExceeded once it
+runs out, which sends every agent to its fallback.
+"""
+import contextvars
+import math
+import time
+from contextlib import contextmanager
+from src.config.settings import PAGE_DEADLINE_SECONDS
+
+_current = contextvars.ContextVar("llm_deadline", default=None)
+
+
+class Deadline:
+    def __init__(self, seconds=PAGE_DEADLINE_SECONDS, clock=time.monotonic):
+        self.seconds = seconds
+        self.clock = clock
+        self.expires_at = clock() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - self.clock())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def extend_to(self, other):
+        """Leave at least as much time as ``other`` has; None (no deadline) lifts the limit."""
+        if other is None:
+            self.expires_at = math.inf
+        else:
+            self.expires_at = max(self.expires_at, self.clock() + other.remaining())
+
+    def __repr__(self):
+        return f"Deadline(remaining={self.remaining():.1f}s)"
+
+
+@contextmanager
+def deadline_scope(deadline):
+    """Run the block (and any LLM work it submits) under ``deadline``; None means no deadline."""
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def current_deadline():
+    return _current.get()
+
+
+def remaining_time():
+    """Seconds left on the active deadline, or None when there is none."""
+    deadline = _current.get()
+    if deadline is None or deadline.expires_at == math.inf:
+        return None
+    return deadline.remaining()
+
+
+def context_with_deadline(deadline):
+    """A copy of the current context with ``deadline`` active in place of the caller's."""
+    context = contextvars.copy_context()
+    context.run(_current.set, deadline)
+    return context
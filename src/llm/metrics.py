@@ -0,0 +1,247 @@
+"""In-process metrics for LLM calls.
+
+The client records every call here: latency and outcome per caller (with
+cache hit or miss), and attempts, token counts and estimated cost per
+upstream request. Agents record when they fall back to canned output, and
+the analyzer whether a mistake's explanation came from its store.
+:func:`render_prometheus` produces the Prometheus text format, served by
+:func:`start_metrics_server`, and :func:`agent_summary` feeds the admin panel.
+"""
+import logging
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.config.settings import LLM_PRICES
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+TOKEN_BUCKETS = (16, 64, 256, 1024, 2048, 4096, 8192, 16384, 32768)
+ATTEMPT_BUCKETS = (1, 2, 3, 4, 6)
+
+_server = None
+_server_started = False
+_server_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def get(self, labels):
+        with self._lock:
+            return self.values.get(labels, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label tuple, as Prometheus expects."""
+
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets) + (math.inf,)
+        self.series = {}  # labels -> [per-bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self.series.setdefault(labels, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def merged(self, match):
+        """(bucket counts, sum, count) over every series whose labels satisfy ``match``."""
+        counts, total, count = [0] * len(self.buckets), 0.0, 0
+        with self._lock:
+            for labels, (series_counts, series_sum, series_count) in self.series.items():
+                if match(labels):
+                    counts = [a + b for a, b in zip(counts, series_counts)]
+                    total += series_sum
+                    count += series_count
+        return counts, total, count
+
+    def quantile(self, q, match=lambda labels: True):
+        """Estimate the ``q`` quantile by interpolating inside the bucket that holds it."""
+        counts, _, count = self.merged(match)
+        if not count:
+            return None
+        rank = q * count
+        seen, lower = 0, 0.0
+        for bound, bucket_count in zip(self.buckets, counts):
+            if bucket_count and seen + bucket_count >= rank:
+                if bound == math.inf:
+                    return lower
+                return lower + (bound - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+            lower = bound if bound != math.inf else lower
+        return lower
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self.series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{_label_text(self.labels, labels, [('le', _number(bound))])} {cumulative}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, labels)} {_number(total)}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, labels)} {count}")
+        return lines
+
+
+request_seconds = Histogram(
+    "llm_request_seconds", "Time each agent waited for an LLM response.", ("agent", "model", "cache", "outcome"), LATENCY_BUCKETS
+)
+attempts = Histogram("llm_request_attempts", "HTTP attempts per upstream Gemini request.", ("agent", "model"), ATTEMPT_BUCKETS)
+prompt_tokens = Histogram("llm_prompt_tokens", "Prompt tokens per upstream request.", ("agent", "model"), TOKEN_BUCKETS)
+output_tokens = Histogram("llm_output_tokens", "Output tokens per upstream request.", ("agent", "model"), TOKEN_BUCKETS)
+cost_usd = Counter("llm_cost_usd_total", "Estimated Gemini spend in US dollars.", ("agent", "model"))
+fallbacks = Counter("agent_fallbacks_total", "Times an agent returned canned output instead of Gemini's.", ("agent",))
+explanation_lookups = Counter("explanation_store_lookups_total", "Mistake explanations looked up in the explanation store.", ("result",))
+
+REGISTRY = [request_seconds, attempts, prompt_tokens, output_tokens, cost_usd, fallbacks, explanation_lookups]
+
+
+def _agent(agent):
+    return agent or "other"
+
+
+def observe_request(agent, model, seconds, cache, outcome="ok"):
+    """One caller's wait for a response; ``cache`` is "hit" or "miss"."""
+    request_seconds.observe((_agent(agent), model, cache, outcome), seconds)
+
+
+def observe_upstream(agent, model, attempt_count, usage=None):
+    """One upstream request: attempts it took and, when it succeeded, its token usage and cost."""
+    labels = (_agent(agent), model)
+    attempts.observe(labels, attempt_count)
+    if usage is None:
+        return
+    prompt = usage.get("promptTokenCount") or 0
+    output = usage.get("candidatesTokenCount") or 0
+    prompt_tokens.observe(labels, prompt)
+    output_tokens.observe(labels, output)
+    price = LLM_PRICES.get(model, LLM_PRICES["default"])
+    cost_usd.inc(labels, (prompt * price["input"] + output * price["output"]) / 1_000_000)
+
+
+def record_fallback(agent):
+    fallbacks.inc((agent,))
+
+
+def record_explanation_lookup(hit):
+    explanation_lookups.inc(("hit" if hit else "miss",))
+
+
+def explanation_hit_rate():
+    """Share of explanation lookups answered by the store, or None before the first one."""
+    hits, misses = explanation_lookups.get(("hit",)), explanation_lookups.get(("miss",))
+    return hits / (hits + misses) if hits + misses else None
+
+
+def render_prometheus():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def agent_summary():
+    """Per-agent rows for the admin panel, slowest p95 first."""
+    agents = {labels[0] for labels in list(request_seconds.series)} | {labels[0] for labels in list(fallbacks.values)}
+    costs = list(cost_usd.values.items())
+    rows = []
+    for agent in agents:
+        by_agent = lambda labels: labels[0] == agent
+        _, _, calls = request_seconds.merged(by_agent)
+        _, _, hits = request_seconds.merged(lambda labels: labels[0] == agent and labels[2] == "hit")
+        _, _, errors = request_seconds.merged(lambda labels: labels[0] == agent and labels[3] != "ok")
+        _, attempt_sum, upstream = attempts.merged(by_agent)
+        _, prompt_sum, _ = prompt_tokens.merged(by_agent)
+        _, output_sum, _ = output_tokens.merged(by_agent)
+        p50 = request_seconds.quantile(0.5, by_agent)
+        p95 = request_seconds.quantile(0.95, by_agent)
+        rows.append({
+            "agent": agent,
+            "calls": calls,
+            "cache hit %": round(100 * hits / calls, 1) if calls else 0.0,
+            "p50 s": round(p50, 2) if p50 is not None else None,
+            "p95 s": round(p95, 2) if p95 is not None else None,
+            "avg attempts": round(attempt_sum / upstream, 2) if upstream else None,
+            "prompt tokens": int(prompt_sum),
+            "output tokens": int(output_sum),
+            "cost $": round(sum(v for labels, v in costs if labels[0] == agent), 4),
+            "errors": errors,
+            "fallbacks": fallbacks.get((agent,)),
+        })
+    return sorted(rows, key=lambda row: row["p95 s"] or 0, reverse=True)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes every few seconds would flood the app log
+
+
+def start_metrics_server(port, host="0.0.0.0"):
+    """
+    Serve /metrics on ``port`` from a daemon thread. Safe to call on every
+    Streamlit rerun; only the first call starts the server. Returns the server.
+    """
+    global _server, _server_started
+    with _server_lock:
+        if not _server_started:
+            _server_started = True
+            try:
+                _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError as e:
+                logger.error(f"Metrics endpoint unavailable on port {port}: {e}")
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+            logger.info(f"Serving Prometheus metrics on :{port}/metrics")
+    return _server
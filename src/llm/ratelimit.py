@@ -0,0 +1,186 @@
+"""Client-side rate limiting and retry policy for Gemini calls.
+
+Every request waits on its model's request-per-minute and token-per-minute
+buckets before it is sent. Failed requests are retried with jittered
+exponential backoff that honours Retry-After hints, and only while the
+process-wide retry budget allows it, so an outage or quota exhaustion does
+not multiply traffic. Everything here runs on the shared LLM event loop.
+"""
+import asyncio
+import email.utils
+import random
+import time
+from src.config.settings import (
+    LLM_RATE_LIMITS,
+    LLM_BACKOFF_BASE,
+    LLM_BACKOFF_MAX,
+    LLM_RETRY_BUDGET_RATIO,
+    LLM_RETRY_BUDGET_RESERVE,
+)
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Refills ``per_minute`` tokens per minute, holding at most one minute's worth."""
+
+    def __init__(self, per_minute, clock=time.monotonic):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until ``amount`` tokens are available (0 if they are now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def give_back(self, amount):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    """Per-model RPM/TPM buckets plus a shared pause set by 429 responses."""
+
+    def __init__(self, limits=None, clock=time.monotonic):
+        self.limits = limits or LLM_RATE_LIMITS
+        self.clock = clock
+        self.buckets = {}
+        self.paused_until = {}
+        self.waits = 0
+
+    def _buckets(self, model):
+        if model not in self.buckets:
+            limit = self.limits.get(model, self.limits["default"])
+            self.buckets[model] = (TokenBucket(limit["rpm"], self.clock), TokenBucket(limit["tpm"], self.clock))
+        return self.buckets[model]
+
+    async def acquire(self, model, tokens):
+        """Wait until ``model`` has room for one request of about ``tokens`` tokens."""
+        requests, budget = self._buckets(model)
+        while True:
+            delay = max(
+                self.paused_until.get(model, 0) - self.clock(),
+                requests.wait_time(1),
+                budget.wait_time(tokens),
+            )
+            if delay <= 0:
+                requests.take(1)
+                budget.take(tokens)
+                return
+            self.waits += 1
+            await asyncio.sleep(delay)
+
+    def settle(self, model, estimated, actual):
+        """Correct the token bucket once the real usage of a request is known."""
+        if actual is None:
+            return
+        _, budget = self._buckets(model)
+        if actual < estimated:
+            budget.give_back(estimated - actual)
+        else:
+            budget.take(actual - estimated)
+
+    def pause(self, model, seconds):
+        """Hold every request to ``model`` for ``seconds`` (e.g. after a 429)."""
+        until = self.clock() + seconds
+        self.paused_until[model] = max(self.paused_until.get(model, 0), until)
+
+
+class RetryBudget:
+    """
+    Token bucket for retries: every first attempt deposits ``ratio`` of a
+    retry, capped at ``reserve`` tokens, and every retry spends one.
+    """
+
+    def __init__(self, ratio=LLM_RETRY_BUDGET_RATIO, reserve=LLM_RETRY_BUDGET_RESERVE):
+        self.ratio = ratio
+        self.reserve = reserve
+        self.tokens = float(reserve)
+        self.exhausted = 0
+
+    def record_request(self):
+        self.tokens = min(self.reserve, self.tokens + self.ratio)
+
+    def try_spend(self):
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        self.exhausted += 1
+        return False
+
+
+def estimate_tokens(prompt, config=None):
+    # Roughly four characters per token, plus the output the request may use
+    output = (config or {}).get("maxOutputTokens", 1024)
+    return len(prompt) // 4 + output
+
+
+def _parse_duration(value):
+    # Gemini's RetryInfo uses protobuf durations such as "17s" or "0.5s"
+    try:
+        return float(str(value).rstrip("s"))
+    except ValueError:
+        return None
+
+
+def retry_after(response):
+    """Server retry hint in seconds from a Retry-After header or Gemini RetryInfo, else None."""
+    header = response.headers.get("Retry-After")
+    if header:
+        try:
+            return max(0.0, float(header))
+        except ValueError:
+            try:
+                return max(0.0, email.utils.parsedate_to_datetime(header).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    try:
+        details = response.json().get("error", {}).get("details", [])
+    except (ValueError, AttributeError):
+        return None
+    for detail in details:
+        if str(detail.get("@type", "")).endswith("RetryInfo"):
+            return _parse_duration(detail.get("retryDelay", ""))
+    return None
+
+
+def backoff_delay(attempt, hint=None, base=LLM_BACKOFF_BASE, cap=LLM_BACKOFF_MAX):
+    """
+    Full-jitter exponential backoff for retry number ``attempt`` (0-based).
+    A server ``hint`` is treated as a floor, even when it is above ``cap``.
+    """
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if hint is not None:
+        delay = max(delay, hint)
+    return delay
+
+
+_limiter = None
+_budget = None
+
+
+def get_limiter():
+    global _limiter
+    if _limiter is None:
+        _limiter = RateLimiter()
+    return _limiter
+
+
+def get_retry_budget():
+    global _budget
+    if _budget is None:
+        _budget = RetryBudget()
+    return _budget
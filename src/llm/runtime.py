@@ -0,0 +1,124 @@
+"""Background event loop shared by all async LLM work.
+
+Streamlit runs each script on its own thread, so async agents cannot own an
+event loop there. Instead one daemon thread runs a long-lived loop; sync code
+hands coroutines to it with :func:`submit` / :func:`run_sync`. Keeping a
+single loop also keeps the async HTTP client's connection pool alive.
+"""
+import asyncio
+import concurrent.futures
+import contextvars
+import queue
+import threading
+
+_loop = None
+_thread = None
+_lock = threading.Lock()
+
+
+def get_loop():
+    """Return the shared event loop, starting its thread on first use."""
+    global _loop, _thread
+    if _loop is None:
+        with _lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="llm-event-loop", daemon=True)
+                thread.start()
+                _loop, _thread = loop, thread
+    return _loop
+
+
+def in_loop_thread():
+    return _thread is not None and threading.current_thread() is _thread
+
+
+def submit(coro):
+    """
+    Schedule ``coro`` on the shared loop and return a concurrent.futures.Future.
+    The caller's contextvars (cache bypass, deadlines, ...) are carried over.
+    """
+    loop = get_loop()
+    context = contextvars.copy_context()
+    future = concurrent.futures.Future()
+
+    def _start():
+        if not future.set_running_or_notify_cancel():
+            coro.close()
+            return
+        task = loop.create_task(coro, context=context)
+
+        def _done(task):
+            if task.cancelled():
+                future.set_exception(concurrent.futures.CancelledError())
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+
+        task.add_done_callback(_done)
+
+    loop.call_soon_threadsafe(_start)
+    return future
+
+
+def run_sync(coro, timeout=None):
+    """Run ``coro`` on the shared loop and block until it finishes."""
+    if in_loop_thread():
+        coro.close()
+        raise RuntimeError("run_sync() called from the LLM event loop; await the coroutine instead")
+    return submit(coro).result(timeout)
+
+
+async def gather_bounded(coros, limit, return_exceptions=False):
+    """
+    Await ``coros`` with at most ``limit`` running at once. Results come back
+    in input order, like asyncio.gather.
+    """
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def _run(coro):
+        async with semaphore:
+            return await coro
+
+    return await asyncio.gather(*(_run(c) for c in coros), return_exceptions=return_exceptions)
+
+
+def iterate_sync(agen):
+    """
+    Drive async generator ``agen`` on the shared loop and yield its items to
+    a sync caller as they arrive. Exceptions are re-raised in the caller.
+    """
+    items = queue.Queue()
+    done = object()
+
+    async def _pump():
+        try:
+            async for item in agen:
+                items.put((True, item))
+        except BaseException as e:
+            items.put((False, e))
+        finally:
+            items.put((True, done))
+
+    submit(_pump())
+    while True:
+        ok, item = items.get()
+        if not ok:
+            raise item
+        if item is done:
+            return
+        yield item
+
+
+async def collect_stream(agen, on_text=None):
+    """
+    Consume async generator ``agen`` of text chunks and return the full text,
+    calling ``on_text(text_so_far)`` after every chunk.
+    """
+    text = ""
+    async for chunk in agen:
+        text += chunk
+        if on_text is not None:
+            on_text(text)
+    return text
@@ -0,0 +1,102 @@
+"""Coalescing of identical in-flight work (singleflight).
+
+When several callers ask for the same thing at the same moment - a popular
+topic picked by many users, a double-clicked button - only the first caller
+does the work and the others await its result. Everything here runs on the
+shared LLM event loop, so the in-flight table needs no locking.
+"""
+import asyncio
+import copy
+import functools
+from src.llm.cache import is_bypassed
+from src.llm.deadline import Deadline, context_with_deadline, current_deadline, remaining_time
+from src.llm.metrics import record_fallback
+
+_inflight = {}
+_stats = {}
+
+
+def normalize_skills(skills):
+    """Order-, case- and whitespace-insensitive key for a skill list."""
+    if isinstance(skills, str):
+        skills = [skills]
+    return tuple(sorted({" ".join(str(skill).split()).casefold() for skill in skills or []}))
+
+
+def _count(namespace, field):
+    counters = _stats.setdefault(namespace, {"calls": 0, "coalesced": 0})
+    counters[field] += 1
+
+
+async def coalesce(key, make_coro):
+    """
+    Await ``make_coro()`` unless a call with the same ``key`` is already in
+    flight, in which case wait for that one instead. ``key[0]`` names the
+    counter bucket. Every caller gets its own deep copy of the result, and a
+    failure is raised in every caller.
+
+    The shared work runs under a deadline of its own, extended to the most
+    generous waiter's, so one caller's short budget never cuts it short for
+    the rest. Each caller waits only until its own deadline, then gets
+    DeadlineExceeded while the work carries on for the others.
+    """
+    from src.llm.client import DeadlineExceeded  # client imports this module
+
+    namespace = key[0]
+    _count(namespace, "calls")
+    caller = current_deadline()
+    entry = _inflight.get(key)
+    if entry is None:
+        shared = None if caller is None else Deadline(caller.remaining(), caller.clock)
+        task = asyncio.get_running_loop().create_task(make_coro(), context=context_with_deadline(shared))
+        entry = _inflight[key] = (task, shared)
+        task.add_done_callback(lambda done: _inflight.pop(key, None) if _inflight.get(key) is entry else None)
+    else:
+        _count(namespace, "coalesced")
+        task, shared = entry
+        if shared is not None:
+            shared.extend_to(caller)
+    # Shielded so one caller giving up does not cancel the work for the rest
+    remaining = remaining_time()
+    if remaining is None:
+        result = await asyncio.shield(task)
+    else:
+        try:
+            result = await asyncio.wait_for(asyncio.shield(task), remaining)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"Deadline passed while waiting for shared {namespace} work")
+    return copy.deepcopy(result)
+
+
+def coalesced(namespace, fallback=None):
+    """
+    Decorator for async agents whose first argument is a skill list: concurrent
+    calls for the same normalized skills share one run. Calls made inside a
+    bypass_cache() block only share with each other. A caller whose deadline
+    passes while it waits gets ``fallback(skills, ...)`` when one is given.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        async def wrapper(skills, *args, **kwargs):
+            from src.llm.client import DeadlineExceeded  # client imports this module
+
+            key = (namespace, normalize_skills(skills), args, tuple(sorted(kwargs.items())), is_bypassed())
+            try:
+                return await coalesce(key, lambda: func(skills, *args, **kwargs))
+            except DeadlineExceeded as e:
+                if fallback is None:
+                    raise
+                print(f"Deadline passed waiting for {namespace}: {e}")
+                record_fallback(namespace)
+                return fallback(skills, *args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def singleflight_stats():
+    """Return {namespace: {"calls": n, "coalesced": n}} since process start."""
+    return copy.deepcopy(_stats)
+
+
+def in_flight():
+    return len(_inflight)
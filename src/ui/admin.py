@@ -0,0 +1,27 @@
+import streamlit as st
+from src.config.settings import ADMIN_EMAILS
+from src.llm import agent_summary, breaker_states, explanation_hit_rate, get_cache
+
+def is_admin(user):
+    email = user.get("email") if isinstance(user, dict) else getattr(user, "email", None)
+    return bool(email) and email.lower() in ADMIN_EMAILS
+
+def render_admin_panel():
+    rows = agent_summary()
+    if not rows:
+        st.caption("No LLM calls recorded in this process yet.")
+        return
+    # Slowest agents first; latency is what each caller waited, cache hits included
+    st.dataframe(rows, hide_index=True, use_container_width=True)
+    total_cost = sum(row["cost $"] for row in rows)
+    total_fallbacks = sum(row["fallbacks"] for row in rows)
+    st.caption(f"Estimated spend ${total_cost:.4f}, {total_fallbacks} fallbacks since this process started.")
+    cache = get_cache()
+    if cache is not None:
+        st.caption(f"Response cache hit rate {cache.stats()['hit_rate']:.0%}")
+    explanation_rate = explanation_hit_rate()
+    if explanation_rate is not None:
+        st.caption(f"Mistake explanations served from the store {explanation_rate:.0%}")
+    open_circuits = [name for name, state in breaker_states().items() if state["state"] != "closed"]
+    if open_circuits:
+        st.warning(f"Circuits not closed: {', '.join(open_circuits)}")
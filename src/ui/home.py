@@ -1,6 +1,7 @@
 import streamlit as st
 from src.agents.resume import resume_scanner_agent, split_skills
 from src.config.settings import supabase
+from src.llm import Deadline, deadline_scope
 
 def render_home_view():
     # Replace your welcome line
@@ -27,7 +28,10 @@ def render_home_view():
             
             if submit_topic:
                 if topic_input:
-                    topic_list = split_skills(topic_input)
+                    # The results page shares this budget with the skill split
+                    st.session_state.deadline = Deadline()
+                    with deadline_scope(st.session_state.deadline):
+                        topic_list = split_skills(topic_input)
                     if len(topic_list) > 1:
                         st.session_state.skills = topic_list
                         st.session_state.topic = None
@@ -50,7 +54,8 @@ def render_home_view():
             if st.button("Analyze Resume", key="analyze_resume"):
                 with st.spinner("Analyzing your resume..."):
                     file_type = resume_file.name.split(".")[-1].lower()
-                    extracted_skills = resume_scanner_agent(resume_file, file_type)
+                    with deadline_scope(Deadline()):
+                        extracted_skills = resume_scanner_agent(resume_file, file_type)
                     st.session_state.parsed_resume_skills = extracted_skills
             
             # Display extracted skills if available
@@ -73,6 +78,7 @@ def render_home_view():
                         if selected_skills:
                             st.session_state.skills = selected_skills
                             st.session_state.topic = None
+                            st.session_state.deadline = Deadline()
                             st.session_state.view = "Results"
                             st.rerun()
                         else:
@@ -1,472 +1,681 @@
 import streamlit as st
+import asyncio
+import concurrent.futures
+import contextvars
 import json
-from src.agents.quiz import quiz_generator_agent
-from src.agents.analyzer import quiz_analyzer_agent
-from src.agents.advisor import advisor_agent
-from src.agents.assistant import assistant_agent
-from src.agents.librarian import librarian_agent
-from src.agents.module import module_generator_agent
-from src.agents.professor import professor_agent
+from src.agents.quiz import quiz_generator_agent_async
+from src.agents.analyzer import map_quiz_async, grade_quiz, explain_mistake_async, fallback_feedback
+from src.agents.explanations import lookup_explanation
+from src.agents.advisor import advisor_agent_async
+from src.agents.assistant import assistant_agent_async
+from src.agents.librarian import librarian_agent_async
+from src.agents.module import generate_modules_async
+from src.agents.professor import professor_sections_async, join_sections
 from src.db.supabase_client import save_modules
+from src.utils.json_repair import loads
+from src.llm import bypass_cache, submit, breaker_states, Deadline, deadline_scope, current_deadline
 import time
 
 def render_results_view():
+    # Regen buttons ask for fresh generations instead of cached responses
+    refresh = st.session_state.pop("refresh_generation", False)
+    with bypass_cache(refresh), deadline_scope(_page_deadline()):
+        _render_results_tabs()
+
+def _page_deadline():
+    # The budget starts at submit; buttons that start new work clear it and a fresh one begins here
+    deadline = st.session_state.get("deadline")
+    if deadline is None or deadline.expired():
+        deadline = st.session_state.deadline = Deadline()
+    return deadline
+
+def _render_results_tabs():
     topic = st.session_state.get("topic")
     skills = st.session_state.get("skills", [])
     tabs = st.tabs(["📚 Knowledge Base", "🗺️ Learning Path", "📖 Resources", "🏋️ Exercises", "✍️ Skill Assessment"])
 
-    with tabs[0]:
-        st.write("📚 Professor Agent: Knowledge Base")
-        if "knowledge_base" not in st.session_state:
-            with st.spinner("Building your knowledge base..."):
-                try:
-                    st.session_state.knowledge_base = professor_agent(skills or [topic])
-                except Exception as e:
-                    st.error(f"Error building knowledge base: {str(e)}")
-                    st.session_state.knowledge_base = f"# Knowledge Base for {', '.join(skills or [topic])}\n\nError generating content. Please try again later."
-        
-        # Safely display the knowledge base
+    # (tab, header, artifacts the tab needs, renderer, waiting message)
+    sections = [
+        (tabs[0], "📚 Professor Agent: Knowledge Base", ["knowledge_base"], _render_knowledge_base, "Building your knowledge base..."),
+        (tabs[1], "🗺️ Advisor Agent: Learning Path", ["learning_path"], _render_learning_path, "Mapping your path..."),
+        (tabs[2], "📖 Librarian Agent: Resources", ["resources", "learning_path"], _render_resources, "Gathering resources..."),
+        (tabs[3], "🏋️ Assistant Agent: Exercises", ["exercises"], _render_exercises, "Generating exercises..."),
+        (tabs[4], "✍️ Quiz Time—Test Your Edge", ["quiz_output"], _render_assessment, "Crafting your quiz (this might take a sec)..."),
+    ]
+
+    # Kick off every missing artifact at once; each tab renders as soon as its own inputs are ready
+    pending = _start_generations(skills or [topic])
+    previews = st.session_state.pending_generations["previews"]
+    waiting = []
+    for tab, header, needs, render, message in sections:
+        with tab:
+            st.write(header)
+            slot = st.empty()
+        if any(key in pending for key in needs):
+            slot.info(f"⏳ {message}")
+            waiting.append((slot, needs, render))
+        else:
+            with slot.container():
+                render(skills, topic)
+
+    shown = {}
+    while waiting:
+        concurrent.futures.wait(
+            [pending[key] for _, needs, _ in waiting for key in needs if key in pending],
+            timeout=0.25,
+            return_when=concurrent.futures.FIRST_COMPLETED
+        )
+        # Show streamed text in tabs that are still generating
+        for slot, needs, _ in waiting:
+            preview = _preview_markdown(needs[0], dict(previews.get(needs[0], {})))
+            if preview and shown.get(needs[0]) != len(preview):
+                slot.markdown(preview)
+                shown[needs[0]] = len(preview)
+        for key in [key for key, future in pending.items() if future.done()]:
+            _collect_generation(key, pending.pop(key), skills or [topic])
+        for section in [w for w in waiting if not any(key in pending for key in w[1])]:
+            waiting.remove(section)
+            slot, _, render = section
+            with slot.container():
+                render(skills, topic)
+    st.session_state.pop("pending_generations", None)
+    if any(state["state"] != "closed" for state in breaker_states().values()):
+        st.warning("Gemini is unavailable right now, so some sections may show default content. Try again in a minute.")
+
+def _needs_generation(key):
+    if st.session_state.get(key) is None:
+        return True
+    return (key == "exercises" and st.session_state.get("regen_exercises", False)) or \
+        (key == "quiz_output" and st.session_state.get("regen_quiz", False))
+
+async def _resolve(value):
+    # Dependencies are either ready values or futures from another generation
+    if isinstance(value, concurrent.futures.Future):
+        return await asyncio.wrap_future(value)
+    return value
+
+async def _exercises_after(skill_list, learning_path, on_progress=None):
+    return await assistant_agent_async(skill_list, learning_path=await _resolve(learning_path), on_progress=on_progress)
+
+async def _quiz_after(skill_list, knowledge_base):
+    knowledge_base = await _resolve(knowledge_base)
+    if isinstance(knowledge_base, dict):
+        knowledge_base = join_sections(knowledge_base)
+    return await quiz_generator_agent_async(skill_list, knowledge_base or "No knowledge base available.")
+
+def _start_generations(skill_list):
+    """
+    Submit every artifact the Results view is missing to the shared LLM loop
+    and return {session key: future}. Futures survive reruns in session state,
+    so a rerun mid-generation picks up the same work instead of starting over.
+    """
+    pending = st.session_state.get("pending_generations")
+    if pending and pending["skills"] == skill_list:
+        futures, previews = pending["futures"], pending["previews"]
+    else:
+        futures, previews = {}, {"knowledge_base": {}, "exercises": {}}
+
+    def start(key, make_coro):
+        if key not in futures and _needs_generation(key):
+            futures[key] = submit(make_coro())
+
+    start("knowledge_base", lambda: professor_sections_async(
+        skill_list, on_progress=previews["knowledge_base"].__setitem__
+    ))
+    start("learning_path", lambda: advisor_agent_async(skill_list))
+    start("resources", lambda: librarian_agent_async(skill_list))
+    start("exercises", lambda: _exercises_after(
+        skill_list, futures.get("learning_path", st.session_state.get("learning_path")),
+        on_progress=previews["exercises"].__setitem__
+    ))
+    start("quiz_output", lambda: _quiz_after(
+        skill_list, futures.get("knowledge_base", st.session_state.get("knowledge_base"))
+    ))
+    st.session_state.pending_generations = {"skills": skill_list, "futures": futures, "previews": previews}
+    return futures
+
+def _preview_markdown(key, preview):
+    # Partial text streamed so far, laid out like the finished tab
+    if key == "exercises":
+        return "\n\n".join(f"### {skill}\n{text}" for skill, text in preview.items())
+    return "\n\n".join(preview.values())
+
+def _stream_into(slots, previews, future, interval=0.25):
+    """
+    Copy streamed text from ``previews`` into the matching ``slots`` until
+    ``future`` finishes, then return its result.
+    """
+    shown = {}
+    while True:
+        done = future.done()
+        for key, text in list(previews.items()):
+            if key in slots and shown.get(key) != len(text):
+                slots[key].markdown(f"#### {key}\n{text}")
+                shown[key] = len(text)
+        if done:
+            return future.result()
+        concurrent.futures.wait([future], timeout=interval)
+
+def _collect_generation(key, future, skill_list):
+    try:
+        result = future.result()
+        if key == "knowledge_base":
+            # Keep per-skill sections addressable alongside the joined markdown
+            st.session_state.knowledge_base_sections = result
+            result = join_sections(result)
+        st.session_state[key] = result
+    except Exception as e:
+        print(f"Error generating {key}: {e}")
+        st.session_state[key] = _fallback_artifact(key, skill_list)
+        if key == "knowledge_base":
+            st.session_state.knowledge_base_sections = None
+    if key == "exercises":
+        st.session_state.regen_exercises = False
+    elif key == "quiz_output":
+        st.session_state.regen_quiz = False
+        _prefetch_quiz_map(skill_list)
+
+def _prefetch_quiz_map(skill_list, deadline=None):
+    # Subskills and question mapping need only the quiz, so they are ready before anyone presses Grade Me.
+    # They run in a fresh context under their own deadline: the page's budget is mostly spent by the
+    # time the quiz lands, and a Regen's cache bypass should not carry over to the map
+    questions = st.session_state.quiz_output["questions"]
+
+    def start():
+        with deadline_scope(deadline or Deadline()):
+            return submit(map_quiz_async(skill_list, questions))
+
+    st.session_state.quiz_map = {"questions": questions, "future": contextvars.Context().run(start)}
+
+def _quiz_map(skill_list):
+    questions = st.session_state.quiz_output["questions"]
+    prefetched = st.session_state.get("quiz_map")
+    if prefetched and prefetched["questions"] == questions:
         try:
+            quiz_map = prefetched["future"].result()
+            # No taxonomy version means the subskills are the canned fallback
+            if quiz_map["taxonomy_version"] is not None:
+                return quiz_map
+        except Exception as e:
+            print(f"Error mapping the quiz ahead of grading: {e}")
+    # Missing, stale or failed prefetch: map again on the Grade Me budget
+    _prefetch_quiz_map(skill_list, current_deadline())
+    return st.session_state.quiz_map["future"].result()
+
+def _fallback_artifact(key, skill_list):
+    if key == "knowledge_base":
+        return f"# Knowledge Base for {', '.join(skill_list)}\n\nError generating content. Please try again later."
+    if key == "resources":
+        return {}
+    if key == "exercises":
+        return {skill: f"### Exercises for {skill}\n1. Practice basic {skill} concepts\n2. Build a simple project using {skill}\n3. Create documentation for your {skill} project" for skill in skill_list}
+    if key == "quiz_output":
+        return {
+            "quiz": f"# Quiz for {', '.join(skill_list)}\n\n1. What is the primary purpose of {skill_list[0]}?\n2. Name three core concepts in {skill_list[0]}.",
+            "questions": [
+                (f"What is the primary purpose of {skill_list[0]}?", "Easy", "Remember", "Multiple Choice", None, ["a) Wrong answer", "b) Wrong answer", "c) Wrong answer", "d) Correct answer"], "d"),
+                (f"Name three core concepts in {skill_list[0]}?", "Medium", "Understand", "Multiple Choice", None, ["a) Wrong answer", "b) Wrong answer", "c) Wrong answer", "d) Correct answer"], "d")
+            ]
+        }
+    return None
+
+def _render_knowledge_base(skills, topic):
+    # Safely display the knowledge base, one section per skill when there are several
+    try:
+        sections = st.session_state.get("knowledge_base_sections") or {}
+        if len(sections) > 1:
+            for skill, section in sections.items():
+                with st.expander(skill, expanded=True):
+                    st.markdown(section)
+        else:
             st.markdown(st.session_state.knowledge_base)
-        except:
-            st.error("Error displaying knowledge base content.")
-            st.text(str(st.session_state.knowledge_base)[:1000] + "...")
-
-    with tabs[1]:
-        st.write("🗺️ Advisor Agent: Learning Path")
-        if "learning_path" not in st.session_state:
-            with st.spinner("Mapping your path..."):
-                st.session_state.learning_path = advisor_agent(skills or [topic])
-        
-        learning_path = st.session_state.learning_path
+    except:
+        st.error("Error displaying knowledge base content.")
+        st.text(str(st.session_state.knowledge_base)[:1000] + "...")
+
+def _render_learning_path(skills, topic):
+    learning_path = st.session_state.learning_path
+    
+    # Safety check - ensure learning_path is a dictionary
+    if not learning_path:
+        st.error("Learning path could not be generated. Please try again.")
+        st.session_state.learning_path = None
+        return
         
-        # Safety check - ensure learning_path is a dictionary
-        if not learning_path:
-            st.error("Learning path could not be generated. Please try again.")
-            st.session_state.learning_path = None
-            return
-            
-        # Make sure learning_path is a dictionary    
-        if not isinstance(learning_path, dict):
-            try:
-                # Try to convert to dictionary if it's a string
-                if isinstance(learning_path, str):
-                    learning_path = json.loads(learning_path)
-                else:
-                    st.error("Learning path is in an invalid format. Please try again.")
-                    st.session_state.learning_path = None
-                    return
-            except:
-                st.error("Learning path data is corrupted. Please try again.")
+    # Make sure learning_path is a dictionary    
+    if not isinstance(learning_path, dict):
+        try:
+            # Try to convert to dictionary if it's a string
+            if isinstance(learning_path, str):
+                learning_path = loads(learning_path)
+            else:
+                st.error("Learning path is in an invalid format. Please try again.")
                 st.session_state.learning_path = None
                 return
-            
-        # Introduction
-        st.markdown("## Introduction")
-        st.markdown(learning_path.get("introduction", ""))
-        
-        # Skill Components
-        st.markdown("## Skill Components")
-        skill_components = learning_path.get("skill_components", [])
-        if skill_components and isinstance(skill_components, list):
-            for component in skill_components:
-                st.markdown(f"- {component}")
-        else:
-            st.markdown("No skill components found.")
-        
-        # Learning Path
-        st.markdown("## Learning Path")
-        learning_paths = learning_path.get("learning_path", [])
-        if learning_paths and isinstance(learning_paths, list):
-            for path in learning_paths:
-                if not isinstance(path, dict):
-                    continue
-                st.markdown(f"### {path.get('level', '')}")
-                st.markdown(path.get('description', ''))
-                st.markdown("**Resources:**")
-                resources = path.get('resources', [])
-                if resources and isinstance(resources, list):
-                    for resource in resources:
-                        st.markdown(f"- {resource}")
-                else:
-                    st.markdown("No resources found.")
-        else:
-            st.markdown("No learning path information found.")
-        
-        # Challenges
-        st.markdown("## Common Challenges and Solutions")
-        challenges = learning_path.get("challenges", [])
-        if challenges and isinstance(challenges, list):
-            for challenge in challenges:
-                if isinstance(challenge, dict):
-                    st.markdown(f"**{challenge.get('challenge', '')}:** {challenge.get('solution', '')}")
-        else:
-            st.markdown("No challenges found.")
-        
-        # Practice Exercises
-        st.markdown("## Practice Exercises")
-        exercises = learning_path.get("practice_exercises", [])
-        if exercises and isinstance(exercises, list):
-            for exercise in exercises:
-                st.markdown(f"- {exercise}")
-        else:
-            st.markdown("No practice exercises found.")
-        
-        # Progress Metrics
-        st.markdown("## Progress Metrics")
-        metrics = learning_path.get("progress_metrics", [])
-        if metrics and isinstance(metrics, list):
-            for metric in metrics:
-                st.markdown(f"- {metric}")
-        else:
-            st.markdown("No progress metrics found.")
-        
-        # Time Commitment
-        st.markdown("## Time Commitment")
-        st.markdown(learning_path.get("time_commitment", ""))
-        
-        # Show raw JSON in expandable section
-        with st.expander("View Raw JSON"):
-            st.json(learning_path)
-
-    with tabs[2]:
-        st.write("📖 Librarian Agent: Resources")
-        if "resources" not in st.session_state:
-            with st.spinner("Gathering resources..."):
-                try:
-                    st.session_state.resources = librarian_agent(skills or [topic])
-                except Exception as e:
-                    st.warning(f"Error gathering resources: {str(e)}")
-                    st.session_state.resources = {}
-        
-        # Get learning path resources
-        learning_path_resources = []
-        if "learning_path" in st.session_state and isinstance(st.session_state.learning_path, dict):
-            for path in st.session_state.learning_path.get("learning_path", []):
-                if isinstance(path, dict) and "level" in path and "resources" in path:
-                    level = path.get("level", "")
-                    for resource in path.get("resources", []):
-                        if resource and isinstance(resource, str):
-                            learning_path_resources.append({
-                                "title": resource,
-                                "url": "",
-                                "level": level
-                            })
-        
-        # Function to safely process JSON
-        def safely_load_json(json_str):
-            try:
-                # Handle common JSON formatting issues
-                json_str = json_str.strip()
-                if json_str.startswith("```json"):
-                    json_str = json_str.split("```json", 1)[1]
-                if json_str.endswith("```"):
-                    json_str = json_str.rsplit("```", 1)[0]
-                
-                # Fix trailing commas (invalid in JSON)
-                import re
-                json_str = re.sub(r',\s*}', '}', json_str)
-                json_str = re.sub(r',\s*]', ']', json_str)
-                
-                return json.loads(json_str.strip())
-            except Exception as e:
-                print(f"JSON parsing error: {e}")
-                return None
-        
-        # Display all resources in a well-formatted way
-        st.markdown("## 📚 All Learning Resources")
+        except:
+            st.error("Learning path data is corrupted. Please try again.")
+            st.session_state.learning_path = None
+            return
         
-        # Ensure resources is a dictionary
-        if not isinstance(st.session_state.resources, dict):
-            try:
-                # Try to convert to dictionary if it's a string
-                if isinstance(st.session_state.resources, str):
-                    parsed = safely_load_json(st.session_state.resources)
-                    if parsed:
-                        st.session_state.resources = parsed
-                    else:
-                        st.session_state.resources = {skill: [] for skill in (skills or [topic])}
+    # Introduction
+    st.markdown("## Introduction")
+    st.markdown(learning_path.get("introduction", ""))
+    
+    # Skill Components
+    st.markdown("## Skill Components")
+    skill_components = learning_path.get("skill_components", [])
+    if skill_components and isinstance(skill_components, list):
+        for component in skill_components:
+            st.markdown(f"- {component}")
+    else:
+        st.markdown("No skill components found.")
+    
+    # Learning Path
+    st.markdown("## Learning Path")
+    learning_paths = learning_path.get("learning_path", [])
+    if learning_paths and isinstance(learning_paths, list):
+        for path in learning_paths:
+            if not isinstance(path, dict):
+                continue
+            st.markdown(f"### {path.get('level', '')}")
+            st.markdown(path.get('description', ''))
+            st.markdown("**Resources:**")
+            resources = path.get('resources', [])
+            if resources and isinstance(resources, list):
+                for resource in resources:
+                    st.markdown(f"- {resource}")
+            else:
+                st.markdown("No resources found.")
+    else:
+        st.markdown("No learning path information found.")
+    
+    # Challenges
+    st.markdown("## Common Challenges and Solutions")
+    challenges = learning_path.get("challenges", [])
+    if challenges and isinstance(challenges, list):
+        for challenge in challenges:
+            if isinstance(challenge, dict):
+                st.markdown(f"**{challenge.get('challenge', '')}:** {challenge.get('solution', '')}")
+    else:
+        st.markdown("No challenges found.")
+    
+    # Practice Exercises
+    st.markdown("## Practice Exercises")
+    exercises = learning_path.get("practice_exercises", [])
+    if exercises and isinstance(exercises, list):
+        for exercise in exercises:
+            st.markdown(f"- {exercise}")
+    else:
+        st.markdown("No practice exercises found.")
+    
+    # Progress Metrics
+    st.markdown("## Progress Metrics")
+    metrics = learning_path.get("progress_metrics", [])
+    if metrics and isinstance(metrics, list):
+        for metric in metrics:
+            st.markdown(f"- {metric}")
+    else:
+        st.markdown("No progress metrics found.")
+    
+    # Time Commitment
+    st.markdown("## Time Commitment")
+    st.markdown(learning_path.get("time_commitment", ""))
+    
+    # Show raw JSON in expandable section
+    with st.expander("View Raw JSON"):
+        st.json(learning_path)
+
+def _render_resources(skills, topic):
+    # Get learning path resources
+    learning_path_resources = []
+    if "learning_path" in st.session_state and isinstance(st.session_state.learning_path, dict):
+        for path in st.session_state.learning_path.get("learning_path", []):
+            if isinstance(path, dict) and "level" in path and "resources" in path:
+                level = path.get("level", "")
+                for resource in path.get("resources", []):
+                    if resource and isinstance(resource, str):
+                        learning_path_resources.append({
+                            "title": resource,
+                            "url": "",
+                            "level": level
+                        })
+    
+    # Function to safely process JSON
+    def safely_load_json(json_str):
+        try:
+            return loads(json_str)
+        except Exception as e:
+            print(f"JSON parsing error: {e}")
+            return None
+    
+    # Display all resources in a well-formatted way
+    st.markdown("## 📚 All Learning Resources")
+    
+    # Ensure resources is a dictionary
+    if not isinstance(st.session_state.resources, dict):
+        try:
+            # Try to convert to dictionary if it's a string
+            if isinstance(st.session_state.resources, str):
+                parsed = safely_load_json(st.session_state.resources)
+                if parsed:
+                    st.session_state.resources = parsed
                 else:
                     st.session_state.resources = {skill: [] for skill in (skills or [topic])}
-            except:
-                st.session_state.resources = {skill: [] for skill in (skills or [topic])}
+            else:
                 st.session_state.resources = {skill: [] for skill in (skills or [topic])}
-        
-        # Display resources from librarian agent
-        if st.session_state.resources:
-            try:
-                skill_keys = list(st.session_state.resources.keys())
-                if skill_keys:
-                    tabs_skills = st.tabs(skill_keys)
+        except:
+            st.session_state.resources = {skill: [] for skill in (skills or [topic])}
+            st.session_state.resources = {skill: [] for skill in (skills or [topic])}
+    
+    # Display resources from librarian agent
+    if st.session_state.resources:
+        try:
+            skill_keys = list(st.session_state.resources.keys())
+            if skill_keys:
+                tabs_skills = st.tabs(skill_keys)
+                
+                for i, (skill, resources) in enumerate(st.session_state.resources.items()):
+                    with tabs_skills[i]:
+                        st.markdown(f"### Resources for {skill}")
                     
-                    for i, (skill, resources) in enumerate(st.session_state.resources.items()):
-                        with tabs_skills[i]:
-                            st.markdown(f"### Resources for {skill}")
+                    if isinstance(resources, list):
+                        # Group resources by level
+                        resources_by_level = {
+                            "Beginner": [],
+                            "Intermediate": [],
+                            "Advanced": [],
+                            "All levels": [],
+                            "Other": []
+                        }
+                        
+                        for resource in resources:
+                            if isinstance(resource, dict):
+                                level = resource.get("level", "Other")
+                                if level not in resources_by_level:
+                                    resources_by_level["Other"].append(resource)
+                                else:
+                                    resources_by_level[level].append(resource)
                         
-                        if isinstance(resources, list):
-                            # Group resources by level
-                            resources_by_level = {
-                                "Beginner": [],
-                                "Intermediate": [],
-                                "Advanced": [],
-                                "All levels": [],
-                                "Other": []
-                            }
-                            
-                            for resource in resources:
-                                if isinstance(resource, dict):
-                                    level = resource.get("level", "Other")
-                                    if level not in resources_by_level:
-                                        resources_by_level["Other"].append(resource)
-                                    else:
-                                        resources_by_level[level].append(resource)
-                            
-                            # Display resources by level
-                            for level, level_resources in resources_by_level.items():
-                                if level_resources:
-                                    with st.expander(f"{level} ({len(level_resources)} resources)", expanded=(level == "Beginner")):
-                                        for j, resource in enumerate(level_resources):
-                                            title = resource.get("title", f"Resource {j+1}")
-                                            url = resource.get("url", "")
-                                            description = resource.get("description", "")
-                                            format_type = resource.get("format", "")
-                                            cost = resource.get("cost", "")
-                                            time = resource.get("time_commitment", "")
-                                            
-                                            # Title with link
-                                            if url:
-                                                st.markdown(f"#### {j+1}. [{title}]({url})")
-                                            else:
-                                                st.markdown(f"#### {j+1}. {title}")
-                                            
-                                            # Resource details
-                                            col1, col2, col3 = st.columns([1,1,1])
-                                            with col1:
-                                                st.markdown(f"**Format:** {format_type}")
-                                            with col2:
-                                                st.markdown(f"**Cost:** {cost}")
-                                            with col3:
-                                                st.markdown(f"**Time:** {time}")
-                                            
-                                            # Description
-                                            if description:
-                                                st.markdown(f"{description}")
+                        # Display resources by level
+                        for level, level_resources in resources_by_level.items():
+                            if level_resources:
+                                with st.expander(f"{level} ({len(level_resources)} resources)", expanded=(level == "Beginner")):
+                                    for j, resource in enumerate(level_resources):
+                                        title = resource.get("title", f"Resource {j+1}")
+                                        url = resource.get("url", "")
+                                        description = resource.get("description", "")
+                                        format_type = resource.get("format", "")
+                                        cost = resource.get("cost", "")
+                                        time = resource.get("time_commitment", "")
                                         
-                                            st.markdown("---")
-                            else:
-                                st.markdown("No resources available for this skill.")
-            except Exception as e:
-                st.error(f"Error displaying resources: {str(e)}")
-                st.warning("No skills found in the resources or resources are in an invalid format.")
-                st.session_state.resources = {skill: [] for skill in (skills or [topic])}
-        else:
-            st.warning("No resources were generated by the librarian agent. Try selecting different skills or try again later.")
-            # Add a button to retry
-            if st.button("Retry generating resources"):
-                st.session_state.resources = None
-                st.rerun()
-            
-        # Display learning path resources
-        if learning_path_resources:
-            with st.expander("Additional Resources from Learning Path", expanded=True):
-                st.markdown("### Resources from Learning Path")
-                
-                # Group by level
-                levels = {}
-                for res in learning_path_resources:
-                    level = res.get("level", "Other")
-                    if level not in levels:
-                        levels[level] = []
-                    levels[level].append(res)
-                
-                # Display by level
-                for level, resources in levels.items():
-                    st.markdown(f"#### {level} Level")
-                    
-                    # Create a grid layout for resources
-                    cols = st.columns(2)
-                    for i, res in enumerate(resources):
-                        with cols[i % 2]:
-                            title = res.get("title", f"Resource {i+1}")
-                            url = res.get("url", "")
-                            
-                            if url:
-                                st.markdown(f"**[{title}]({url})**")
-                            else:
-                                st.markdown(f"**{title}**")
-                            
-                            # Add a divider except for the last item
-                            if i < len(resources) - 1:
-                                st.markdown("---")
+                                        # Title with link
+                                        if url:
+                                            st.markdown(f"#### {j+1}. [{title}]({url})")
+                                        else:
+                                            st.markdown(f"#### {j+1}. {title}")
+                                        
+                                        # Resource details
+                                        col1, col2, col3 = st.columns([1,1,1])
+                                        with col1:
+                                            st.markdown(f"**Format:** {format_type}")
+                                        with col2:
+                                            st.markdown(f"**Cost:** {cost}")
+                                        with col3:
+                                            st.markdown(f"**Time:** {time}")
+                                        
+                                        # Description
+                                        if description:
+                                            st.markdown(f"{description}")
+                                    
+                                        st.markdown("---")
+                        else:
+                            st.markdown("No resources available for this skill.")
+        except Exception as e:
+            st.error(f"Error displaying resources: {str(e)}")
+            st.warning("No skills found in the resources or resources are in an invalid format.")
+            st.session_state.resources = {skill: [] for skill in (skills or [topic])}
+    else:
+        st.warning("No resources were generated by the librarian agent. Try selecting different skills or try again later.")
+        # Add a button to retry
+        if st.button("Retry generating resources"):
+            st.session_state.resources = None
+            st.session_state.refresh_generation = True
+            st.session_state.deadline = None
+            st.rerun()
         
-        # Resource finder tip
-        with st.expander("How to find more resources"):
-            st.markdown("""
-            ### Tips for finding quality learning resources:
-            
-            1. **Search specific sites**: Try adding "site:coursera.org" or "site:freecodecamp.org" to your Google searches
-            2. **Check GitHub**: Look for repositories with "awesome-" prefix, like "awesome-python"
-            3. **Use platforms like**: Coursera, edX, Udemy, Pluralsight, LinkedIn Learning, or O'Reilly
-            4. **Find documentation**: Official documentation is often the best resource
-            
-            #### Recommended Learning Platforms:
-            | Platform | Best For | Cost |
-            | --- | --- | --- |
-            | [Codecademy](https://www.codecademy.com/) | Interactive coding practice | Freemium |
-            | [FreeCodeCamp](https://www.freecodecamp.org/) | Full stack development | Free |
-            | [Khan Academy](https://www.khanacademy.org/) | Computer science fundamentals | Free |
-            | [HackerRank](https://www.hackerrank.com/) | Coding challenges | Free |
-            | [LeetCode](https://leetcode.com/) | Interview prep | Freemium |
-            | [Coursera](https://www.coursera.org/) | University-level courses | Freemium |
-            | [edX](https://www.edx.org/) | Academic courses | Freemium |
+    # Display learning path resources
+    if learning_path_resources:
+        with st.expander("Additional Resources from Learning Path", expanded=True):
+            st.markdown("### Resources from Learning Path")
             
-            #### Pro Tip: 
-            Create a learning plan that combines different resource types: video courses for introduction, interactive platforms for practice, documentation for reference, and projects for application.
-            """)
+            # Group by level
+            levels = {}
+            for res in learning_path_resources:
+                level = res.get("level", "Other")
+                if level not in levels:
+                    levels[level] = []
+                levels[level].append(res)
             
-            # Add a checklist for tracking resource use
-            st.markdown("#### Resource Tracking:")
-            st.checkbox("I've bookmarked all useful resources")
-            st.checkbox("I've created a learning schedule")
-            st.checkbox("I've joined relevant online communities")
-
-    with tabs[3]:
-        st.write("🏋️ Assistant Agent: Exercises")
-        if "exercises" not in st.session_state or st.session_state.exercises is None or st.session_state.get("regen_exercises", False):
-            with st.spinner("Generating exercises..."):
-                try:
-                    st.session_state.exercises = assistant_agent(skills or [topic])
-                    st.session_state.regen_exercises = False
-                except Exception as e:
-                    st.error(f"Error generating exercises: {str(e)}")
-                    st.session_state.exercises = {skill: f"### Exercises for {skill}\n1. Practice basic {skill} concepts\n2. Build a simple project using {skill}\n3. Create documentation for your {skill} project" for skill in (skills or [topic])}
+            # Display by level
+            for level, resources in levels.items():
+                st.markdown(f"#### {level} Level")
+                
+                # Create a grid layout for resources
+                cols = st.columns(2)
+                for i, res in enumerate(resources):
+                    with cols[i % 2]:
+                        title = res.get("title", f"Resource {i+1}")
+                        url = res.get("url", "")
+                        
+                        if url:
+                            st.markdown(f"**[{title}]({url})**")
+                        else:
+                            st.markdown(f"**{title}**")
+                        
+                        # Add a divider except for the last item
+                        if i < len(resources) - 1:
+                            st.markdown("---")
+    
+    # Resource finder tip
+    with st.expander("How to find more resources"):
+        st.markdown("""
+        ### Tips for finding quality learning resources:
         
-        # Safely display exercises
-        if st.session_state.exercises:
-            try:
-                # Check if exercises is a dictionary
-                if isinstance(st.session_state.exercises, dict):
-                    st.markdown("\n\n".join(f"### {skill}\n{ex_text}" for skill, ex_text in st.session_state.exercises.items()))
-                else:
-                    st.markdown(str(st.session_state.exercises))
-            except:
-                st.error("Error displaying exercises.")
-                st.text(str(st.session_state.exercises)[:1000] + "...")
-        else:
-            st.write("No exercises generated yet—try again!")
-
-    with tabs[4]:
-        st.write("✍️ Quiz Time—Test Your Edge")
-        if "quiz_output" not in st.session_state or st.session_state.get("regen_quiz", False):
-            with st.spinner("Crafting your quiz (this might take a sec)..."):
-                try:
-                    st.session_state.quiz_output = quiz_generator_agent(skills or [topic])
-                    st.session_state.regen_quiz = False
-                except Exception as e:
-                    st.error(f"Error generating quiz: {str(e)}")
-                    st.session_state.quiz_output = {
-                        "quiz": f"# Quiz for {', '.join(skills or [topic])}\n\n1. What is the primary purpose of {skills[0] if skills else topic}?\n2. Name three core concepts in {skills[0] if skills else topic}.",
-                        "questions": [
-                            (f"What is the primary purpose of {skills[0] if skills else topic}?", "Easy", "Remember", "Multiple Choice", None, ["a) Wrong answer", "b) Wrong answer", "c) Wrong answer", "d) Correct answer"], "d"),
-                            (f"Name three core concepts in {skills[0] if skills else topic}?", "Medium", "Understand", "Multiple Choice", None, ["a) Wrong answer", "b) Wrong answer", "c) Wrong answer", "d) Correct answer"], "d")
-                        ]
-                    }
+        1. **Search specific sites**: Try adding "site:coursera.org" or "site:freecodecamp.org" to your Google searches
+        2. **Check GitHub**: Look for repositories with "awesome-" prefix, like "awesome-python"
+        3. **Use platforms like**: Coursera, edX, Udemy, Pluralsight, LinkedIn Learning, or O'Reilly
+        4. **Find documentation**: Official documentation is often the best resource
         
-        # Safely display quiz
+        #### Recommended Learning Platforms:
+        | Platform | Best For | Cost |
+        | --- | --- | --- |
+        | [Codecademy](https://www.codecademy.com/) | Interactive coding practice | Freemium |
+        | [FreeCodeCamp](https://www.freecodecamp.org/) | Full stack development | Free |
+        | [Khan Academy](https://www.khanacademy.org/) | Computer science fundamentals | Free |
+        | [HackerRank](https://www.hackerrank.com/) | Coding challenges | Free |
+        | [LeetCode](https://leetcode.com/) | Interview prep | Freemium |
+        | [Coursera](https://www.coursera.org/) | University-level courses | Freemium |
+        | [edX](https://www.edx.org/) | Academic courses | Freemium |
+        
+        #### Pro Tip: 
+        Create a learning plan that combines different resource types: video courses for introduction, interactive platforms for practice, documentation for reference, and projects for application.
+        """)
+        
+        # Add a checklist for tracking resource use
+        st.markdown("#### Resource Tracking:")
+        st.checkbox("I've bookmarked all useful resources")
+        st.checkbox("I've created a learning schedule")
+        st.checkbox("I've joined relevant online communities")
+
+def _render_exercises(skills, topic):
+    # Safely display exercises
+    if st.session_state.exercises:
         try:
-            if isinstance(st.session_state.quiz_output, dict) and "quiz" in st.session_state.quiz_output:
-                st.text_area("Quiz", st.session_state.quiz_output["quiz"], height=600)
+            # Check if exercises is a dictionary
+            if isinstance(st.session_state.exercises, dict):
+                st.markdown("\n\n".join(f"### {skill}\n{ex_text}" for skill, ex_text in st.session_state.exercises.items()))
             else:
-                st.error("Quiz data is not in the expected format.")
-                st.text_area("Quiz", str(st.session_state.quiz_output), height=600)
+                st.markdown(str(st.session_state.exercises))
         except:
-            st.error("Error displaying quiz content.")
-
-        with st.form(key="quiz_form"):
-            responses = {
-                q[0]: st.radio(f"{q[0]} (Bloom's {q[2]})", q[5], key=f"quiz_radio_{i}", index=None)
-                for i, q in enumerate(st.session_state.quiz_output["questions"])
-            }
-            if st.form_submit_button("Grade Me", use_container_width=True):
-                with st.spinner("Analyzing your skills..."):
-                    analysis = quiz_analyzer_agent(skills or [topic], responses, st.session_state.quiz_output["questions"])
-                    st.session_state.analysis = analysis
-
-        if "analysis" in st.session_state:
-            analysis = st.session_state.analysis
-            st.markdown(f"<h2 style='color: #00ebeb; animation: fadeIn 1s;'>Score: {analysis['total_score']:.1f}%</h2>", unsafe_allow_html=True)
-            st.progress(analysis["total_score"] / 100)
-
-            if analysis["feedback"]:
-                st.write("**Your Mistakes—Learn from ‘Em**:")
-                for q_text, fb in analysis["feedback"].items():
-                    st.markdown(
-                        f"**{q_text}**<br>"
-                        f"- You picked: '{next(q['user_answer'] for q in analysis['graded_questions'] if q['question'] == q_text)}'<br>"
-                        f"- Why wrong: {fb.get('why_wrong', 'No explanation available')}<br>"
-                        f"- Correct: '{next(q['correct_answer'] for q in analysis['graded_questions'] if q['question'] == q_text)}'<br>"
-                        f"- Why correct: {fb.get('why_correct', 'No explanation available')}",
-                        unsafe_allow_html=True
-                    )
-
-            st.write(f"**{skills[0]} Subskill Breakdown**:")
-            for subskill, score in analysis["proficiency"].items():
-                st.write(f"- {subskill}: {score:.1f}%")
-
-            if analysis["struggle_points"]:
-                st.write("**Struggle Points**:")
-                for subskill, score in analysis["struggle_points"].items():
-                    st.markdown(f"- {subskill}: {score:.1f}%", unsafe_allow_html=True)
-
-            if analysis["gaps"]:
-                st.write("**Knowledge Gaps**:")
-                st.write(", ".join(analysis["gaps"]))
-                col1, col2 = st.columns(2)
-                with col1:
-                    if st.button("Regen All Gaps", use_container_width=True):
-                        st.session_state.skills = analysis["gaps"]
-                        st.session_state.regen_quiz = True
-                        st.session_state.regen_exercises = True
-                        st.session_state.analysis = None
-                        st.session_state.knowledge_base = None
-                        st.session_state.learning_path = None
-                        st.session_state.resources = None
-                        st.session_state.exercises = None
-                        st.rerun()
-                with col2:
-                    struggle_subskills = list(analysis["struggle_points"].keys())
-                    selected = st.selectbox("Focus on one:", struggle_subskills)
-                    if st.button("Regen This Subskill", use_container_width=True):
-                        st.session_state.skills = [selected]
-                        st.session_state.regen_quiz = True
-                        st.session_state.regen_exercises = True
-                        st.session_state.analysis = None
-                        st.session_state.knowledge_base = None
-                        st.session_state.learning_path = None
-                        st.session_state.resources = None
-                        st.session_state.exercises = None
-                        st.rerun()
-            # Generate Modules for Gaps
-            if analysis["gaps"] and "modules" not in st.session_state:
-                with st.spinner("Generating modules for skill gaps..."):
-                    # Get user ID safely
-                    user_id = None
-                    if hasattr(st.session_state.user, 'id'):
-                        user_id = st.session_state.user.id
-                    elif isinstance(st.session_state.user, dict):
-                        user_id = st.session_state.user.get('id')
-                    
-                    if user_id:
-                        modules = [{"user_id": user_id, "skill": gap, "content": module_generator_agent(gap)} for gap in analysis["gaps"]]
-                        if save_modules(modules):
-                            st.session_state.modules = modules
-                            st.success("Modules saved successfully!")
-                        else:
-                            st.error("Failed to save modules.")
+            st.error("Error displaying exercises.")
+            st.text(str(st.session_state.exercises)[:1000] + "...")
+    else:
+        st.write("No exercises generated yet—try again!")
+
+def _render_assessment(skills, topic):
+    # Safely display quiz
+    try:
+        if isinstance(st.session_state.quiz_output, dict) and "quiz" in st.session_state.quiz_output:
+            st.text_area("Quiz", st.session_state.quiz_output["quiz"], height=600)
+        else:
+            st.error("Quiz data is not in the expected format.")
+            st.text_area("Quiz", str(st.session_state.quiz_output), height=600)
+    except:
+        st.error("Error displaying quiz content.")
+
+    with st.form(key="quiz_form"):
+        responses = {
+            q[0]: st.radio(f"{q[0]} (Bloom's {q[2]})", q[5], key=f"quiz_radio_{i}", index=None)
+            for i, q in enumerate(st.session_state.quiz_output["questions"])
+        }
+        if st.form_submit_button("Grade Me", use_container_width=True):
+            st.session_state.deadline = Deadline()
+            with st.spinner("Analyzing your skills..."), deadline_scope(st.session_state.deadline):
+                questions = st.session_state.quiz_output["questions"]
+                analysis = grade_quiz(responses, questions, _quiz_map(skills or [topic]))
+                st.session_state.analysis = analysis
+                # Stored explanations show at once; the rest are written in the background
+                # and each mistake shows its own when it lands
+                st.session_state.feedback_futures = {}
+                for q in analysis["graded_questions"]:
+                    if q["is_correct"]:
+                        continue
+                    stored = lookup_explanation(q)
+                    if stored is not None:
+                        analysis["feedback"][q["question"]] = stored
+                    else:
+                        st.session_state.feedback_futures[q["question"]] = submit(explain_mistake_async((skills or [topic])[0], q, check_store=False))
+
+    if st.session_state.get("analysis"):
+        analysis = st.session_state.analysis
+        st.markdown(f"<h2 style='color: #00ebeb; animation: fadeIn 1s;'>Score: {analysis['total_score']:.1f}%</h2>", unsafe_allow_html=True)
+        st.progress(analysis["total_score"] / 100)
+
+        mistakes = [q for q in analysis["graded_questions"] if not q["is_correct"]]
+        explaining = {}
+        if mistakes:
+            st.write("**Your Mistakes—Learn from ‘Em**:")
+            for q in mistakes:
+                with st.expander(q["question"]):
+                    st.markdown(f"- You picked: '{q['user_answer']}'<br>- Correct: '{q['correct_answer']}'", unsafe_allow_html=True)
+                    slot = st.empty()
+                if q["question"] in analysis["feedback"]:
+                    _render_feedback(slot, analysis["feedback"][q["question"]])
+                else:
+                    slot.caption("⏳ Working out why...")
+                    explaining[q["question"]] = slot
+
+        st.write(f"**{(skills or [topic])[0]} Subskill Breakdown**:")
+        for subskill, score in analysis["proficiency"].items():
+            st.write(f"- {subskill}: {score:.1f}%")
+
+        if analysis["struggle_points"]:
+            st.write("**Struggle Points**:")
+            for subskill, score in analysis["struggle_points"].items():
+                st.markdown(f"- {subskill}: {score:.1f}%", unsafe_allow_html=True)
+
+        if analysis["gaps"]:
+            st.write("**Knowledge Gaps**:")
+            st.write(", ".join(analysis["gaps"]))
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button("Regen All Gaps", use_container_width=True):
+                    st.session_state.skills = analysis["gaps"]
+                    st.session_state.regen_quiz = True
+                    st.session_state.regen_exercises = True
+                    st.session_state.analysis = None
+                    st.session_state.knowledge_base = None
+                    st.session_state.learning_path = None
+                    st.session_state.resources = None
+                    st.session_state.exercises = None
+                    st.session_state.refresh_generation = True
+                    st.session_state.deadline = None
+                    st.rerun()
+            with col2:
+                struggle_subskills = list(analysis["struggle_points"].keys())
+                selected = st.selectbox("Focus on one:", struggle_subskills)
+                if st.button("Regen This Subskill", use_container_width=True):
+                    st.session_state.skills = [selected]
+                    st.session_state.regen_quiz = True
+                    st.session_state.regen_exercises = True
+                    st.session_state.analysis = None
+                    st.session_state.knowledge_base = None
+                    st.session_state.learning_path = None
+                    st.session_state.resources = None
+                    st.session_state.exercises = None
+                    st.session_state.refresh_generation = True
+                    st.session_state.deadline = None
+                    st.rerun()
+        _collect_feedback(analysis, explaining, (skills or [topic])[0])
+
+        # Generate Modules for Gaps
+        if analysis["gaps"] and "modules" not in st.session_state:
+            with st.spinner("Generating modules for skill gaps..."), deadline_scope(_page_deadline()):
+                # Get user ID safely
+                user_id = None
+                if hasattr(st.session_state.user, 'id'):
+                    user_id = st.session_state.user.id
+                elif isinstance(st.session_state.user, dict):
+                    user_id = st.session_state.user.get('id')
+                
+                # Generate all gap modules concurrently, showing each as it is written
+                previews = {}
+                slots = {gap: st.empty() for gap in analysis["gaps"]}
+                contents = _stream_into(slots, previews, submit(
+                    generate_modules_async(analysis["gaps"], on_progress=previews.__setitem__)
+                ))
+                for slot in slots.values():
+                    slot.empty()
+                if user_id:
+                    modules = [{"user_id": user_id, "skill": gap, "content": content} for gap, content in zip(analysis["gaps"], contents)]
+                    if save_modules(modules):
+                        st.session_state.modules = modules
+                        st.success("Modules saved successfully!")
                     else:
-                        st.warning("User ID not found. Modules will not be saved.")
-                        st.session_state.modules = [{"skill": gap, "content": module_generator_agent(gap)} for gap in analysis["gaps"]]
-            if "modules" in st.session_state:
-                st.write("### Learning Modules for Gaps")
-                for module in st.session_state.modules:
-                    st.markdown(f"#### {module['skill']}\n{module['content']}")
\ No newline at end of file
+                        st.error("Failed to save modules.")
+                else:
+                    st.warning("User ID not found. Modules will not be saved.")
+                    st.session_state.modules = [{"skill": gap, "content": content} for gap, content in zip(analysis["gaps"], contents)]
+        if "modules" in st.session_state:
+            st.write("### Learning Modules for Gaps")
+            for module in st.session_state.modules:
+                st.markdown(f"#### {module['skill']}\n{module['content']}")
+
+def _render_feedback(slot, feedback):
+    slot.markdown(
+        f"- Why wrong: {feedback.get('why_wrong', 'No explanation available')}<br>"
+        f"- Why correct: {feedback.get('why_correct', 'No explanation available')}",
+        unsafe_allow_html=True
+    )
+
+def _collect_feedback(analysis, slots, main_skill, interval=0.25):
+    """Fill each mistake's slot as its explanation arrives, keeping it in ``analysis`` for later reruns."""
+    futures = st.session_state.setdefault("feedback_futures", {})
+    for question in slots:
+        if question not in futures:
+            graded = next(q for q in analysis["graded_questions"] if q["question"] == question)
+            futures[question] = submit(explain_mistake_async(main_skill, graded))
+    waiting = {question: futures[question] for question in slots}
+    while waiting:
+        concurrent.futures.wait(list(waiting.values()), timeout=interval, return_when=concurrent.futures.FIRST_COMPLETED)
+        for question, future in [(q, f) for q, f in waiting.items() if f.done()]:
+            del waiting[question]
+            futures.pop(question, None)
+            graded = next(q for q in analysis["graded_questions"] if q["question"] == question)
+            try:
+                feedback = future.result()
+            except Exception as e:
+                print(f"Error explaining a mistake: {e}")
+                feedback = fallback_feedback(graded)
+            analysis["feedback"][question] = feedback
+            _render_feedback(slots[question], feedback)
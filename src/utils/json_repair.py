@@ -0,0 +1,191 @@
+"""Error-tolerant JSON parsing for LLM output.
+
+Gemini's JSON often arrives wrapped in code fences or prose, cut off at
+``maxOutputTokens``, with trailing commas, bare or single-quoted keys, or
+a missing brace. :func:`loads` handles all of these in one left-to-right
+scan that builds the Python value directly, so it never re-reads the
+text. Well-formed input takes the C decoder's fast path first.
+"""
+import json
+import re
+
+_FENCE = "```"
+_WHITESPACE = re.compile(r"\s*")
+_STRING_RUN = {'"': re.compile(r'[^"\\]*'), "'": re.compile(r"[^'\\]*")}
+_BARE_KEY = re.compile(r"[^:\s,{}\[\]\"']*")
+_BARE_VALUE = re.compile(r"[^,\]}\n]*")
+_NUMBER = re.compile(r"-?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?")
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "'": "'", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_LITERALS = {"true": True, "false": False, "null": None, "True": True, "False": False, "None": None}
+_CLOSER = {"{": "}", "[": "]"}
+_MAX_DEPTH = 500
+_MISSING = object()
+
+_decoder = json.JSONDecoder(strict=False)
+
+
+class JSONRepairError(ValueError):
+    """Raised when the text contains no JSON object or array at all."""
+
+
+def loads(text):
+    """
+    Parse the first JSON object or array in ``text``, repairing it as needed:
+    code fences and surrounding prose are skipped, truncated strings and
+    containers are closed, trailing or missing commas are tolerated, bare and
+    single-quoted keys/strings are accepted, and stray closers are ignored.
+    Raises JSONRepairError if no object or array is found.
+    """
+    if not isinstance(text, str):
+        raise JSONRepairError(f"Expected text, got {type(text).__name__}")
+    start = _find_start(text)
+    try:
+        return _decoder.raw_decode(text, start)[0]
+    except ValueError:
+        return _Parser(text, start).parse()
+
+
+def _find_start(text):
+    # Prefer the inside of a code fence; fall back to the first container anywhere
+    fence = text.find(_FENCE)
+    begin = text.find("\n", fence) + 1 if fence != -1 else 0
+    for offset in (begin, 0):
+        positions = [p for p in (text.find("{", offset), text.find("[", offset)) if p != -1]
+        if positions:
+            return min(positions)
+    raise JSONRepairError("No JSON object or array found")
+
+
+class _Parser:
+    def __init__(self, text, start):
+        self.text = text
+        self.n = len(text)
+        self.i = start
+        # How many containers of each kind are open, to tell a stray closer from one that ends a parent
+        self.open = {"{": 0, "[": 0}
+
+    def parse(self):
+        return self._value(0)
+
+    def _skip(self, chars=""):
+        while True:
+            self.i = _WHITESPACE.match(self.text, self.i).end()
+            if self.i < self.n and self.text[self.i] in chars:
+                self.i += 1
+                continue
+            return
+
+    def _value(self, depth, parent=None):
+        self._skip()
+        if self.i >= self.n:
+            return _MISSING
+        char = self.text[self.i]
+        if char in "{[":
+            if depth >= _MAX_DEPTH:
+                raise JSONRepairError("JSON nested too deeply")
+            return self._container(char, depth + 1, parent)
+        if char in "\"'":
+            return self._string(char)
+        return self._bare()
+
+    def _container(self, opener, depth, parent):
+        closer = _CLOSER[opener]
+        is_object = opener == "{"
+        result = {} if is_object else []
+        self.i += 1
+        self.open[opener] += 1
+        try:
+            while True:
+                self._skip(",")
+                if self.i >= self.n:
+                    return result  # truncated: close it
+                char = self.text[self.i]
+                if char == closer:
+                    self.i += 1
+                    return result
+                if char in "}]":
+                    if self.open["{" if char == "}" else "["]:
+                        return result  # missing closer: let the parent consume this one
+                    self.i += 1  # stray closer nobody opened
+                    continue
+                if not is_object:
+                    value = self._value(depth, opener)
+                    if value is _MISSING:
+                        self.i += 1
+                    else:
+                        result.append(value)
+                    continue
+                if char == "{" and parent == "[":
+                    return result  # '{"a": 1, {"b": 2}' inside a list: the first object lost its '}'
+                if char in "{[":
+                    self._value(depth, opener)  # a value without a key; parse past it and drop it
+                    continue
+                key = self._key()
+                if key is _MISSING:
+                    continue
+                self._skip()
+                if self.i < self.n and self.text[self.i] in ":=":
+                    self.i += 1
+                value = self._value(depth, opener)
+                if value is not _MISSING:
+                    result[key] = value
+        finally:
+            self.open[opener] -= 1
+
+    def _key(self):
+        char = self.text[self.i]
+        if char in "\"'":
+            return self._string(char)
+        match = _BARE_KEY.match(self.text, self.i)
+        if not match.group():
+            self.i += 1  # e.g. a ':' with no key before it
+            return _MISSING
+        self.i = match.end()
+        return match.group()
+
+    def _string(self, quote):
+        text, n = self.text, self.n
+        run = _STRING_RUN[quote]
+        parts = []
+        surrogates = False
+        self.i += 1
+        while True:
+            match = run.match(text, self.i)
+            parts.append(match.group())
+            self.i = match.end()
+            if self.i >= n:
+                break  # truncated string
+            if text[self.i] == "\\":
+                escape = text[self.i + 1:self.i + 2]
+                if escape == "u" and re.fullmatch(r"[0-9a-fA-F]{4}", text[self.i + 2:self.i + 6] or ""):
+                    code = int(text[self.i + 2:self.i + 6], 16)
+                    surrogates = surrogates or 0xD800 <= code <= 0xDFFF
+                    parts.append(chr(code))
+                    self.i += 6
+                else:
+                    parts.append(_ESCAPES.get(escape, escape))
+                    self.i += 2
+                continue
+            # A quote ends the string only where a string could end; otherwise it is an unescaped inner quote
+            after = _WHITESPACE.match(text, self.i + 1).end()
+            if after >= n or text[after] in ",:}]" or "\n" in text[self.i + 1:after]:
+                self.i += 1
+                break
+            parts.append(quote)
+            self.i += 1
+        value = "".join(parts)
+        if surrogates:
+            value = value.encode("utf-16", "surrogatepass").decode("utf-16", "replace")
+        return value
+
+    def _bare(self):
+        match = _BARE_VALUE.match(self.text, self.i)
+        token = match.group().strip()
+        if not token:
+            return _MISSING
+        self.i = match.end()
+        if token in _LITERALS:
+            return _LITERALS[token]
+        if _NUMBER.fullmatch(token):
+            return float(token) if any(c in token for c in ".eE") else int(token)
+        return token
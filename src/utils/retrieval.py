@@ -0,0 +1,131 @@
+"""Picking the relevant parts of a long markdown document for a prompt.
+
+The knowledge base for several skills can run to tens of thousands of
+characters. :class:`ChunkIndex` splits it into heading-scoped chunks and
+scores them against queries (skill names, concepts from
+``extract_concepts``) in the same character n-gram TF-IDF space as
+src/utils/similarity.py. :func:`select_context` then fills a fixed token
+budget one chunk per query in turn, so every query gets covered and the
+prompt stays the same size however large the document grows.
+"""
+import re
+import numpy as np
+from src.utils.similarity import tfidf_matrix
+
+# Same rough ratio as src/llm/ratelimit.estimate_tokens
+CHARS_PER_TOKEN = 4
+CHUNK_CHARS = 800
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+
+
+def _pieces(text, max_chars):
+    """Split ``text`` at paragraph breaks, then sentence or word breaks, into parts of at most ``max_chars``."""
+    pieces, current = [], ""
+    for paragraph in re.split(r"\n\s*\n", text.strip()):
+        while len(paragraph) > max_chars:
+            cut = max(paragraph.rfind(". ", 0, max_chars), paragraph.rfind("\n", 0, max_chars))
+            if cut <= 0:
+                cut = paragraph.rfind(" ", 0, max_chars)
+            cut = cut + 1 if cut > 0 else max_chars
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(paragraph[:cut].strip())
+            paragraph = paragraph[cut:].strip()
+        if current and len(current) + 2 + len(paragraph) > max_chars:
+            pieces.append(current)
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current.strip():
+        pieces.append(current)
+    return [p for p in pieces if p.strip()]
+
+
+def chunk_markdown(text, max_chars=CHUNK_CHARS):
+    """
+    Split markdown into (heading trail, text) chunks of at most ``max_chars``.
+    The trail ("Python Knowledge Base > Loops") keeps each chunk's place in the
+    document, so a chunk read on its own still says what it is about.
+    """
+    chunks, trail, body = [], {}, []
+
+    def flush():
+        heading = " > ".join(title for _, title in sorted(trail.items()))
+        chunks.extend((heading, piece) for piece in _pieces("\n".join(body), max_chars))
+        body.clear()
+
+    for line in text.splitlines():
+        match = _HEADING.match(line)
+        if match:
+            flush()
+            level = len(match.group(1))
+            trail = {lvl: title for lvl, title in trail.items() if lvl < level}
+            trail[level] = match.group(2)
+            continue
+        body.append(line)
+    flush()
+    return chunks
+
+
+class ChunkIndex:
+    """TF-IDF index over the chunks of one document; rebuild it when the document changes."""
+
+    def __init__(self, text, max_chars=CHUNK_CHARS):
+        self.chunks = chunk_markdown(text, max_chars)
+        if self.chunks:
+            self.matrix, self.vocabulary, self.idf = tfidf_matrix([f"{heading}\n{body}" for heading, body in self.chunks])
+
+    def scores(self, queries):
+        """Cosine similarity of every query against every chunk (len(queries) x len(chunks))."""
+        if not queries or not self.chunks:
+            return np.zeros((len(queries), len(self.chunks)))
+        query_matrix, _, _ = tfidf_matrix(list(queries), self.vocabulary, self.idf)
+        return query_matrix @ self.matrix.T
+
+    def select(self, queries, budget_chars):
+        """
+        Indexes of the chunks to send: each query in turn takes its best chunk
+        not yet taken, until the next pick would overflow ``budget_chars``.
+        Returned in document order.
+        """
+        scores = self.scores(queries)
+        if scores.size == 0:
+            return []
+        rankings = [list(np.argsort(-row, kind="stable")) for row in scores]
+        chosen, used = set(), 0
+        while any(rankings):
+            for ranking in rankings:
+                while ranking and ranking[0] in chosen:
+                    ranking.pop(0)
+                if not ranking:
+                    continue
+                index = ranking.pop(0)
+                size = len(self.chunks[index][1]) + len(self.chunks[index][0])
+                if used + size > budget_chars:
+                    return sorted(chosen)
+                chosen.add(index)
+                used += size
+        return sorted(chosen)
+
+    def render(self, indexes):
+        """Markdown for the given chunks, with a heading line wherever the heading changes."""
+        lines, last = [], None
+        for index in indexes:
+            heading, body = self.chunks[index]
+            if heading and heading != last:
+                lines += [f"## {heading}", ""]
+            lines += [body, ""]
+            last = heading
+        return "\n".join(lines).strip()
+
+    def context(self, queries, budget_tokens):
+        """The chunks most relevant to ``queries`` that fit in ``budget_tokens``, as markdown."""
+        return self.render(self.select([q for q in queries if q and q.strip()], budget_tokens * CHARS_PER_TOKEN))
+
+
+def select_context(text, queries, budget_tokens):
+    """``text`` if it fits in ``budget_tokens``, else its chunks most relevant to ``queries`` that do."""
+    if len(text) <= budget_tokens * CHARS_PER_TOKEN:
+        return text
+    return ChunkIndex(text).context(queries, budget_tokens)
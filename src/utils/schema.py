@@ -0,0 +1,75 @@
+"""Local validation of LLM output against Gemini response schemas.
+
+Schemas use the OpenAPI subset Gemini accepts as ``responseSchema``
+(type, properties, required, items, enum, minItems, maxItems, nullable), so
+the same dict constrains generation and checks the result. A schema is
+compiled once into nested checks; validating a value then only walks the
+value, not the schema.
+"""
+
+_TYPES = {
+    "STRING": (str,),
+    "INTEGER": (int,),
+    "NUMBER": (int, float),
+    "BOOLEAN": (bool,),
+    "ARRAY": (list,),
+    "OBJECT": (dict,),
+}
+
+
+class Validator:
+    def __init__(self, schema):
+        self.schema = schema
+        self.type = schema.get("type", "OBJECT").upper()
+        self.python_types = _TYPES[self.type]
+        self.nullable = schema.get("nullable", False)
+        self.enum = set(schema["enum"]) if "enum" in schema else None
+        self.properties = {name: Validator(sub) for name, sub in schema.get("properties", {}).items()}
+        self.required = list(schema.get("required", []))
+        self.items = Validator(schema["items"]) if "items" in schema else None
+        self.min_items = schema.get("minItems")
+        self.max_items = schema.get("maxItems")
+
+    def errors(self, value, path="$"):
+        """Return a list of "path: problem" strings; empty when ``value`` is valid."""
+        if value is None:
+            return [] if self.nullable else [f"{path}: missing"]
+        # bool is an int subclass; keep true/false out of numeric fields
+        if not isinstance(value, self.python_types) or (isinstance(value, bool) and self.type != "BOOLEAN"):
+            return [f"{path}: expected {self.type.lower()}, got {type(value).__name__}"]
+        if self.enum is not None and value not in self.enum:
+            return [f"{path}: {value!r} is not one of {sorted(self.enum)}"]
+        problems = []
+        if self.type == "OBJECT":
+            for name in self.required:
+                if name not in value:
+                    problems.append(f"{path}.{name}: missing")
+            for name, validator in self.properties.items():
+                if name in value:
+                    problems.extend(validator.errors(value[name], f"{path}.{name}"))
+        elif self.type == "ARRAY":
+            if self.min_items is not None and len(value) < int(self.min_items):
+                problems.append(f"{path}: needs at least {self.min_items} items, got {len(value)}")
+            if self.max_items is not None and len(value) > int(self.max_items):
+                problems.append(f"{path}: allows at most {self.max_items} items, got {len(value)}")
+            if self.items is not None:
+                for index, item in enumerate(value):
+                    problems.extend(self.items.errors(item, f"{path}[{index}]"))
+        return problems
+
+    def is_valid(self, value):
+        return not self.errors(value)
+
+    def partition(self, values):
+        """
+        Split a list into (valid, invalid) items using the array's item schema,
+        so callers can keep what is usable and ask again only for the rest.
+        """
+        valid, invalid = [], []
+        for value in values if isinstance(values, list) else []:
+            (invalid if self.items.errors(value) else valid).append(value)
+        return valid, invalid
+
+
+def compile_schema(schema):
+    return Validator(schema)
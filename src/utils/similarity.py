@@ -0,0 +1,75 @@
+"""Local text similarity on character n-gram TF-IDF vectors.
+
+Used where an LLM round trip is overkill, e.g. matching quiz questions to a
+handful of subskill names. Everything is computed as NumPy matrices so one
+call scores every query against every candidate at once.
+"""
+import re
+import numpy as np
+
+_WORD = re.compile(r"\w+")
+
+
+def char_ngrams(text, n_min=3, n_max=5):
+    """Character n-grams taken inside word boundaries, like sklearn's 'char_wb'."""
+    grams = []
+    for word in _WORD.findall(text.lower()):
+        padded = f" {word} "
+        for n in range(n_min, n_max + 1):
+            if len(padded) < n:
+                continue
+            grams.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return grams
+
+
+def tfidf_matrix(docs, vocabulary=None, idf=None):
+    """
+    Return (matrix, vocabulary, idf) for ``docs``. Rows are L2-normalised
+    sublinear-tf * idf vectors. Pass a fitted ``vocabulary``/``idf`` to
+    project new documents into an existing space.
+    """
+    doc_grams = [char_ngrams(doc) for doc in docs]
+    if vocabulary is None:
+        vocabulary = {}
+        for grams in doc_grams:
+            for gram in grams:
+                vocabulary.setdefault(gram, len(vocabulary))
+    counts = np.zeros((len(docs), len(vocabulary)), dtype=np.float64)
+    for row, grams in enumerate(doc_grams):
+        cols = [vocabulary[g] for g in grams if g in vocabulary]
+        if cols:
+            np.add.at(counts[row], cols, 1.0)
+    if idf is None:
+        df = np.count_nonzero(counts, axis=0)
+        idf = np.log((1.0 + len(docs)) / (1.0 + df)) + 1.0
+    matrix = np.log1p(counts) * idf
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms, vocabulary, idf
+
+
+def similarity_matrix(queries, candidates):
+    """Cosine similarity of every query against every candidate (len(queries) x len(candidates))."""
+    if not queries or not candidates:
+        return np.zeros((len(queries), len(candidates)))
+    # Fit idf on both sides so words shared by every question ("what", the skill name) weigh little
+    matrix, _, _ = tfidf_matrix(list(queries) + list(candidates))
+    return matrix[:len(queries)] @ matrix[len(queries):].T
+
+
+def best_matches(queries, candidates, threshold=0.0, margin=0.0):
+    """
+    For each query return (best candidate index, score, confident) where
+    ``confident`` means the score clears ``threshold`` and beats the runner-up
+    by at least ``margin``.
+    """
+    scores = similarity_matrix(queries, candidates)
+    if scores.size == 0:
+        return []
+    rows = np.arange(scores.shape[0])
+    order = np.argsort(-scores, axis=1)
+    best = order[:, 0]
+    best_scores = scores[rows, best]
+    runner_up = scores[rows, order[:, 1]] if scores.shape[1] > 1 else np.zeros(len(rows))
+    confident = (best_scores >= threshold) & (best_scores - runner_up >= margin)
+    return [(int(b), float(sc), bool(c)) for b, sc, c in zip(best, best_scores, confident)]
@@ -0,0 +1,52 @@
+"""Show or refresh the stored subskill taxonomy of skills.
+
+Run from the repository root:
+
+    python taxonomy.py Python SQL               # latest stored version, generated if there is none
+    python taxonomy.py Python --version 1       # an older version
+    python taxonomy.py Python --refresh         # ask Gemini again and store a new version
+
+Quiz gradings read a skill's subskills from the 'subskill_taxonomy' table
+(src/agents/taxonomy.py), so they only change when a refresh stores a new
+version here. Gradings record the version they used.
+"""
+import argparse
+import logging
+import sys
+from src.agents.analyzer import subskill_taxonomy_async
+from src.agents.taxonomy import stored_taxonomy_async
+from src.llm import run_sync
+
+logger = logging.getLogger("taxonomy")
+
+
+def format_row(row):
+    return f"{row['skill']} v{row['version']}: " + ", ".join(row["subskills"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show or refresh the subskill taxonomy of skills.")
+    parser.add_argument("skills", nargs="+", help="skills to show or refresh")
+    parser.add_argument("--version", type=int, help="show this stored version instead of the latest")
+    parser.add_argument("--refresh", action="store_true", help="generate and store a new version")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if args.version is not None and args.refresh:
+        parser.error("--version and --refresh cannot be combined")
+
+    failed = 0
+    for skill in args.skills:
+        if args.version is not None:
+            row = run_sync(stored_taxonomy_async(skill, args.version))
+        else:
+            row = run_sync(subskill_taxonomy_async(skill, refresh=args.refresh))
+        if row is None:
+            logger.error(f"No taxonomy for {skill}" + (f" at version {args.version}" if args.version is not None else ""))
+            failed += 1
+            continue
+        print(format_row(row))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
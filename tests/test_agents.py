@@ -3,4 +3,313 @@ from src.agents.professor import professor_agent
 
 def test_professor_agent():
     result = professor_agent("Test Topic")
-    assert "# Test Topic Knowledge Base" in result
\ No newline at end of file
+    assert "# Test Topic Knowledge Base" in result
+
+def test_professor_sections_keep_input_order_and_isolate_failures(monkeypatch):
+    import asyncio
+    from src.agents import professor
+
+    async def fake_section(skill):
+        await asyncio.sleep(0.05 if skill == "Python" else 0.01)
+        if skill == "SQL":
+            raise RuntimeError("boom")
+        return f"# {skill} notes"
+
+    monkeypatch.setattr(professor, "generate_knowledge_base_async", fake_section)
+    sections = professor.professor_sections(["Python", "SQL", "Git"], concurrency=2)
+    assert list(sections) == ["Python", "SQL", "Git"]
+    assert sections["Python"] == "# Python notes"
+    assert sections["SQL"] == professor.fallback_knowledge_base("SQL")
+    assert professor.professor_agent(["Python", "Git"]) == "# Python notes\n\n# Git notes"
+
+
+def test_batch_mapper_falls_back_only_for_unresolved_questions(monkeypatch):
+    import json
+    from src.agents import analyzer, explanations, taxonomy
+    from src.db import supabase_client
+    from src.llm import LLMResponse
+
+    # No shared explanation file or taxonomy left behind for later tests
+    monkeypatch.setattr(explanations, "get_explanation_store", lambda: None)
+    monkeypatch.setattr(taxonomy, "_index", {})
+    monkeypatch.setattr(supabase_client, "memory_taxonomy", [])
+    prompts = []
+
+    async def fake_generate(model, prompt, config=None, agent=None, refresh=False):
+        prompts.append(agent)
+        if agent == "subskills":
+            return LLMResponse(json.dumps(["Loops", "Classes"]))
+        if agent == "mapper":
+            return LLMResponse(json.dumps({"mappings": [
+                {"index": 0, "subskill": "loops"},
+                {"index": 1, "subskill": "Something else"},
+            ]}))
+        return LLMResponse("```json\n" + json.dumps({"feedback": {}}) + "\n```")
+
+    async def fake_single(question_text, subskills):
+        return "Classes"
+
+    monkeypatch.setattr(analyzer, "agenerate", fake_generate)
+    monkeypatch.setattr(analyzer, "map_question_to_subskill_async", fake_single)
+    questions = [
+        (f"Q{i}", "Easy", "Remember", "True/False", None, ["True", "False"], "True") for i in range(3)
+    ]
+    result = analyzer.quiz_analyzer_agent(["Python"], {"Q0": "True", "Q1": "False"}, questions)
+    assert [q["subskill"] for q in result["graded_questions"]] == ["Loops", "Classes", "Classes"]
+    assert prompts.count("mapper") == 1
+
+
+def test_quiz_shards_merge_dedupe_and_replace_only_failed_shards(monkeypatch):
+    import json
+    from src.agents import quiz
+    from src.llm import LLMResponse, run_sync
+
+    def question(text, difficulty="Easy", options=4):
+        return {"question": text, "difficulty": difficulty, "bloom_level": "Remember", "type": "Multiple Choice",
+                "options": [f"{c}) option" for c in "abcd"[:options]], "answer": "d"}
+
+    replies = {
+        "on these concepts: A; D": [question("What is A?"), question("Why use D?", "Hard"), question("Bad?", options=3)],
+        # Reworded repeat of a question from the first shard
+        "on these concepts: B": [question("What is A ?"), question("How does B work?", "Medium")],
+        "on these concepts: C": "not json at all",
+    }
+    prompts = []
+
+    async def fake_generate(model, prompt, config=None, agent=None, refresh=False):
+        prompts.append(prompt)
+        if "already written" in prompt:
+            return LLMResponse(json.dumps([question("When is C used?", "Medium"), question("Is C fast?", "Hard")]))
+        reply = next(r for marker, r in replies.items() if marker in prompt)
+        return LLMResponse(reply if isinstance(reply, str) else json.dumps(reply))
+
+    monkeypatch.setattr(quiz, "agenerate", fake_generate)
+    monkeypatch.setattr(quiz, "QUIZ_SHARDS", 3)
+    questions = run_sync(quiz.generate_questions_async(["Python"], "## A\n## B\n## C\n## D"))
+    assert [q["question"] for q in questions] == ["What is A?", "Why use D?", "How does B work?", "When is C used?", "Is C fast?"]
+    # Three shards, then one replacement for the shard that failed
+    assert len(prompts) == 4
+    assert "on these concepts: C" in prompts[3] and '"How does B work?"' in prompts[3]
+
+
+def test_quiz_balance_spreads_difficulty_and_bloom_levels():
+    from src.agents.quiz import balance_questions
+
+    questions = [{"question": f"Q{i}", "difficulty": d, "bloom_level": b} for i, (d, b) in enumerate(
+        [("Easy", "Remember")] * 4 + [("Easy", "Apply"), ("Medium", "Remember"), ("Hard", "Analyze"), ("Hard", "Remember")]
+    )]
+    picked = balance_questions(questions, 4)
+    assert [q["question"] for q in picked] == ["Q0", "Q4", "Q5", "Q6"]
+
+
+def test_librarian_requests_only_missing_skills(monkeypatch):
+    import json
+    from src.agents import librarian
+    from src.llm import LLMResponse
+
+    requested = []
+
+    async def fake_generate(model, prompt, config=None, agent=None, refresh=False):
+        requested.append(sorted(config["response_schema"]["properties"]))
+        if len(requested) == 1:
+            return LLMResponse(json.dumps({
+                "python": [{"title": "Docs", "url": "https://docs.python.org"}, {"title": "No url"}],
+                "SQL": ["not a resource"],
+            }))
+        return LLMResponse(json.dumps({"SQL": [{"title": "SQLBolt", "url": "https://sqlbolt.com", "cost": "Free"}]}))
+
+    monkeypatch.setattr(librarian, "agenerate", fake_generate)
+    resources = librarian.librarian_agent(["Python", "SQL"])
+    assert requested == [["Python", "SQL"], ["SQL"]]
+    assert [r["title"] for r in resources["Python"]] == ["Docs"]
+    assert resources["Python"][0]["level"] == "Beginner"
+    assert resources["SQL"][0]["cost"] == "Free"
+
+
+def test_advisor_replaces_only_broken_sections(monkeypatch):
+    import json
+    from src.agents import advisor
+    from src.llm import LLMResponse
+
+    async def fake_generate(model, prompt, config=None, agent=None, refresh=False):
+        return LLMResponse(json.dumps({"introduction": "Real intro", "practice_exercises": "not a list"}))
+
+    monkeypatch.setattr(advisor, "agenerate", fake_generate)
+    path = advisor.advisor_agent(["Rust"])
+    fallback = advisor.fallback_learning_path(["Rust"])
+    assert path["introduction"] == "Real intro"
+    assert path["practice_exercises"] == fallback["practice_exercises"]
+    assert path["milestones"] == fallback["milestones"]
+
+
+def test_agents_recover_from_truncated_and_malformed_replies_of_mock_server(monkeypatch):
+    from benchmarks.mock_gemini import MockGemini
+    from src.agents.advisor import advisor_agent, fallback_learning_path
+    from src.agents.librarian import librarian_agent, fallback_resources
+    from src.llm import breaker as breaker_module
+    from src.llm import client
+
+    monkeypatch.setattr(client, "get_cache", lambda: None)
+    monkeypatch.setattr(breaker_module, "_breakers", {})
+    with MockGemini(truncate_rate=1.0) as truncating:
+        monkeypatch.setattr(client, "GEMINI_API_BASE", truncating.base_url)
+        learning_path = advisor_agent(["Python"])
+    assert truncating.stats["truncated"] == 1 and truncating.stats["continued"] == 1
+    assert learning_path != fallback_learning_path(["Python"])
+    assert len(learning_path["learning_path"]) == 6
+
+    with MockGemini(malformed_rate=1.0) as malforming:
+        monkeypatch.setattr(client, "GEMINI_API_BASE", malforming.base_url)
+        resources = librarian_agent(["Python", "SQL"])
+    assert malforming.stats["malformed"] == 1
+    assert resources["SQL"] != fallback_resources("SQL")
+    assert all(r["url"].startswith("https://example.com/") for r in resources["Python"])
+
+
+def test_grading_is_local_and_feedback_covers_only_mistakes_with_compact_prompts(monkeypatch):
+    import json
+    from src.agents import analyzer, explanations
+    from src.llm import LLMResponse, run_sync
+
+    questions = [
+        ("What is a list?", "Easy", "Remember", "Multiple Choice", None, ["a) x", "b) y", "c) z", "d) list"], "d) list"),
+        ("Are tuples mutable?", "Easy", "Understand", "True/False", None, ["True", "False"], "False"),
+        ("What does len do?", "Medium", "Apply", "Multiple Choice", None, ["a) x", "b) y", "c) z", "d) size"], "d) size"),
+    ]
+    quiz_map = {"subskills": ["Lists", "Tuples"], "question_subskills": ["Lists", "Tuples", "Lists"]}
+    analysis = analyzer.grade_quiz({"What is a list?": "d) list", "Are tuples mutable?": "True"}, questions, quiz_map)
+    assert round(analysis["total_score"]) == 33 and analysis["feedback"] == {}
+    assert analysis["proficiency"] == {"Lists": 50.0, "Tuples": 0.0}
+    assert analysis["gaps"] == ["Lists", "Tuples"]
+
+    prompts = []
+    monkeypatch.setattr(explanations, "_store", explanations.ExplanationStore(path=None))
+
+    async def fake_generate(model, prompt, config=None, agent=None, refresh=False):
+        prompts.append(prompt)
+        if "len do" in prompt:
+            return LLMResponse("not json")
+        return LLMResponse(json.dumps({"why_wrong": "Tuples cannot change.", "why_correct": "They are immutable."}))
+
+    monkeypatch.setattr(analyzer, "agenerate", fake_generate)
+    feedback = run_sync(analyzer.explain_mistakes_async("Python", analysis["graded_questions"]))
+    assert set(feedback) == {"Are tuples mutable?", "What does len do?"}
+    assert feedback["Are tuples mutable?"]["why_wrong"] == "Tuples cannot change."
+    assert feedback["What does len do?"] == analyzer.fallback_feedback(analysis["graded_questions"][2])
+    assert all("What is a list?" not in p and '"is_correct"' not in p and "\n  " not in p for p in prompts)
+
+
+def test_explanation_store_answers_repeat_mistakes_without_gemini(monkeypatch, tmp_path):
+    import json
+    from src.agents import analyzer, explanations
+    from src.llm import LLMResponse, bypass_cache, explanation_hit_rate, run_sync
+
+    calls = []
+
+    async def fake_generate(model, prompt, config=None, agent=None, refresh=False):
+        calls.append(prompt)
+        if "len do" in prompt:
+            return LLMResponse("not json")
+        return LLMResponse(json.dumps({"why_wrong": f"Wrong {len(calls)}", "why_correct": "Right."}))
+
+    monkeypatch.setattr(analyzer, "agenerate", fake_generate)
+    path = str(tmp_path / "explanations.sqlite3")
+    monkeypatch.setattr(explanations, "_store", explanations.ExplanationStore(path))
+    # SQLite work is handed to worker threads, off the shared loop
+    offloaded = []
+    to_thread = explanations.asyncio.to_thread
+
+    async def recording_to_thread(func, *args):
+        offloaded.append(func.__name__)
+        return await to_thread(func, *args)
+
+    monkeypatch.setattr(explanations.asyncio, "to_thread", recording_to_thread)
+    tuples = {"question": "Are tuples mutable?", "options": ["True", "False"], "user_answer": "True",
+              "correct_answer": "False", "subskill": "Tuples", "is_correct": False}
+    length = dict(tuples, question="What does len do?", subskill="Builtins")
+    first = run_sync(analyzer.explain_mistakes_async("Python", [tuples, length]))
+    assert first["Are tuples mutable?"]["why_wrong"] == "Wrong 1" and len(calls) == 3
+    assert sorted(offloaded) == ["get", "get", "set"]
+
+    # A new process on the same file; the subskill and skill are not part of the key
+    monkeypatch.setattr(explanations, "_store", explanations.ExplanationStore(path))
+    again = run_sync(analyzer.explain_mistakes_async("Python 3", [dict(tuples, subskill="Data types"), length]))
+    assert again["Are tuples mutable?"] == first["Are tuples mutable?"]
+    # The fallback was never stored, so only the failed one went back to Gemini
+    assert len(calls) == 5 and explanation_hit_rate() > 0
+    assert run_sync(analyzer.explain_mistake_async("Python", dict(tuples, user_answer="False")))["why_wrong"] == "Wrong 6"
+    with bypass_cache():
+        assert run_sync(analyzer.explain_mistake_async("Python", tuples))["why_wrong"] == "Wrong 7"
+
+
+def test_subskill_taxonomy_is_stored_once_versioned_on_refresh_and_shared_with_advisor(monkeypatch):
+    import json
+    from src.agents import advisor, analyzer, taxonomy
+    from src.db import supabase_client
+    from src.llm import LLMResponse
+
+    generated = []
+
+    async def fake_generate(model, prompt, config=None, agent=None, refresh=False):
+        if agent == "subskills":
+            generated.append(prompt)
+            return LLMResponse(json.dumps(["Ownership", "Borrowing"] if len(generated) == 1 else ["Traits", "Lifetimes"]))
+        if agent == "advisor":
+            return LLMResponse(json.dumps({"introduction": "Real intro", "skill_components": ["Something else"]}))
+        return LLMResponse(json.dumps({"mappings": []}))
+
+    monkeypatch.setattr(analyzer, "agenerate", fake_generate)
+    monkeypatch.setattr(advisor, "agenerate", fake_generate)
+    monkeypatch.setattr(taxonomy, "_index", {})
+    monkeypatch.setattr(supabase_client, "memory_taxonomy", [])
+    questions = [("How does borrowing work?", "Easy", "Remember", "True/False", None, ["True", "False"], "True")]
+    assert advisor.advisor_agent(["Rust"])["skill_components"] == ["Something else"]
+
+    first = analyzer.map_quiz(["Rust"], questions)
+    assert first["subskills"] == ["Ownership", "Borrowing"] and first["taxonomy_version"] == 1
+    assert analyzer.map_quiz([" rust "], questions)["subskills"] == first["subskills"]
+    assert analyzer.grade_quiz({}, questions, first)["taxonomy_version"] == 1
+    assert len(generated) == 1
+    assert advisor.advisor_agent(["Rust"])["skill_components"] == ["Ownership", "Borrowing"]
+
+    assert analyzer.subskill_taxonomy("Rust", refresh=True)["version"] == 2
+    monkeypatch.setattr(taxonomy, "_index", {})  # a new process reads the table
+    assert analyzer.map_quiz(["Rust"], questions)["subskills"] == ["Traits", "Lifetimes"]
+    assert analyzer.subskill_taxonomy("Rust")["version"] == 2 and len(generated) == 2
+    assert analyzer.run_sync(taxonomy.stored_taxonomy_async("Rust", version=1))["subskills"] == ["Ownership", "Borrowing"]
+
+    # Another process refreshes; this one sees it once its index entry expires
+    other = {"skill_key": "rust", "skill": "Rust", "version": 3, "subskills": ["Macros"]}
+    assert supabase_client.save_taxonomy(other) and not supabase_client.save_taxonomy(dict(other, subskills=["Unsafe"]))
+    assert analyzer.map_quiz(["Rust"], questions)["taxonomy_version"] == 2
+    monkeypatch.setattr(taxonomy, "TAXONOMY_INDEX_TTL_SECONDS", 0)
+    assert analyzer.map_quiz(["Rust"], questions)["taxonomy_version"] == 3
+
+    # A refresh that loses the race for version 4 serves the winner's row
+    def racing_save(row):
+        supabase_client.save_taxonomy(dict(row, subskills=["Async"]))
+        return supabase_client.save_taxonomy(row)
+
+    monkeypatch.setattr(taxonomy, "save_taxonomy", racing_save)
+    assert analyzer.subskill_taxonomy("Rust", refresh=True)["subskills"] == ["Async"]
+
+
+def test_quiz_skips_replacement_shards_once_the_deadline_is_spent(monkeypatch):
+    import json
+    from src.agents import quiz
+    from src.llm import DeadlineExceeded, LLMResponse, run_sync
+
+    prompts = []
+
+    async def fake_generate(model, prompt, config=None, agent=None, refresh=False):
+        prompts.append(prompt)
+        if "on these concepts: A" in prompt:
+            return LLMResponse(json.dumps([{"question": "What is A?", "difficulty": "Easy", "bloom_level": "Remember",
+                                            "type": "True/False", "options": ["True", "False"], "answer": "True"}]))
+        raise DeadlineExceeded("Page deadline exceeded")
+
+    monkeypatch.setattr(quiz, "agenerate", fake_generate)
+    monkeypatch.setattr(quiz, "QUIZ_SHARDS", 2)
+    questions = run_sync(quiz.generate_questions_async(["Python"], "## A\n## B\n## C"))
+    assert len(prompts) == 2
+    assert questions[0]["question"] == "What is A?" and len(questions) == quiz.QUIZ_MIN_QUESTIONS
@@ -0,0 +1,71 @@
+import json
+import curriculum
+from src.llm import record_fallback, run_sync
+
+
+def test_read_skills_csv_and_json(tmp_path):
+    csv_path = tmp_path / "skills.csv"
+    csv_path.write_text("team,skill\nData,Python\nData,SQL\nWeb,Python\n")
+    assert curriculum.read_skills(str(csv_path)) == ["Python", "SQL"]
+    json_path = tmp_path / "skills.json"
+    json_path.write_text(json.dumps(["Go", {"skill": "Rust"}, " "]))
+    assert curriculum.read_skills(str(json_path)) == ["Go", "Rust"]
+
+
+def test_build_curriculum_batches_inserts_and_resumes(tmp_path, monkeypatch):
+    batches = []
+
+    async def fake_build(skill):
+        if skill == "Broken":
+            raise RuntimeError("boom")
+        if skill == "Offline":
+            record_fallback("module")
+        return f"# {skill}"
+
+    def fake_save(modules, fallback=True):
+        assert fallback is False
+        batches.append([m["skill"] for m in modules])
+        return True
+
+    monkeypatch.setattr(curriculum, "build_module", fake_build)
+    monkeypatch.setattr(curriculum, "save_modules", fake_save)
+    checkpoint = str(tmp_path / "run.jsonl")
+    skills = ["A", "B", "Broken", "Offline", "C"]
+    report = run_sync(curriculum.build_curriculum(skills, "user-1", checkpoint, concurrency=2, batch_size=2))
+    assert sorted(sum(batches, [])) == ["A", "B", "C", "Offline"]
+    assert [len(b) for b in batches] == [2, 2]
+    assert (report["generated"], report["saved"], report["failed"]) == (4, 4, 1)
+    assert report["fallbacks"]["module"] == 1
+    assert "1 failed" in curriculum.format_report(report)
+
+    # Only the skill that failed is attempted again
+    batches.clear()
+    report = run_sync(curriculum.build_curriculum(skills, "user-1", checkpoint, batch_size=2))
+    assert report["skipped"] == 4 and report["failed"] == 1 and batches == []
+
+
+def test_build_curriculum_counts_agent_fallbacks_against_mock_server(monkeypatch):
+    from benchmarks.mock_gemini import MockGemini
+    from src.agents import taxonomy
+    from src.db import supabase_client
+    from src.llm import breaker as breaker_module
+    from src.llm import client
+
+    monkeypatch.setattr(client, "get_cache", lambda: None)
+    monkeypatch.setattr(breaker_module, "_breakers", {})
+    monkeypatch.setattr(curriculum, "save_modules", lambda modules, fallback=True: True)
+    # A stored taxonomy makes the advisor add skill components, even to its fallback
+    monkeypatch.setattr(taxonomy, "_index", {})
+    monkeypatch.setattr(supabase_client, "memory_taxonomy", [
+        {"skill_key": "rust", "skill": "Rust", "version": 1, "subskills": ["Ownership", "Traits"], "created_at": 0},
+    ])
+    with MockGemini() as mock:
+        monkeypatch.setattr(client, "GEMINI_API_BASE", mock.base_url)
+        report = run_sync(curriculum.build_curriculum(["Go"], "user-1"))
+    assert report["generated"] == 1 and not report["fallbacks"]
+
+    with MockGemini(error_rate=1.0, error_status=400) as failing:
+        monkeypatch.setattr(client, "GEMINI_API_BASE", failing.base_url)
+        report = run_sync(curriculum.build_curriculum(["Rust"], "user-1"))
+    assert report["generated"] == 1
+    assert report["fallbacks"] == {"professor": 1, "advisor": 1, "librarian": 1, "module": 1}
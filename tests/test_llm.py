@@ -0,0 +1,488 @@
+import asyncio
+import json
+import threading
+import time
+import httpx
+import pytest
+from src.llm import client
+from src.llm import agenerate, generate, stream_generate, bypass_cache, run_sync, gather_bounded, coalesced, singleflight_stats, LLMError, CircuitOpenError, DeadlineExceeded, Deadline, deadline_scope
+from src.agents import professor
+from src.llm.cache import ResponseCache
+from src.llm import ratelimit
+from src.llm import breaker as breaker_module
+from src.llm.breaker import CircuitBreaker
+from src.llm.ratelimit import RateLimiter, RetryBudget, TokenBucket
+
+
+class FakeSession:
+    """Serves canned httpx responses in order and records each request."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def handle(self, request):
+        self.calls.append(request)
+        return self.responses.pop(0)
+
+
+def fake_response(status_code=200, body=None, text=""):
+    if body is not None:
+        return httpx.Response(status_code, json=body)
+    return httpx.Response(status_code, text=text)
+
+
+def gemini_body(text, finish_reason="STOP"):
+    return {
+        "candidates": [{"content": {"parts": [{"text": text}]}, "finishReason": finish_reason}],
+        "usageMetadata": {"promptTokenCount": 3, "candidatesTokenCount": 5},
+    }
+
+
+@pytest.fixture(autouse=True)
+def memory_cache(monkeypatch):
+    cache = ResponseCache(path=None)
+    monkeypatch.setattr(client, "get_cache", lambda: cache)
+    return cache
+
+
+@pytest.fixture(autouse=True)
+def fresh_limits(monkeypatch):
+    # Fresh buckets per test, and retries that only wait as long as the server asks
+    delays = []
+
+    def backoff(attempt, hint=None):
+        delays.append(hint)
+        return hint or 0
+
+    monkeypatch.setattr(client, "get_limiter", lambda limiter=RateLimiter(): limiter)
+    monkeypatch.setattr(client, "get_retry_budget", lambda budget=RetryBudget(): budget)
+    monkeypatch.setattr(client, "backoff_delay", backoff)
+    monkeypatch.setattr(breaker_module, "_breakers", {})
+    return delays
+
+
+@pytest.fixture
+def fake_session(monkeypatch):
+    def install(*responses):
+        session = FakeSession(responses)
+        http_client = httpx.AsyncClient(transport=httpx.MockTransport(session.handle))
+        monkeypatch.setattr(client, "get_http_client", lambda: http_client)
+        return session
+    return install
+
+
+def test_generate_returns_text_and_metadata(fake_session, monkeypatch):
+    monkeypatch.setattr(client, "LLM_MAX_CONTINUATIONS", 0)
+    session = fake_session(fake_response(body=gemini_body("hello", "MAX_TOKENS")))
+    result = generate("gemini-1.5-pro", "Say hi", {"temperature": 0.1}, agent="module")
+    assert result.text == "hello"
+    assert result.finish_reason == "MAX_TOKENS"
+    assert result.usage["candidatesTokenCount"] == 5
+    request = session.calls[0]
+    assert request.url.path.endswith("/models/gemini-1.5-pro:generateContent")
+    assert json.loads(request.content)["generationConfig"] == {"temperature": 0.1}
+    assert request.extensions["timeout"]["read"] == 10
+
+
+def test_generate_raises_on_http_error(fake_session):
+    session = fake_session(*[fake_response(status_code=503, text="overloaded")] * 3)
+    with pytest.raises(LLMError) as excinfo:
+        generate("gemini-1.5-pro", "prompt")
+    assert excinfo.value.status_code == 503
+    assert len(session.calls) == 3
+
+
+def test_generate_retries_429_after_server_hint(fake_session, fresh_limits):
+    throttled = httpx.Response(429, headers={"Retry-After": "0.05"}, json={"error": {"code": 429}})
+    session = fake_session(throttled, fake_response(body=gemini_body("ok")))
+    assert generate("gemini-1.5-pro", "prompt").text == "ok"
+    assert len(session.calls) == 2
+    assert fresh_limits == [0.05]
+
+
+def test_generate_does_not_retry_client_errors(fake_session):
+    session = fake_session(fake_response(status_code=400, text="bad request"))
+    with pytest.raises(LLMError):
+        generate("gemini-1.5-pro", "prompt")
+    assert len(session.calls) == 1
+
+
+def test_retry_budget_stops_retry_storms(fake_session, monkeypatch):
+    monkeypatch.setattr(client, "get_retry_budget", lambda budget=RetryBudget(ratio=0, reserve=1): budget)
+    session = fake_session(*[fake_response(status_code=503, text="overloaded")] * 4)
+    for prompt in ("first", "second"):
+        with pytest.raises(LLMError):
+            generate("gemini-1.5-pro", prompt)
+    # One retry for the first request, none left for the second
+    assert len(session.calls) == 3
+
+
+def test_gemini_retry_info_is_read_from_body():
+    response = httpx.Response(429, json={"error": {"details": [
+        {"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "17s"}
+    ]}})
+    assert ratelimit.retry_after(response) == 17.0
+
+
+def test_token_bucket_waits_for_refill():
+    now = [0.0]
+    bucket = TokenBucket(60, clock=lambda: now[0])
+    bucket.take(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    now[0] = 0.5
+    assert bucket.wait_time(1) == pytest.approx(0.5)
+    now[0] = 1.0
+    assert bucket.wait_time(1) == 0.0
+
+
+def test_generate_raises_without_candidates(fake_session):
+    fake_session(fake_response(body={"promptFeedback": {"blockReason": "SAFETY"}}))
+    with pytest.raises(LLMError):
+        generate("gemini-1.5-pro", "prompt")
+
+
+def test_generate_serves_repeat_calls_from_cache(fake_session, memory_cache):
+    session = fake_session(fake_response(body=gemini_body("cached")), fake_response(body=gemini_body("fresh")))
+    assert generate("gemini-1.5-pro", "prompt", {"temperature": 0.2}).text == "cached"
+    assert generate("gemini-1.5-pro", "prompt", {"temperature": 0.2}).text == "cached"
+    assert len(session.calls) == 1
+    with bypass_cache():
+        assert generate("gemini-1.5-pro", "prompt", {"temperature": 0.2}).text == "fresh"
+    assert generate("gemini-1.5-pro", "prompt", {"temperature": 0.2}).text == "fresh"
+    assert memory_cache.stats()["memory_hits"] == 2
+
+
+def test_split_skills_caches_only_a_valid_skill_list(fake_session, memory_cache):
+    from src.agents.resume import split_skills
+
+    session = fake_session(
+        fake_response(body=gemini_body('{"skills": ["Python", "SQL"]}')),
+        fake_response(body=gemini_body('["Python", "SQL"]')),
+        fake_response(body=gemini_body('["unused"]')),
+    )
+    assert split_skills("Python and SQL") == ["Python and SQL"]
+    assert memory_cache.stats()["writes"] == 0
+    assert split_skills("Python and SQL") == ["Python", "SQL"]
+    assert split_skills("Python and SQL") == ["Python", "SQL"]
+    assert len(session.calls) == 2 and memory_cache.stats()["writes"] == 1
+
+
+def test_cache_key_includes_generation_config(fake_session):
+    session = fake_session(fake_response(body=gemini_body("a")), fake_response(body=gemini_body("b")))
+    assert generate("gemini-1.5-pro", "prompt", {"temperature": 0.1}).text == "a"
+    assert generate("gemini-1.5-pro", "prompt", {"temperature": 0.9}).text == "b"
+    assert len(session.calls) == 2
+
+
+def test_cache_lru_evicts_by_size():
+    cache = ResponseCache(path=None, max_bytes=100)
+    cache.set("a", "x" * 40)
+    cache.set("b", "y" * 40)
+    cache.get("a")
+    cache.set("c", "z" * 40)
+    assert cache.get("b") is None
+    assert cache.get("a") == "x" * 40
+    assert cache.stats()["evictions"] == 1
+
+
+async def _current_thread():
+    return threading.current_thread()
+
+
+def test_cache_disk_tier_and_ttl(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ResponseCache(path=path, ttls={"default": 60, "quiz": 0})
+    cache.set("k", {"v": 1}, agent="professor")
+    cache.set("q", {"v": 2}, agent="quiz")
+    cache.clear_memory()
+    assert cache.get("k") == {"v": 1}
+    assert cache.get("q") is None
+    assert cache.stats()["disk_hits"] == 1
+
+    # Coroutines reach the SQLite file from a worker thread, never the shared loop's
+    loop_thread = run_sync(_current_thread())
+    db_threads = []
+
+    class RecordingDB:
+        def __init__(self, db):
+            self.db = db
+
+        def execute(self, *args):
+            db_threads.append(threading.current_thread())
+            return self.db.execute(*args)
+
+        def commit(self):
+            self.db.commit()
+
+    cache._db = RecordingDB(cache._db)
+    run_sync(cache.aset("a", {"v": 3}))
+    cache.clear_memory()
+    assert run_sync(cache.aget("a")) == {"v": 3}
+    assert len(db_threads) == 2 and loop_thread not in db_threads
+
+    reopened = ResponseCache(path=path, ttls={"default": 60})
+    assert reopened.get("k") == {"v": 1}
+    monkeypatch.setattr("src.llm.cache.time.time", lambda: 10 ** 12)
+    assert reopened.get("k") is None
+
+
+def test_gather_bounded_limits_concurrency_and_keeps_order():
+    running = 0
+    peak = 0
+
+    async def job(i):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01 * (5 - i))
+        running -= 1
+        return i
+
+    results = run_sync(gather_bounded([job(i) for i in range(5)], 2))
+    assert results == [0, 1, 2, 3, 4]
+    assert peak == 2
+
+
+def test_run_sync_carries_context_into_loop(fake_session, memory_cache):
+    session = fake_session(fake_response(body=gemini_body("one")), fake_response(body=gemini_body("two")))
+    generate("gemini-1.5-pro", "prompt")
+    with bypass_cache():
+        result = run_sync(agenerate("gemini-1.5-pro", "prompt"))
+    assert result.text == "two"
+    assert len(session.calls) == 2
+
+
+def test_stream_generate_yields_chunks_and_fills_cache(fake_session):
+    events = [gemini_body("Hello, "), gemini_body("world", finish_reason="STOP")]
+    sse = "".join(f"data: {json.dumps(event)}\r\n\r\n" for event in events)
+    session = fake_session(fake_response(text=sse))
+    assert list(stream_generate("gemini-1.5-pro", "prompt")) == ["Hello, ", "world"]
+    assert session.calls[0].url.params["alt"] == "sse"
+    result = generate("gemini-1.5-pro", "prompt")
+    assert result.text == "Hello, world"
+    assert result.finish_reason == "STOP"
+    assert len(session.calls) == 1
+
+
+def test_identical_inflight_requests_share_one_call(fake_session):
+    session = fake_session(fake_response(body=gemini_body("shared")))
+    before = singleflight_stats().get("generate", {}).get("coalesced", 0)
+
+    async def burst():
+        return await asyncio.gather(*(agenerate("gemini-1.5-pro", "popular topic") for _ in range(3)))
+
+    results = run_sync(burst())
+    assert [r.text for r in results] == ["shared"] * 3
+    assert results[0] is not results[1]
+    assert len(session.calls) == 1
+    assert singleflight_stats()["generate"]["coalesced"] == before + 2
+
+
+def test_coalesced_agent_normalizes_skills():
+    runs = []
+
+    @coalesced("test-agent")
+    async def agent(skills):
+        runs.append(skills)
+        await asyncio.sleep(0.01)
+        return {"skills": skills}
+
+    async def burst():
+        return await asyncio.gather(agent(["Python", "SQL"]), agent(["sql ", "python"]), agent(["Rust"]))
+
+    first, second, third = run_sync(burst())
+    assert len(runs) == 2
+    assert first == second and first is not second
+    assert third == {"skills": ["Rust"]}
+    assert singleflight_stats()["test-agent"] == {"calls": 3, "coalesced": 1}
+
+
+def test_circuit_breaker_states():
+    now = [0.0]
+    breaker = CircuitBreaker("m:generateContent", failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+    now[0] = 10
+    assert breaker.allow()
+    assert breaker.state == "half_open" and not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    now[0] = 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_open_circuit_fails_fast_without_calling_gemini(fake_session):
+    breaker_module._breakers["gemini-1.5-pro:generateContent"] = CircuitBreaker("pro", failure_threshold=2)
+    session = fake_session(*[fake_response(status_code=503, text="down")] * 3)
+    with pytest.raises(LLMError) as excinfo:
+        generate("gemini-1.5-pro", "first")
+    assert excinfo.value.status_code == 503
+    with pytest.raises(CircuitOpenError):
+        generate("gemini-1.5-pro", "second")
+    assert len(session.calls) == 2
+
+
+def test_deadline_shrinks_attempt_timeout():
+    with deadline_scope(Deadline(3)):
+        timeout = client.get_timeout("professor")
+    assert timeout.read <= 3
+    assert client.get_timeout("professor").read == 45
+
+
+def test_deadline_cuts_slow_request_short(monkeypatch):
+    async def slow(request):
+        await asyncio.sleep(5)
+        return fake_response(body=gemini_body("late"))
+
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(slow))
+    monkeypatch.setattr(client, "get_http_client", lambda: http_client)
+    with deadline_scope(Deadline(0.2)):
+        with pytest.raises(DeadlineExceeded):
+            generate("gemini-1.5-pro", "prompt")
+        # Agents turn the expired deadline into their fallback straight away
+        assert professor.generate_knowledge_base("Python") == professor.fallback_knowledge_base("Python")
+
+
+def test_coalesced_callers_each_keep_their_own_deadline(monkeypatch):
+    calls = []
+
+    async def slow(request):
+        calls.append(request)
+        await asyncio.sleep(0.5)
+        return fake_response(body=gemini_body("shared"))
+
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(slow))
+    monkeypatch.setattr(client, "get_http_client", lambda: http_client)
+
+    async def caller(seconds):
+        with deadline_scope(Deadline(seconds)):
+            return await agenerate("gemini-1.5-pro", "shared prompt")
+
+    async def burst():
+        return await asyncio.gather(caller(0.2), caller(30), return_exceptions=True)
+
+    short, long = run_sync(burst())
+    assert isinstance(short, DeadlineExceeded)
+    assert long.text == "shared" and len(calls) == 1
+
+    # At the agent level the impatient caller gets the fallback, the other the real result
+    @coalesced("test-deadline-agent", fallback=lambda skills: "fallback")
+    async def agent(skills):
+        return (await agenerate("gemini-1.5-pro", "agent prompt")).text
+
+    async def agent_caller(seconds):
+        with deadline_scope(Deadline(seconds)):
+            return await agent(["Python"])
+
+    async def agent_burst():
+        return await asyncio.gather(agent_caller(0.2), agent_caller(30))
+
+    assert run_sync(agent_burst()) == ["fallback", "shared"]
+    assert len(calls) == 2
+
+
+def test_no_retry_that_would_outlive_deadline(fake_session, monkeypatch):
+    monkeypatch.setattr(client, "backoff_delay", lambda attempt, hint=None: 10)
+    session = fake_session(*[fake_response(status_code=503, text="overloaded")] * 3)
+    with deadline_scope(Deadline(5)):
+        with pytest.raises(LLMError) as excinfo:
+            generate("gemini-1.5-pro", "prompt")
+    assert excinfo.value.status_code == 503
+    assert len(session.calls) == 1
+
+
+def test_truncated_response_is_continued_and_stitched(fake_session):
+    from src.utils.json_repair import loads
+
+    head = '{"introduction": "Learn Rust", "levels": ["Beginner", "Interm'
+    session = fake_session(
+        fake_response(body=gemini_body(head, "MAX_TOKENS")),
+        # The model repeats a little of the tail and wraps the rest in a fence
+        fake_response(body=gemini_body('```json\n"Learn Rust", "levels": ["Beginner", "Intermediate"]}')),
+    )
+    config = {"response_mime_type": "application/json", "response_schema": {"type": "OBJECT"}, "maxOutputTokens": 50}
+    result = generate("gemini-1.5-pro", "Plan Rust", config, agent="advisor")
+    assert loads(result.text) == {"introduction": "Learn Rust", "levels": ["Beginner", "Intermediate"]}
+    assert result.finish_reason == "STOP"
+    assert result.usage["candidatesTokenCount"] == 10
+    follow_up = json.loads(session.calls[1].content)
+    assert [turn["role"] for turn in follow_up["contents"]] == ["user", "model", "user"]
+    assert follow_up["contents"][1]["parts"][0]["text"] == head
+    assert "response_schema" not in follow_up["generationConfig"]
+    # The stitched reply is what gets cached
+    assert generate("gemini-1.5-pro", "Plan Rust", config, agent="advisor").text == result.text
+    assert len(session.calls) == 2
+
+
+def test_failed_continuation_keeps_partial_text(fake_session):
+    session = fake_session(
+        fake_response(body=gemini_body("partial", "MAX_TOKENS")),
+        fake_response(400, text="bad request"),
+    )
+    result = generate("gemini-1.5-pro", "Long answer")
+    assert result.text == "partial"
+    assert result.finish_reason == "MAX_TOKENS"
+    assert len(session.calls) == 2
+
+
+def test_reply_left_truncated_by_a_deadline_is_not_cached(monkeypatch, memory_cache):
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        if len(calls) == 2:
+            await asyncio.sleep(1)  # the continuation outlives the deadline
+        if len(calls) == 3:
+            return fake_response(body=gemini_body("complete answer"))
+        return fake_response(body=gemini_body("partial", "MAX_TOKENS" if len(calls) == 1 else "STOP"))
+
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(client, "get_http_client", lambda: http_client)
+    with deadline_scope(Deadline(0.3)):
+        try:
+            assert generate("gemini-1.5-pro", "Long answer", agent="professor").text == "partial"
+        except DeadlineExceeded:
+            pass  # the caller's own wait may run out first
+    time.sleep(0.3)  # the shared request gives up on the continuation at the same deadline
+    assert memory_cache.stats()["writes"] == 0
+    assert generate("gemini-1.5-pro", "Long answer", agent="professor").text == "complete answer"
+    assert len(calls) == 3
+
+
+def test_metrics_record_latency_tokens_cache_and_fallbacks(fake_session):
+    import urllib.request
+    from src.llm import metrics
+
+    fake_session(fake_response(503), fake_response(body=gemini_body("hi")))
+    generate("gemini-1.5-pro", "metered", agent="metrics_test")
+    generate("gemini-1.5-pro", "metered", agent="metrics_test")
+    metrics.record_fallback("metrics_test")
+
+    row = next(r for r in metrics.agent_summary() if r["agent"] == "metrics_test")
+    assert (row["calls"], row["cache hit %"], row["avg attempts"]) == (2, 50.0, 2.0)
+    assert (row["prompt tokens"], row["output tokens"], row["fallbacks"]) == (3, 5, 1)
+    assert row["cost $"] == round((3 * 1.25 + 5 * 5.00) / 1_000_000, 4)
+
+    text = metrics.render_prometheus()
+    assert 'llm_request_seconds_count{agent="metrics_test",model="gemini-1.5-pro",cache="hit",outcome="ok"} 1' in text
+    assert 'llm_request_attempts_bucket{agent="metrics_test",model="gemini-1.5-pro",le="2"} 1' in text
+    assert 'agent_fallbacks_total{agent="metrics_test"} 1' in text
+
+    server = metrics.start_metrics_server(0, host="127.0.0.1")
+    with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as response:
+        assert b"# TYPE llm_request_seconds histogram" in response.read()
+
+
+def test_histogram_quantile_interpolates_within_bucket():
+    from src.llm.metrics import Histogram
+
+    histogram = Histogram("h", "test", ("agent",), (1, 2, 4))
+    for value in (0.5, 1.5, 1.5, 3):
+        histogram.observe(("a",), value)
+    assert histogram.quantile(0.5) == 1.5
+    assert histogram.quantile(1.0) == 4
@@ -0,0 +1,71 @@
+import time
+import prewarm
+from src.llm import run_sync
+from src.llm.cache import is_bypassed
+
+
+def test_read_skills_file(tmp_path):
+    path = tmp_path / "skills.txt"
+    path.write_text("# popular topics\nPython\nPython, SQL  # data track\n\n")
+    assert prewarm.read_skills_file(path) == [["Python"], ["Python", "SQL"]]
+
+
+def test_warm_skill_sets_skips_fresh_sets(monkeypatch):
+    warmed = []
+
+    async def fake_warm(skills):
+        warmed.append((skills, is_bypassed()))
+
+    monkeypatch.setattr(prewarm, "warm_artifacts", fake_warm)
+    state = {"Python": time.time() - 3600, "Go": time.time() - 13 * 3600}
+    done = run_sync(prewarm.warm_skill_sets([["Python"], ["Go"], ["Python", "SQL"]], state, refresh_hours=12))
+    assert done == [["Go"], ["Python", "SQL"]]
+    # warm_artifacts picks what to regenerate; the knowledge base it is keyed on comes from the cache
+    assert sorted(warmed) == [(["Go"], False), (["Python", "SQL"], False)]
+    assert state["Python, SQL"] > state["Python"]
+
+
+def test_warmed_quiz_is_served_to_the_app_after_a_rewarm(monkeypatch, tmp_path):
+    import types
+    from benchmarks.mock_gemini import MockGemini
+    from src.agents.professor import professor_sections_async, join_sections
+    from src.agents.quiz import quiz_generator_agent_async
+    from src.llm import breaker as breaker_module
+    from src.llm import cache as cache_module
+    from src.llm import client
+    from src.llm.cache import ResponseCache
+
+    # One SQLite file shared by the prewarm runs and a long-lived app process
+    clock = [1_000_000.0]
+    monkeypatch.setattr(cache_module, "time", types.SimpleNamespace(time=lambda: clock[0]))
+    monkeypatch.setattr(breaker_module, "_breakers", {})
+    path = str(tmp_path / "llm.sqlite3")
+    app = ResponseCache(path=path)
+
+    async def app_quiz(skills):
+        knowledge_base = join_sections(await professor_sections_async(skills))
+        return await quiz_generator_agent_async(skills, knowledge_base or "No knowledge base available.")
+
+    def warm_in(cache):
+        monkeypatch.setattr(client, "get_cache", lambda: cache)
+        run_sync(prewarm.warm_artifacts(["Python"]))
+
+    with MockGemini() as mock:
+        monkeypatch.setattr(client, "GEMINI_API_BASE", mock.base_url)
+        warm_in(ResponseCache(path=path))
+        warmed = mock.stats["ok"]
+        monkeypatch.setattr(client, "get_cache", lambda: app)
+        quiz = run_sync(app_quiz(["Python"]))
+        assert mock.stats["ok"] == warmed
+
+        # A re-warm before the quiz TTL runs out, then the app once the first quiz has expired;
+        # the app still holds the first knowledge base in memory
+        clock[0] += 13 * 3600
+        warm_in(ResponseCache(path=path))
+        rewarmed = mock.stats["ok"]
+        assert rewarmed > warmed
+        clock[0] += 12 * 3600
+        monkeypatch.setattr(client, "get_cache", lambda: app)
+        requiz = run_sync(app_quiz(["Python"]))
+        assert mock.stats["ok"] == rewarmed
+    assert requiz != quiz
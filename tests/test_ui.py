@@ -3,4 +3,22 @@ from src.ui.login import render_login_view
 
 def test_login_view():
     # Requires Streamlit testing framework or mocking
-    pass
\ No newline at end of file
+    pass
+
+def test_simulated_sessions_reach_grading_against_mock_server(monkeypatch):
+    from benchmarks.load import run_load
+    from benchmarks.mock_gemini import MockGemini
+    from src.agents import explanations
+    from src.llm import breaker as breaker_module
+    from src.llm import client
+
+    monkeypatch.setattr(client, "get_cache", lambda: None)
+    monkeypatch.setattr(explanations, "get_explanation_store", lambda: None)
+    monkeypatch.setattr(breaker_module, "_breakers", {})
+    with MockGemini() as mock:
+        monkeypatch.setattr(client, "GEMINI_API_BASE", mock.base_url)
+        report = run_load(sessions=2, concurrency=2, topics=["Python, SQL"], timeout=60)
+    assert report["errors"] == []
+    assert report["completed"] == 2
+    assert all(row["count"] == 2 for row in report["steps"].values())
+    assert report["peak_threads"] > 1 and report["peak_rss_bytes"] > 0
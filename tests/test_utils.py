@@ -0,0 +1,105 @@
+import json
+import os
+import random
+import pytest
+from src.utils.similarity import best_matches, similarity_matrix
+from src.utils.json_repair import loads, JSONRepairError
+from src.utils.retrieval import chunk_markdown, select_context
+
+CORPUS = os.path.join(os.path.dirname(__file__), "data", "malformed_json.jsonl")
+with open(CORPUS, encoding="utf-8") as f:
+    MALFORMED = [json.loads(line) for line in f if line.strip()]
+
+
+def test_similarity_matrix_scores_all_pairs():
+    scores = similarity_matrix(["How do you define a function?", "What is a for loop?"], ["Functions", "Loops", "Classes"])
+    assert scores.shape == (2, 3)
+    assert scores[0].argmax() == 0
+    assert scores[1].argmax() == 1
+
+
+def test_best_matches_flags_low_confidence():
+    subskills = ["Functions", "File I/O", "Object-Oriented Programming"]
+    questions = [
+        "What is inheritance in object-oriented programming?",
+        "How do you open a file for reading?",
+        "What is a lambda?",
+    ]
+    results = best_matches(questions, subskills, threshold=0.15, margin=0.05)
+    assert [subskills[best] for best, _, _ in results[:2]] == ["Object-Oriented Programming", "File I/O"]
+    assert [confident for _, _, confident in results] == [True, True, False]
+
+
+def test_best_matches_handles_empty_input():
+    assert best_matches([], ["Functions"]) == []
+
+
+@pytest.mark.parametrize("case", MALFORMED, ids=[case["name"] for case in MALFORMED])
+def test_json_repair_corpus(case):
+    assert loads(case["text"]) == case["expected"]
+
+
+def test_json_repair_rejects_text_without_json():
+    with pytest.raises(JSONRepairError):
+        loads("I'm sorry, I can't help with that.")
+
+
+def test_json_repair_survives_every_truncation_and_random_damage():
+    document = json.dumps([case["expected"] for case in MALFORMED])
+    for end in range(1, len(document) + 1):
+        assert isinstance(loads(document[:end]), list)
+    rng = random.Random(13)
+    for _ in range(300):
+        chars = list(document)
+        for _ in range(rng.randint(1, 5)):
+            position = rng.randrange(len(chars))
+            if rng.random() < 0.5:
+                del chars[position]
+            else:
+                chars.insert(position, rng.choice("{}[],:\\\"'"))
+        try:
+            assert isinstance(loads("".join(chars)), (dict, list))
+        except JSONRepairError:
+            pass
+
+
+def test_schema_validator_reports_paths_and_partitions():
+    from src.utils.schema import compile_schema
+
+    validator = compile_schema({"type": "ARRAY", "items": {
+        "type": "OBJECT",
+        "properties": {"name": {"type": "STRING"}, "level": {"type": "STRING", "enum": ["Easy", "Hard"]},
+                       "count": {"type": "INTEGER"}},
+        "required": ["name"],
+    }})
+    good = {"name": "a", "level": "Easy", "count": 2}
+    assert validator.errors([good]) == []
+    assert validator.errors([{"level": "Medium", "count": True}]) == [
+        "$[0].name: missing",
+        "$[0].level: 'Medium' is not one of ['Easy', 'Hard']",
+        "$[0].count: expected integer, got bool",
+    ]
+    assert validator.partition([good, "junk", {"name": 3}]) == ([good], ["junk", {"name": 3}])
+    assert validator.partition(None) == ([], [])
+
+
+def test_select_context_keeps_prompt_size_flat_and_covers_every_skill():
+    def knowledge_base(skill, topics):
+        return "\n\n".join([f"# {skill} Knowledge Base"] + [
+            f"## {topic}\n" + f"{skill} {topic.lower()} explained with a worked example. " * 12 for topic in topics
+        ])
+
+    small = knowledge_base("Python", ["Loops"])
+    assert select_context(small, ["Python"], 2000) == small
+
+    skills = ["Python", "SQL", "Docker", "Kubernetes", "Rust"]
+    topics = ["Basics", "Loops", "Errors", "Testing", "Performance", "Packaging", "Tooling", "Deployment"]
+    large = "\n\n".join(knowledge_base(skill, topics) for skill in skills)
+    context = select_context(large, skills + ["Testing"], 1000)
+    assert len(large) > 5 * 4000 and len(context) <= 1000 * 4 + 200
+    assert all(f"{skill} Knowledge Base" in context for skill in skills)
+    assert "Testing" in context
+
+    chunks = chunk_markdown("# Python\nintro\n\n## Loops\n" + "A sentence about loops. " * 100, max_chars=300)
+    assert chunks[0] == ("Python", "intro")
+    assert all(heading == "Python > Loops" and len(text) <= 300 for heading, text in chunks[1:])